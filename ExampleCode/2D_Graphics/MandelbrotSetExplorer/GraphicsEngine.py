@@ -38,6 +38,10 @@ class GraphicsEngine():
     maxBailoutRadius = 1000000
     TitleBarNote = None
 
+    # Build the shader again when its files are edited.
+    watchShaders = True
+    shaderReloader = None
+
     # Constructor
     def __init__(self):
         # Load shaders and compile shader programs.
@@ -59,6 +63,24 @@ class GraphicsEngine():
         self.setDefaultValues()
         self.loadDefaults()
 
+        # Watch the shader files, edits are compiled between frames.
+        if self.watchShaders:
+            self.shaderReloader = ShaderReloader()
+            self.shaderReloader.watch(self.shaderProgram, "AspectRatioVert.glsl", "MandelbrotFrag.glsl",
+                                      None, self.reloadShaderProgram)
+
+    # Replaces the shader program with the one built from the edited shader files and loads
+    # the current fractal attributes to it.  The color set is loaded as it was, so the random
+    # color schemes keep their colors.
+    def reloadShaderProgram(self, program):
+        self.shaderProgram = program
+        colorData = self.colorData
+        self.setProjectionMatrices(pygame.display.get_surface().get_size())
+        self.loadDefaults()
+        glUniform4fv(glGetUniformLocation(self.shaderProgram, "colorSet"), 100, colorData)
+        self.colorData = colorData
+        self.TitleBarNote = "Shaders reloaded."
+
     # Set the default attribute values for the fractal.
     def setDefaultValues(self):
         self.maxIter = 100
@@ -227,6 +249,7 @@ class GraphicsEngine():
 
             colordata = np.array(colorset).astype(ctypes.c_float)
             glUniform4fv(glGetUniformLocation(self.shaderProgram, "colorSet"), 100, colordata)
+            self.colorData = colordata
         elif num == 2:
             for i in range(50):
                 if i % 2 == 1:
@@ -242,6 +265,7 @@ class GraphicsEngine():
 
             colordata = np.array(colorset).astype(ctypes.c_float)
             glUniform4fv(glGetUniformLocation(self.shaderProgram, "colorSet"), 100, colordata)
+            self.colorData = colordata
         elif 3 <= num <= 10:
             if num == 3:
                 colorset.append(glm.vec4(1, 0, 0, 1))
@@ -308,6 +332,7 @@ class GraphicsEngine():
 
             colordata = np.array(expandedColorSet).astype(ctypes.c_float)
             glUniform4fv(glGetUniformLocation(self.shaderProgram, "colorSet"), 100, colordata)
+            self.colorData = colordata
 
     # Displays the center to the titlebar.
     def displayCenter(self):
@@ -385,6 +410,10 @@ class GraphicsEngine():
 
     # Turn on shader, clear screen, draw axes and boxes, swap display buffers.
     def update(self):
+        # Swap in the program of edited shader files.
+        if self.shaderReloader is not None:
+            self.shaderReloader.update()
+
         glUseProgram(self.shaderProgram)
         glClear(GL_COLOR_BUFFER_BIT)
         self.box.draw()
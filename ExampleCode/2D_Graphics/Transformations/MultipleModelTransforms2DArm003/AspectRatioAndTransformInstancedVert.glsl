@@ -0,0 +1,29 @@
+#version 330 core
+
+/**
+Vertex shader for drawing copies of a mesh with one instanced draw call.  The
+model matrix and color of each copy are read from the instance attributes, see
+the InstanceBuffer object.
+
+[in] icolor --- vec4 color from vertex array.
+[in] position --- vec4 position from vertex array.
+[in] Model --- mat4 model matrix of the instance.
+[in] instanceColor --- vec4 color of the instance, multiplied with the vertex color.
+
+[out] color --- vec4 output color to the fragment shader.
+*/
+
+layout(location = 0) in vec4 position;
+layout(location = 1) in vec4 icolor;
+layout(location = 4) in mat4 Model;
+layout(location = 11) in vec4 instanceColor;
+
+out vec4 color;
+
+uniform mat4 Projection;
+
+void main()
+{
+    color = icolor * instanceColor;
+    gl_Position = Projection*Model*position;
+}
\ No newline at end of file
@@ -4,13 +4,15 @@
 # Updates the display and has methods for mode changes and screen shots.
 #
 # This version simulates an Articulated Robotic Arm in two dimensions
-# using a series of rotations, scales, and translations.  Here we use a
-# make-shift stack of matrix transformations to move along the arm segments.
-# When a matrix is pushed on the stack it is multiplied by the matrix on the
-# top of the stack before being pushed.  This setup is similar to the matrix
-# stacks used in legacy OpneGL.  With modern OpenGL we have more options in how
-# we handle transformations, but this stack setup can come in handy for some
-# applications.
+# using a series of rotations, scales, and translations.  The arm is a scene
+# graph, each joint is a node under the joint before it, rotated about the end
+# of the segment before it, and each segment is a node under its joint that
+# scales the line segment to its length.  The world matrices of the nodes are
+# kept between frames, only the joints that changed and the parts of the arm
+# past them are found again.
+#
+# The arm segments are copies of one white line segment, drawn with a single
+# instanced draw call with the model matrix and color of each segment.
 #
 # Don Spickler
 # 12/9/2021
@@ -28,6 +30,8 @@ import glm
 from Box import *
 from Axes2D import *
 from LineSegment2D import *
+from InstanceBuffer import *
+from SceneGraph import *
 
 
 class GraphicsEngine():
@@ -48,6 +52,8 @@ class GraphicsEngine():
         try:
             shader = Shader()
             self.shaderProgram = shader.loadShadersFromFile("AspectRatioAndTransformVert.glsl", "PassThroughFrag.glsl")
+            self.instancedProgram = shader.loadShadersFromFile("AspectRatioAndTransformInstancedVert.glsl",
+                                                               "PassThroughFrag.glsl")
         except Exception as err:
             for i in range(len(err.args)):
                 print(err.args[i])
@@ -57,6 +63,7 @@ class GraphicsEngine():
         glUseProgram(self.shaderProgram)
         self.projLoc = glGetUniformLocation(self.shaderProgram, "Projection")
         self.modelLoc = glGetUniformLocation(self.shaderProgram, "Model")
+        self.instancedProjLoc = glGetUniformLocation(self.instancedProgram, "Projection")
         self.setProjectionMatrix(pygame.display.get_surface().get_size())
 
         # Set clear/background color to black.
@@ -67,26 +74,19 @@ class GraphicsEngine():
 
         self.rotations = [0, 0, 0]
         self.scales = [0.5, 0.35, 0.25]
-        self.arms = [LineSegment2D(1, [1, 0, 0]),
-                     LineSegment2D(1, [0, 1, 0]),
-                     LineSegment2D(1, [0, 0, 1]),
-                     ]
-
-    # Take a list aof 4X4 glm matrices and multiply all of them together in list order.
-    def multmatrices(self, mats):
-        result = glm.mat4(1)
-        for i in range(len(mats)):
-            result = result * mats[i]
-
-        return result
-
-    def push(self, mats, newmat):
-        if len(mats) == 0:
-            mats.append(newmat)
-        else:
-            mats.append(mats[-1] * newmat)
-
-        return mats
+        self.colors = np.array([[1, 0, 0, 1],
+                                [0, 1, 0, 1],
+                                [0, 0, 1, 1]], np.float32)
+        self.segment = LineSegment2D(1, [1, 1, 1])
+
+        # The joints and segments of the arm in the scene graph.
+        self.scene = SceneGraph()
+        self.joints = []
+        self.segments = []
+        for i in range(len(self.colors)):
+            self.joints.append(self.scene.addNode(self.joints[-1] if i > 0 else None))
+            self.segments.append(self.scene.addNode(self.joints[-1]))
+        self.segmentNodes = [segment.index for segment in self.segments]
 
     # Turn on shader, clear screen, draw axes and boxes, swap display buffers.
     def update(self):
@@ -94,25 +94,24 @@ class GraphicsEngine():
         glClear(GL_COLOR_BUFFER_BIT)
         glPolygonMode(GL_FRONT_AND_BACK, self.mode)
 
-        matrices = []
-        matrices = self.push(matrices, glm.mat4(1.0))
-        glUniformMatrix4fv(self.modelLoc, 1, GL_FALSE, glm.value_ptr(matrices[-1]))
+        identity = glm.mat4(1.0)
+        glUniformMatrix4fv(self.modelLoc, 1, GL_FALSE, glm.value_ptr(identity))
         self.axes.draw()
 
-        # Set the model matrix to the identity.
-        for i in range(len(self.arms)):
-            # Push rotation matrix
-            matrices = self.push(matrices, glm.rotate(self.rotations[i] * np.pi / 180, glm.vec3(0, 0, 1)))
-            # Push scale matrix
-            matrices = self.push(matrices, glm.scale(glm.vec3(self.scales[i], self.scales[i], 0)))
-            # Load transformation.
-            glUniformMatrix4fv(self.modelLoc, 1, GL_FALSE, glm.value_ptr(matrices[-1]))
-            # Draw the arm.
-            self.arms[i].draw()
-            # Pop last scale matrix.
-            matrices.pop()
-            # Push translation matrix to the end of the arm to start the next arm.
-            matrices = self.push(matrices, glm.translate(glm.vec3(self.scales[i], 0, 0)))
+        # Set the joints and segments from the rotations and scales.  Values that did not
+        # change do not mark the nodes, so only the moved part of the arm is found again.
+        for i in range(len(self.colors)):
+            if i > 0:
+                # Move to the end of the segment before.
+                self.joints[i].setTranslation((self.scales[i - 1], 0, 0))
+            self.joints[i].setAngleAxis(self.rotations[i] * np.pi / 180, (0, 0, 1))
+            self.segments[i].setScale((self.scales[i], self.scales[i], 0))
+        self.scene.update()
+
+        # Draw the arm.
+        glUseProgram(self.instancedProgram)
+        self.segment.loadInstances(self.scene.worldMatrices[self.segmentNodes], None, self.colors)
+        self.segment.drawInstanced()
 
         self.printOpenGLErrors()
 
@@ -147,8 +146,11 @@ class GraphicsEngine():
         # print(ProjectionMatrix)
         # print(self.ScreenBounds)
 
-        # Load Projection Matrix to the projection matrix in the shader.
+        # Load Projection Matrix to the projection matrix in the shaders.
+        glUseProgram(self.shaderProgram)
         glUniformMatrix4fv(self.projLoc, 1, GL_FALSE, glm.value_ptr(ProjectionMatrix))
+        glUseProgram(self.instancedProgram)
+        glUniformMatrix4fv(self.instancedProjLoc, 1, GL_FALSE, glm.value_ptr(ProjectionMatrix))
 
     # Dump screen buffer data to raw pixels and convert to PIL Image object.
     def getScreenImage(self):
@@ -0,0 +1,121 @@
+#! /usr/bin/env python3
+#
+# Instance buffer
+#
+# Holds the per instance data for drawing many copies of a mesh with one instanced
+# draw call.  Each copy has a model matrix, the normal matrix of the model matrix
+# and, optionally, a color.  The data is stored in a buffer that is attached to the
+# vertex array of the mesh as attributes with a divisor of 1, so each instance reads
+# its own values.
+#
+# layout(location = 4) in mat4 Model;
+# layout(location = 8) in mat3 NormalMatrix;
+# layout(location = 11) in vec4 instanceColor;
+#
+# The model matrices are given as an (N, 4, 4) array with each matrix stored by
+# columns, the order OpenGL reads them in, so models[i][3] is the translation of
+# instance i.  This is the transpose of np.array(glm.mat4), the modelMatrices
+# function makes the array from a list of glm matrices.  The normal matrices, the
+# inverse transpose of the upper 3x3 of the model matrices, are found for all the
+# instances at once from cross products of the columns.  For a matrix without an
+# inverse, such as a scale of 0 to flatten a shape, the cofactor matrix is used, it
+# has the same directions.
+#
+# The buffer is orphaned before each load, so the driver does not wait for draws
+# that still read the last data, and only grows when more instances are loaded.
+
+from OpenGL.GL import *
+import ctypes
+import numpy as np
+
+modelLocation = 4
+normalLocation = 8
+colorLocation = 11
+
+
+# Returns the (N, 4, 4) float32 array of a list of glm matrices, stored by columns.
+def modelMatrices(matrices):
+    return np.array([np.array(matrix) for matrix in matrices], np.float32).reshape(-1, 4, 4).transpose(0, 2, 1)
+
+
+# Returns the (N, 3, 3) normal matrices of the (N, 4, 4) model matrices, both stored by
+# columns.  The columns of the inverse transpose are the cross products of the columns
+# of the matrix divided by its determinant.  The same holds for the rows, so the result
+# does not depend on the storage order.
+def normalMatrices(models):
+    columns = np.asarray(models, np.float64)[:, 0:3, 0:3]
+    normals = np.stack([np.cross(columns[:, 1], columns[:, 2]),
+                        np.cross(columns[:, 2], columns[:, 0]),
+                        np.cross(columns[:, 0], columns[:, 1])], axis=1)
+    determinants = np.einsum('ij,ij->i', columns[:, 0], normals[:, 0])
+    determinants[np.abs(determinants) < 1e-12] = 1
+    return (normals / determinants[:, None, None]).astype(np.float32)
+
+
+class InstanceBuffer():
+    # Constructor, creates the buffers and attaches them to the vertex array.
+    def __init__(self, vao):
+        self.vao = vao
+        self.count = 0
+        self.capacity = 0
+        self.colorCapacity = 0
+        self.buffer = glGenBuffers(1)
+        self.colorBuffer = glGenBuffers(1)
+        floatsz = ctypes.sizeof(ctypes.c_float)
+        stride = 25 * floatsz
+
+        glBindVertexArray(self.vao)
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        for column in range(4):
+            glVertexAttribPointer(modelLocation + column, 4, GL_FLOAT, GL_FALSE, stride,
+                                  ctypes.c_void_p(4 * column * floatsz))
+            glVertexAttribDivisor(modelLocation + column, 1)
+            glEnableVertexAttribArray(modelLocation + column)
+        for column in range(3):
+            glVertexAttribPointer(normalLocation + column, 3, GL_FLOAT, GL_FALSE, stride,
+                                  ctypes.c_void_p((16 + 3 * column) * floatsz))
+            glVertexAttribDivisor(normalLocation + column, 1)
+            glEnableVertexAttribArray(normalLocation + column)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.colorBuffer)
+        glVertexAttribPointer(colorLocation, 4, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
+        glVertexAttribDivisor(colorLocation, 1)
+        glBindVertexArray(0)
+
+    # Loads the model matrices of the instances, with their normal matrices if they are not
+    # given, and the (N, 4) colors if they are given.  Returns the number of instances.
+    def load(self, models, normals=None, colors=None):
+        models = np.asarray(models, np.float32).reshape(-1, 4, 4)
+        if normals is None:
+            normals = normalMatrices(models)
+        self.count = len(models)
+
+        data = np.empty((self.count, 25), np.float32)
+        data[:, 0:16] = models.reshape(-1, 16)
+        data[:, 16:25] = np.asarray(normals, np.float32).reshape(-1, 9)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        self.capacity = max(self.capacity, self.count)
+        glBufferData(GL_ARRAY_BUFFER, self.capacity * data.itemsize * 25, None, GL_STREAM_DRAW)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, data.nbytes, data)
+
+        glBindVertexArray(self.vao)
+        if colors is not None:
+            colors = np.ascontiguousarray(colors, np.float32).reshape(-1, 4)
+            glBindBuffer(GL_ARRAY_BUFFER, self.colorBuffer)
+            self.colorCapacity = max(self.colorCapacity, len(colors))
+            glBufferData(GL_ARRAY_BUFFER, self.colorCapacity * colors.itemsize * 4, None, GL_STREAM_DRAW)
+            glBufferSubData(GL_ARRAY_BUFFER, 0, colors.nbytes, colors)
+            glEnableVertexAttribArray(colorLocation)
+        else:
+            glDisableVertexAttribArray(colorLocation)
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        return self.count
+
+    # Removes the buffers from the graphics card.
+    def delete(self):
+        glDeleteBuffers(2, [self.buffer, self.colorBuffer])
+        self.buffer = 0
+        self.colorBuffer = 0
@@ -13,11 +13,15 @@
 from OpenGL.GL import *
 import ctypes
 import numpy as np
+from InstanceBuffer import *
 
 
 class LineSegment2D():
     length = 0
     color = [1, 1, 1]
+    # Buffer of the copies drawn by drawInstanced, made by the first loadInstances.
+    instances = None
+
     # Constructor
     def __init__(self, len = 1, col = [1, 1, 1]):
         self.length = len
@@ -75,3 +79,18 @@ class LineSegment2D():
     def draw(self):
         glBindVertexArray(self.BoxVAO)
         glDrawArrays(GL_LINES, 0, 2)
+
+    # Loads the (N, 4, 4) model matrices of the copies of the line to draw with drawInstanced,
+    # with their normal matrices and colors if they are given, see the InstanceBuffer object.
+    def loadInstances(self, models, normals=None, colors=None):
+        if self.instances is None:
+            self.instances = InstanceBuffer(self.BoxVAO)
+        self.instances.load(models, normals, colors)
+
+    # Draws a copy of the line for each loaded model matrix with one draw call.  The model
+    # matrices are loaded first if they are given.
+    def drawInstanced(self, models=None):
+        if models is not None:
+            self.loadInstances(models)
+        glBindVertexArray(self.BoxVAO)
+        glDrawArraysInstanced(GL_LINES, 0, 2, self.instances.count)
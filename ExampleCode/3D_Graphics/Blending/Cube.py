@@ -17,9 +17,13 @@
 from OpenGL.GL import *
 import ctypes
 import numpy as np
+from InstanceBuffer import *
 
 
 class Cube():
+    # Buffer of the copies drawn by drawInstanced, made by the first loadInstances.
+    instances = None
+
     # Constructor
     def __init__(self):
         self.drawStyle = 0
@@ -208,3 +212,23 @@ class Cube():
         elif self.drawStyle == 1:
             glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.BoxEBO[1])
             glDrawElements(GL_LINES, 48, GL_UNSIGNED_INT, None)
+
+    # Loads the (N, 4, 4) model matrices of the copies of the cube to draw with drawInstanced,
+    # with their normal matrices and colors if they are given, see the InstanceBuffer object.
+    def loadInstances(self, models, normals=None, colors=None):
+        if self.instances is None:
+            self.instances = InstanceBuffer(self.BoxVAO)
+        self.instances.load(models, normals, colors)
+
+    # Draws a copy of the cube for each loaded model matrix with one draw call.  The model
+    # matrices are loaded first if they are given.
+    def drawInstanced(self, models=None):
+        if models is not None:
+            self.loadInstances(models)
+        glBindVertexArray(self.BoxVAO)
+        if self.drawStyle == 0:
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.BoxEBO[0])
+            glDrawElementsInstanced(GL_TRIANGLES, 36, GL_UNSIGNED_INT, None, self.instances.count)
+        elif self.drawStyle == 1:
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.BoxEBO[1])
+            glDrawElementsInstanced(GL_LINES, 48, GL_UNSIGNED_INT, None, self.instances.count)
@@ -52,6 +52,8 @@ class GraphicsEngine():
                                                             "Shaders/PhongMultipleLightsAndTexture.glsl")
             self.ConstColorShader = shader.loadShadersFromFile("Shaders/VertexShaderBasic3D.glsl",
                                                                "Shaders/ConstantColorFrag.glsl")
+            self.InstancedConstColorShader = shader.loadShadersFromFile("Shaders/VertexShaderBasic3DInstanced.glsl",
+                                                                        "Shaders/ConstantColorFrag.glsl")
             self.CubemapShader = shader.loadShadersFromFile("Shaders/VertexShaderCubeMap.glsl",
                                                             "Shaders/FragmentCubeMap.glsl")
 
@@ -83,6 +85,11 @@ class GraphicsEngine():
         glUniform4fv(glGetUniformLocation(self.ConstColorShader, "ConstantColor"),
                      1, glm.value_ptr(lightcol))
 
+        glUseProgram(self.InstancedConstColorShader)
+        self.projviewLocInstConst = glGetUniformLocation(self.InstancedConstColorShader, "ProjView")
+        glUniform4fv(glGetUniformLocation(self.InstancedConstColorShader, "ConstantColor"),
+                     1, glm.value_ptr(lightcol))
+
         glUseProgram(self.CubemapShader)
         self.projviewLocCM = glGetUniformLocation(self.CubemapShader, "PV")
 
@@ -148,8 +155,8 @@ class GraphicsEngine():
         # teximg = Image.open("Images/Repeat-brick.jpg")
 
         teximg = teximg.convert('RGBA')
-        teximg = teximg.transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        # Flip the rows while copying out the pixels, OpenGL expects the bottom row first.
+        img_data = teximg.tobytes("raw", "RGBA", 0, -1)
 
         self.texID = glGenTextures(1)
         glActiveTexture(GL_TEXTURE0)
@@ -237,32 +244,32 @@ class GraphicsEngine():
 
         # Extract the subimages and load to texture positions.
         teximgcrop = teximg.crop((2*imgw, imgh, 3*imgw, 2*imgh))
-        img_data = np.array(list(teximgcrop.getdata()), np.int8)
+        img_data = teximgcrop.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X, 0, GL_RGBA, teximgcrop.width, teximgcrop.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximgcrop = teximg.crop((0, imgh, imgw, 2*imgh))
-        img_data = np.array(list(teximgcrop.getdata()), np.int8)
+        img_data = teximgcrop.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_NEGATIVE_X, 0, GL_RGBA, teximgcrop.width, teximgcrop.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximgcrop = teximg.crop((imgw, 0, 2*imgw, imgh))
-        img_data = np.array(list(teximgcrop.getdata()), np.int8)
+        img_data = teximgcrop.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_Y, 0, GL_RGBA, teximgcrop.width, teximgcrop.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximgcrop = teximg.crop((imgw, 2*imgh, 2*imgw, 3*imgh))
-        img_data = np.array(list(teximgcrop.getdata()), np.int8)
+        img_data = teximgcrop.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_NEGATIVE_Y, 0, GL_RGBA, teximgcrop.width, teximgcrop.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximgcrop = teximg.crop((imgw, imgh, 2*imgw, 2*imgh))
-        img_data = np.array(list(teximgcrop.getdata()), np.int8)
+        img_data = teximgcrop.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_Z, 0, GL_RGBA, teximgcrop.width, teximgcrop.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximgcrop = teximg.crop((3*imgw, imgh, 4*imgw, 2*imgh))
-        img_data = np.array(list(teximgcrop.getdata()), np.int8)
+        img_data = teximgcrop.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_NEGATIVE_Z, 0, GL_RGBA, teximgcrop.width, teximgcrop.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
@@ -286,14 +293,14 @@ class GraphicsEngine():
             glUniformMatrix4fv(self.modelLocAxes, 1, GL_FALSE, glm.value_ptr(axestrans))
             self.axes.draw()
 
-        # Draw position of the light if selected.
+        # Draw position of the light if selected, the spheres are instances of one sphere.
         if self.showlight:
-            glUseProgram(self.ConstColorShader)
+            glUseProgram(self.InstancedConstColorShader)
             self.lights[0].position = glm.vec4(self.lightcamera.getPosition(), 1)
+            lightobjmodels = np.tile(np.identity(4, np.float32), (3, 1, 1))
             for i in range(3):
-                lightobjmodel = glm.translate(glm.vec3(self.lights[i].position))
-                glUniformMatrix4fv(self.modelLocConst, 1, GL_FALSE, glm.value_ptr(lightobjmodel))
-                self.lightsphere.draw()
+                lightobjmodels[i, 3, 0:3] = glm.vec3(self.lights[i].position)
+            self.lightsphere.drawInstanced(lightobjmodels)
 
         # Draw remainder of scene.
         glUseProgram(self.TextureShader)
@@ -380,6 +387,8 @@ class GraphicsEngine():
         glUniformMatrix4fv(self.projviewLocPhong, 1, GL_FALSE, glm.value_ptr(PV))
         glUseProgram(self.ConstColorShader)
         glUniformMatrix4fv(self.projviewLocConst, 1, GL_FALSE, glm.value_ptr(PV))
+        glUseProgram(self.InstancedConstColorShader)
+        glUniformMatrix4fv(self.projviewLocInstConst, 1, GL_FALSE, glm.value_ptr(PV))
         glUseProgram(self.CubemapShader)
         glUniformMatrix4fv(self.projviewLocCM, 1, GL_FALSE, glm.value_ptr(PV))
 
@@ -397,6 +406,8 @@ class GraphicsEngine():
         glUniformMatrix4fv(self.projviewLocPhong, 1, GL_FALSE, glm.value_ptr(PV))
         glUseProgram(self.ConstColorShader)
         glUniformMatrix4fv(self.projviewLocConst, 1, GL_FALSE, glm.value_ptr(PV))
+        glUseProgram(self.InstancedConstColorShader)
+        glUniformMatrix4fv(self.projviewLocInstConst, 1, GL_FALSE, glm.value_ptr(PV))
         glUseProgram(self.CubemapShader)
         glUniformMatrix4fv(self.projviewLocCM, 1, GL_FALSE, glm.value_ptr(PV))
 
@@ -0,0 +1,30 @@
+#version 330 core
+
+/**
+Vertex shader for drawing copies of a mesh with one instanced draw call.  The
+model matrix of each copy is read from the instance attributes, see the
+InstanceBuffer object.
+
+[in] position --- vec4 vertex position from memory.
+[in] icolor --- vec4 vertex color from memory.
+[in] Model --- mat4 model matrix of the instance.
+
+[out] color --- vec4 output color to the fragment shader.
+
+[uniform] ProjView --- mat4 projection and view matrix.
+
+*/
+
+layout(location = 0) in vec4 position;
+layout(location = 1) in vec4 icolor;
+layout(location = 4) in mat4 Model;
+
+uniform mat4 ProjView = mat4(1);
+
+out vec4 color;
+
+void main()
+{
+    color = icolor;
+    gl_Position = ProjView * Model * position;
+}
\ No newline at end of file
@@ -12,9 +12,13 @@ from OpenGL.GL import *
 import ctypes
 import numpy as np
 import glm
+from InstanceBuffer import *
 
 
 class SimplePlane():
+    # Buffer of the copies drawn by drawInstanced, made by the first loadInstances.
+    instances = None
+
     # Constructor
     def __init__(self):
         # Setup VAO and buffers.
@@ -91,3 +95,19 @@ class SimplePlane():
         glBindVertexArray(self.VAO)
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO)
         glDrawElements(GL_TRIANGLES, 6, GL_UNSIGNED_INT, None)
+
+    # Loads the (N, 4, 4) model matrices of the copies of the plane to draw with drawInstanced,
+    # with their normal matrices and colors if they are given, see the InstanceBuffer object.
+    def loadInstances(self, models, normals=None, colors=None):
+        if self.instances is None:
+            self.instances = InstanceBuffer(self.VAO)
+        self.instances.load(models, normals, colors)
+
+    # Draws a copy of the plane for each loaded model matrix with one draw call.  The model
+    # matrices are loaded first if they are given.
+    def drawInstanced(self, models=None):
+        if models is not None:
+            self.loadInstances(models)
+        glBindVertexArray(self.VAO)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO)
+        glDrawElementsInstanced(GL_TRIANGLES, 6, GL_UNSIGNED_INT, None, self.instances.count)
@@ -194,8 +194,8 @@ class GraphicsEngine():
         # teximg = Image.open("Images/Repeat-brick.jpg")
 
         teximg = teximg.convert('RGBA')
-        teximg = teximg.transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        # Flip the rows while copying out the pixels, OpenGL expects the bottom row first.
+        img_data = teximg.tobytes("raw", "RGBA", 0, -1)
 
         self.texID = glGenTextures(1)
         glActiveTexture(GL_TEXTURE0)
@@ -281,32 +281,32 @@ class GraphicsEngine():
 
         # Extract the subimages and load to texture positions.
         teximgcrop = teximg.crop((2 * imgw, imgh, 3 * imgw, 2 * imgh))
-        img_data = np.array(list(teximgcrop.getdata()), np.int8)
+        img_data = teximgcrop.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X, 0, GL_RGBA, teximgcrop.width, teximgcrop.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximgcrop = teximg.crop((0, imgh, imgw, 2 * imgh))
-        img_data = np.array(list(teximgcrop.getdata()), np.int8)
+        img_data = teximgcrop.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_NEGATIVE_X, 0, GL_RGBA, teximgcrop.width, teximgcrop.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximgcrop = teximg.crop((imgw, 0, 2 * imgw, imgh))
-        img_data = np.array(list(teximgcrop.getdata()), np.int8)
+        img_data = teximgcrop.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_Y, 0, GL_RGBA, teximgcrop.width, teximgcrop.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximgcrop = teximg.crop((imgw, 2 * imgh, 2 * imgw, 3 * imgh))
-        img_data = np.array(list(teximgcrop.getdata()), np.int8)
+        img_data = teximgcrop.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_NEGATIVE_Y, 0, GL_RGBA, teximgcrop.width, teximgcrop.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximgcrop = teximg.crop((imgw, imgh, 2 * imgw, 2 * imgh))
-        img_data = np.array(list(teximgcrop.getdata()), np.int8)
+        img_data = teximgcrop.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_Z, 0, GL_RGBA, teximgcrop.width, teximgcrop.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximgcrop = teximg.crop((3 * imgw, imgh, 4 * imgw, 2 * imgh))
-        img_data = np.array(list(teximgcrop.getdata()), np.int8)
+        img_data = teximgcrop.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_NEGATIVE_Z, 0, GL_RGBA, teximgcrop.width, teximgcrop.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
@@ -174,8 +174,8 @@ class GraphicsEngine():
         # teximg = Image.open("Images/Repeat-brick.jpg")
 
         teximg = teximg.convert('RGBA')
-        teximg = teximg.transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        # Flip the rows while copying out the pixels, OpenGL expects the bottom row first.
+        img_data = teximg.tobytes("raw", "RGBA", 0, -1)
 
         self.texID = glGenTextures(1)
         glActiveTexture(GL_TEXTURE0)
@@ -227,32 +227,32 @@ class GraphicsEngine():
 
         # Load images, note that the original images are already flipped so we load them in as is with no transpose.
         teximg = Image.open("CubemapImages/nvlobby_posx.bmp").convert('RGBA')
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        img_data = teximg.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X, 0, GL_RGBA, teximg.width, teximg.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximg = Image.open("CubemapImages/nvlobby_negx.bmp").convert('RGBA')
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        img_data = teximg.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_NEGATIVE_X, 0, GL_RGBA, teximg.width, teximg.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximg = Image.open("CubemapImages/nvlobby_posy.bmp").convert('RGBA')
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        img_data = teximg.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_Y, 0, GL_RGBA, teximg.width, teximg.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximg = Image.open("CubemapImages/nvlobby_negy.bmp").convert('RGBA')
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        img_data = teximg.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_NEGATIVE_Y, 0, GL_RGBA, teximg.width, teximg.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximg = Image.open("CubemapImages/nvlobby_posz.bmp").convert('RGBA')
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        img_data = teximg.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_Z, 0, GL_RGBA, teximg.width, teximg.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
         teximg = Image.open("CubemapImages/nvlobby_negz.bmp").convert('RGBA')
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        img_data = teximg.tobytes()
         glTexImage2D(GL_TEXTURE_CUBE_MAP_NEGATIVE_Z, 0, GL_RGBA, teximg.width, teximg.height, 0, GL_RGBA,
                      GL_UNSIGNED_BYTE, img_data)
 
@@ -0,0 +1,116 @@
+#! /usr/bin/env python3
+#
+# Bounding volumes and frustum culling
+#
+# The mesh objects find an axis aligned bounding box and a bounding sphere of their
+# vertices when they are loaded.  The box is a (2, 3) array of the minimum and maximum
+# corners and the sphere a (4,) array of the center and radius, both in the
+# coordinates of the mesh.  The meshBounds function makes both from an array of points.
+#
+# The Frustum object holds the six planes of the view volume of a projection * view
+# matrix.  The bounds of many objects are tested against it at once, the boxes and
+# spheres of the objects are moved to world coordinates by their model matrices and
+# each is checked against all of the planes with a few NumPy array operations, so
+# the objects outside of the view are dropped before any OpenGL calls are made for
+# them.  The tests are conservative, an object that is reported outside of the
+# frustum cannot be seen, some objects reported inside may not be seen.
+#
+# The model matrices are given as a list of glm matrices or as an (N, 4, 4) array
+# with each matrix stored by columns, the transpose of np.array(glm.mat4), so
+# models[i][3] is the translation of matrix i.
+
+import numpy as np
+
+
+# Returns the bounding box and bounding sphere of the points, an (N, 3) array or an (N, 4)
+# array of homogeneous points with w = 1.  The sphere is centered at the center of the box
+# and reaches the farthest point.
+def meshBounds(points):
+    points = np.asarray(points, np.float32)
+    if len(points) == 0:
+        return np.zeros((2, 3), np.float32), np.zeros(4, np.float32)
+    points = points.reshape(len(points), -1)[:, 0:3]
+    box = np.array([points.min(axis=0), points.max(axis=0)], np.float32)
+    center = (box[0] + box[1]) / 2
+    radius = np.sqrt(((points - center) ** 2).sum(axis=1).max())
+    return box, np.append(center, radius).astype(np.float32)
+
+
+# Returns the (N, 4, 4) float array of the model matrices, stored by columns.
+def columnMatrices(models):
+    if isinstance(models, np.ndarray):
+        return models.reshape(-1, 4, 4)
+    return np.array([np.array(model) for model in models], np.float32).reshape(-1, 4, 4).transpose(0, 2, 1)
+
+
+# Returns the (N, 2, 3) world boxes of the (N, 2, 3) boxes moved by the model matrices.  The
+# center of a box is moved by the matrix and the half widths by the absolute values of its
+# entries, which gives the smallest box around the moved box.
+def transformBoxes(boxes, models):
+    boxes = np.asarray(boxes, np.float32).reshape(-1, 2, 3)
+    models = columnMatrices(models)
+    center = (boxes[:, 0] + boxes[:, 1]) / 2
+    extent = (boxes[:, 1] - boxes[:, 0]) / 2
+    worldCenter = np.einsum('nji,nj->ni', models[:, 0:3, 0:3], center) + models[:, 3, 0:3]
+    worldExtent = np.einsum('nji,nj->ni', np.abs(models[:, 0:3, 0:3]), extent)
+    return np.stack([worldCenter - worldExtent, worldCenter + worldExtent], axis=1)
+
+
+# Returns the (N, 4) world spheres of the (N, 4) spheres moved by the model matrices.  The
+# radius is scaled by the longest column of the matrix, the largest scale of the matrix.
+def transformSpheres(spheres, models):
+    spheres = np.asarray(spheres, np.float32).reshape(-1, 4)
+    models = columnMatrices(models)
+    centers = np.einsum('nji,nj->ni', models[:, 0:3, 0:3], spheres[:, 0:3]) + models[:, 3, 0:3]
+    scale = np.sqrt((models[:, 0:3, 0:3] ** 2).sum(axis=2).max(axis=1))
+    return np.concatenate([centers, (spheres[:, 3] * scale)[:, None]], axis=1)
+
+
+class Frustum():
+    # Constructor, sets the planes from the projection * view matrix if it is given.
+    def __init__(self, PV=None):
+        self.planes = np.zeros((6, 4), np.float32)
+        if PV is not None:
+            self.set(PV)
+
+    # Sets the planes from the projection * view matrix, a glm matrix.  Each plane is the sum
+    # or difference of the last row of the matrix and one of the other rows, scaled so that
+    # its normal has length one and points into the frustum.
+    def set(self, PV):
+        rows = np.array(PV, np.float64).reshape(4, 4)
+        planes = np.array([rows[3] + rows[0], rows[3] - rows[0],
+                           rows[3] + rows[1], rows[3] - rows[1],
+                           rows[3] + rows[2], rows[3] - rows[2]])
+        self.planes = planes / np.linalg.norm(planes[:, 0:3], axis=1)[:, None]
+
+    # Returns a boolean array, True for the (N, 4) world spheres that are not outside of
+    # one of the planes.
+    def testSpheres(self, spheres):
+        spheres = np.asarray(spheres).reshape(-1, 4)
+        distances = spheres[:, 0:3] @ self.planes[:, 0:3].T + self.planes[:, 3]
+        return np.all(distances >= -spheres[:, 3:4], axis=1)
+
+    # Returns a boolean array, True for the (N, 2, 3) world boxes that are not outside of one
+    # of the planes.  The corner of a box farthest along the normal of a plane is inside the
+    # plane when the distance of the center plus the half widths times the absolute normal is
+    # not negative.
+    def testBoxes(self, boxes):
+        boxes = np.asarray(boxes).reshape(-1, 2, 3)
+        center = (boxes[:, 0] + boxes[:, 1]) / 2
+        extent = (boxes[:, 1] - boxes[:, 0]) / 2
+        distances = center @ self.planes[:, 0:3].T + self.planes[:, 3] + extent @ np.abs(self.planes[:, 0:3]).T
+        return np.all(distances >= 0, axis=1)
+
+    # Returns a boolean array, True for the meshes that can be seen when drawn with the
+    # model matrices.  The spheres are tested first and the boxes of the meshes that are
+    # left, either test can show that a mesh is outside.
+    def testMeshes(self, meshes, models):
+        if len(meshes) == 0:
+            return np.zeros(0, bool)
+        models = columnMatrices(models)
+        visible = self.testSpheres(transformSpheres([mesh.boundingSphere for mesh in meshes], models))
+        if visible.any():
+            inside = np.flatnonzero(visible)
+            boxes = transformBoxes([meshes[i].boundingBox for i in inside], models[inside])
+            visible[inside] = self.testBoxes(boxes)
+        return visible
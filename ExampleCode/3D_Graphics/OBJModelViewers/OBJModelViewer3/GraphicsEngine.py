@@ -28,6 +28,9 @@ from SphericalCamera import *
 from YPRCamera import *
 from Light import *
 from OBJModel import *
+from KTXFile import *
+from Bounds import *
+from Picking import *
 
 
 class GraphicsEngine():
@@ -73,6 +76,9 @@ class GraphicsEngine():
 
         self.wfmodel = OBJModel()
 
+        # Finds the triangle of the model under the mouse.
+        self.picker = Picker()
+
         # Set the projection matrices to all shaders.
         self.setProjectionMatrix(pygame.display.get_surface().get_size())
 
@@ -135,6 +141,11 @@ class GraphicsEngine():
     # Create a texture cubemap from a skybox image. Load but not assign to an
     # active texture.
     def generateCubemapFromSkybox(self, filemane):
+        # Use the baked cube map if the TextureBaker has made one.
+        bakedname = findBakedFile(filemane, "cross")
+        if bakedname is not None:
+            return KTXFile(bakedname).load(GL_CLAMP_TO_EDGE, GL_LINEAR, GL_LINEAR)[0]
+
         teximg = Image.open(filemane).convert('RGBA')
 
         CMID = glGenTextures(1)
@@ -190,6 +201,11 @@ class GraphicsEngine():
     # Create a texture cubemap from a single image to be repeated on all 6 sides..
     # Load but not assign to an active texture.
     def generateCubemapFromOneImage(self, filemane):
+        # Use the baked cube map if the TextureBaker has made one.
+        bakedname = findBakedFile(filemane, "one")
+        if bakedname is not None:
+            return KTXFile(bakedname).load(GL_CLAMP_TO_EDGE, GL_LINEAR, GL_LINEAR)[0]
+
         teximg = Image.open(filemane).convert('RGBA')
 
         CMID = glGenTextures(1)
@@ -243,10 +259,15 @@ class GraphicsEngine():
         if self.showlight:
             glUseProgram(self.ConstColorShader)
             self.lights[0].position = glm.vec4(self.lightcamera.getPosition(), 1)
-            for i in range(3):
-                lightobjmodel = glm.translate(glm.vec3(self.lights[i].position))
-                glUniformMatrix4fv(self.modelLocConst, 1, GL_FALSE, glm.value_ptr(lightobjmodel))
-                self.lightsphere.draw()
+            lightmodels = [glm.translate(glm.vec3(light.position)) for light in self.lights]
+
+            # Only the light spheres inside the view are drawn.
+            frustum = Frustum(self.projectionMatrix * self.viewMatrix)
+            visible = frustum.testMeshes([self.lightsphere] * len(lightmodels), lightmodels)
+            for lightobjmodel, seen in zip(lightmodels, visible):
+                if seen:
+                    glUniformMatrix4fv(self.modelLocConst, 1, GL_FALSE, glm.value_ptr(lightobjmodel))
+                    self.lightsphere.draw()
 
         # Draw remainder of scene.
         self.wfmodel.draw()
@@ -299,6 +320,7 @@ class GraphicsEngine():
     # Set and load the projection matrix to the graphics card.
     def setProjectionMatrix(self, size):
         w, h = size
+        self.screenSize = (w, h)
         self.projectionMatrix = glm.perspective(glm.radians(50.0), w / h, 0.01, 500.0)
         self.resetProjectionMatrix()
 
@@ -320,6 +342,12 @@ class GraphicsEngine():
 
         self.LoadEyePosition()
 
+    # Returns the PickHit of the model under the mouse position, in pixels from the top left
+    # corner of the window, or None.  The object of the hit is the model.
+    def pick(self, position):
+        origin, direction = mouseRay(position, self.screenSize, self.projectionMatrix, self.viewMatrix)
+        return self.picker.pick(origin, direction, [(self.wfmodel, self.wfmodel, self.wfmodel.Model)])
+
     # Toggle between the two cameras.
     def toggleCamera(self):
         if self.cameranum == 0:
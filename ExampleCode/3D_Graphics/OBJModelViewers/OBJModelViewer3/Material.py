@@ -6,7 +6,8 @@
 # Data stored are glm.vec4 vectors for ambient, diffuse, specular, and
 # emission and a single float shininess for the shininess exponent.
 # The class also has a function for loading the data to the shaders
-# assuming the shader uses the following struct.
+# assuming the shader uses the following struct, and one for storing it in
+# a MaterialBuffer, the uniform buffer of the struct.
 #
 # struct Material
 # {
@@ -37,15 +38,24 @@ class Material():
         self.shininess = 32
 
     # Loads the material information to the shader material struct.  The shader parameter is
-    # the shader address and the name is the variable name of the material structure variable
-    # in the shader.
+    # the ShaderProgram and the name is the variable name of the material structure variable
+    # in the shader.  Values that have not changed since the last load are not sent.
     def LoadMaterial(self, shader, name):
         glUseProgram(shader)
-        glUniform4fv(glGetUniformLocation(shader, name + ".ambient"), 1, glm.value_ptr(self.ambient))
-        glUniform4fv(glGetUniformLocation(shader, name + ".diffuse"), 1, glm.value_ptr(self.diffuse))
-        glUniform4fv(glGetUniformLocation(shader, name + ".specular"), 1, glm.value_ptr(self.specular))
-        glUniform4fv(glGetUniformLocation(shader, name + ".emission"), 1, glm.value_ptr(self.emission))
-        glUniform1f(glGetUniformLocation(shader, name + ".shininess"), self.shininess)
+        shader.setVec4(name + ".ambient", self.ambient)
+        shader.setVec4(name + ".diffuse", self.diffuse)
+        shader.setVec4(name + ".specular", self.specular)
+        shader.setVec4(name + ".emission", self.emission)
+        shader.setFloat(name + ".shininess", self.shininess)
+
+    # Stores the material information as element index of a MaterialBuffer.  Only the fields
+    # that changed are marked dirty, the buffer update function loads them to the graphics card.
+    def StoreMaterial(self, buffer, index=0):
+        buffer.set(index, "ambient", self.ambient)
+        buffer.set(index, "diffuse", self.diffuse)
+        buffer.set(index, "specular", self.specular)
+        buffer.set(index, "emission", self.emission)
+        buffer.set(index, "shininess", self.shininess)
 
     ##############################################
     #  Material Preset Functions
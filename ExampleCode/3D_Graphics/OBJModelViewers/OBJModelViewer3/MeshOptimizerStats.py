@@ -0,0 +1,51 @@
+#! /usr/bin/env python3
+#
+# Vertex cache statistics for the models in the Models directory.
+#
+# Each Wavefront OBJ model is parsed and indexed as in the OBJModel class and the
+# average cache miss ratio (ACMR) and average transform to vertex ratio (ATVR) are
+# reported for the original triangle order, for the order from the MeshOptimizer
+# and for the optimizer order with the overdraw cluster sort.  The material segments
+# of the models are kept in place, as they are when the OBJModel class optimizes.
+#
+# Usage: python3 MeshOptimizerStats.py [model directory] [cache size]
+
+import sys
+import os
+import time
+from OBJParser import *
+from MeshOptimizer import *
+
+
+if __name__ == '__main__':
+    modeldir = sys.argv[1] if len(sys.argv) > 1 else "../Models"
+    cachesize = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    optimizer = MeshOptimizer(cachesize)
+    print("Cache size:", cachesize)
+    print("%-28s %9s %8s  %13s  %13s  %13s  %7s" % ("Model", "Triangles", "Vertices", "Original",
+                                                    "Optimized", "Overdraw", "Time"))
+    print("%-28s %9s %8s  %13s  %13s  %13s  %7s" % ("", "", "", "ACMR   ATVR", "ACMR   ATVR",
+                                                    "ACMR   ATVR", "(s)"))
+
+    for root, dirs, files in sorted(os.walk(modeldir)):
+        for filename in sorted(files):
+            if not filename.lower().endswith(".obj"):
+                continue
+
+            parser = OBJParser()
+            parser.parse(os.path.join(root, filename))
+            vdata, ndata, tdata, elements = parser.index()
+            segments = [seg[1] for seg in parser.renderLayout]
+
+            before = optimizer.cacheStats(elements)
+            start = time.perf_counter()
+            optimized, vertexorder = optimizer.optimize(elements, len(vdata), segments)
+            elapsed = time.perf_counter() - start
+            after = optimizer.cacheStats(optimized)
+            overdraw, vertexorder = optimizer.optimize(elements, len(vdata), segments, vdata, True)
+            sorted_ = optimizer.cacheStats(overdraw)
+
+            print("%-28s %9d %8d  %6.3f %6.3f  %6.3f %6.3f  %6.3f %6.3f  %7.3f" %
+                  (filename, len(elements) // 3, len(vdata), before[0], before[1],
+                   after[0], after[1], sorted_[0], sorted_[1], elapsed))
@@ -8,6 +8,23 @@ Matrix, lights, materials and textures are loaded from the model class.
 The graphics engine still communicates directly with the UI and loads
 the needed information to the model class to load into the shaders.
 
+By default the materials are drawn with shared programs, one for each
+combination of texture maps used, built with the Shader loadShaderVariant
+function so that the texture switches are constants in the fragment shader.
+The materials are read from a uniform buffer range bound per segment and the
+texture maps are bound to texture units 1, 2 and 3 per segment, unit 0 is left
+for the cube map of the graphics engine.  With sharedProgram set to False each
+material gets its own program, as in the earlier versions.
+
+Each segment of the renderLayout has a bounding box and sphere, found when the
+model is loaded.  The segments are also split into clusters of up to clusterSize
+triangles, in drawing order, with a bounding volume hierarchy over the boxes of
+the clusters in model coordinates.  With cullSegments set the clusters outside of
+the view volume of the PV and Model matrices are not drawn, the frustum is moved
+to model coordinates so the hierarchy does not change when the model moves.  The
+visible clusters of a segment are drawn with one multi-draw call.  The
+visibility is kept until one of the matrices changes.
+
 Don Spickler
 4/16/2022
 """
@@ -19,9 +36,16 @@ import numpy as np
 import os
 from PIL import Image
 from Shader import *
+from OBJParser import *
+from MeshOptimizer import *
+from TextureManager import *
+from Material import *
+from UniformBuffer import *
+from Bounds import *
+from BVH import *
 
 
-class OBJMaterial():
+class OBJMaterial(Material):
     def __init__(self):
         self.name = ""
         self.ambient = glm.vec4(0, 0, 0, 1)
@@ -36,29 +60,79 @@ class OBJMaterial():
 
 
 class OBJModel():
+    # Leave out the segments and clusters of triangles that are outside of the view.
+    cullSegments = True
+    clusterSize = 128
+
     # Constructor
-    def __init__(self):
+    def __init__(self, sharedProgram=True):
         self.PVMatrix = glm.mat4(1.0)
         self.Model = glm.mat4(1.0)
         self.eye = glm.vec3(0, 0, 0)
         self.lights = []
 
-        self.objvert = open("Shaders/OBJModelVert.glsl", 'r').read()
-        self.objfrag = open("Shaders/OBJModelFrag.glsl", 'r').read()
+        self.objvertfile = "Shaders/OBJModelVert.glsl"
+        self.objfragfile = "Shaders/OBJModelFrag.glsl"
+        self.objvert = Shader().preprocessFile(self.objvertfile)
+        self.objfrag = Shader().preprocessFile(self.objfragfile)
+
+        # The shaderList entries are [material name, program, material buffer, material index,
+        # material].  The lights are in one uniform buffer read by all of the programs and the
+        # materials of each material file in one buffer with a range per material.  The
+        # shaderDict has the first entry of each material name, for the lookups in draw.
         self.shaderList = []
+        self.shaderDict = {}
+        self.lightBuffer = LightBuffer()
+        self.materialBuffers = []
+
+        # The variant programs used by the materials when the programs are shared.
+        self.sharedProgram = sharedProgram
+        self.variantPrograms = []
         self.numvertices = 0
 
+        # Element data for indexed models, numelements is 0 for non-indexed models.
+        self.numelements = 0
+        self.elementType = GL_UNSIGNED_INT
+        self.elementSize = 4
+        self.indexStats = {}
+
+        # The vertex, normal and texture coordinate arrays and the elements, None for models
+        # that are not indexed, as loaded to the graphics card.
+        self.meshData = None
+
         # The renderLayout list contains a list of list pairs.  Each pair is the name of a
         # material to be used, that matches a material from the materialsList, and the
         # vertex position on where that material is to start being used.  This allows an
         # external class, such as a graphics engine, to extract all needed data for rendering.
         self.renderLayout = []
 
+        # Bounds of the segments of the renderLayout and of the whole model, in model
+        # coordinates, and the visibility of the segments with the current matrices.
+        self.segmentBoxes = np.zeros((0, 2, 3), np.float32)
+        self.segmentSpheres = np.zeros((0, 4), np.float32)
+        self.boundingBox, self.boundingSphere = meshBounds(np.zeros((0, 3)))
+        self.frustum = Frustum()
+        self.segmentVisibility = None
+        self.culledSegments = 0
+
+        # The clusters of triangles, the first corner, the number of corners and the segment
+        # of each, the hierarchy over their boxes and the visible ranges of corners, a range
+        # is one or more visible clusters next to each other in the same segment.
+        self.clusterFirst = np.zeros(0, int)
+        self.clusterCount = np.zeros(0, int)
+        self.clusterSegment = np.zeros(0, int)
+        self.clusterBVH = BVH()
+        self.culledClusters = 0
+        self.rangeFirst = np.zeros(0, int)
+        self.rangeCount = np.zeros(0, int)
+        self.segmentRanges = np.zeros(0, int)
+
         # Keeps a list of the textures so that they can be cleared.
         self.textureList = []
 
         self.ModelVAO = glGenVertexArrays(1)
         self.ArrayBuffer = glGenBuffers(1)
+        self.ElementBuffer = glGenBuffers(1)
 
     def __del__(self):
         self.clearData()
@@ -83,22 +157,14 @@ class OBJModel():
     def makeDataListInt(self, datastring):
         return [int(n) for n in self.stringList(datastring)]
 
-    # Load a texture object, assign it to an active texture and set its attributes.
+    # Load a texture object through the texture manager, materials that use the same image
+    # share one texture.  Each call adds a reference that clearData releases.
     def loadTexture(self, path, filename):
-        texturefilename = path + filename
-        teximg = Image.open(texturefilename).convert('RGBA').transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.asarray(teximg)
-        texID = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_2D, texID)
-        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, teximg.size[0], teximg.size[1], 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
-        glGenerateMipmap(GL_TEXTURE_2D)
-        glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-
-        return texID
+        return textureManager.acquire(path + filename)
+
+    # Load a list of textures at once, the images are decoded in parallel.
+    def loadTextures(self, path, filenames):
+        return textureManager.acquireAll([path + filename for filename in filenames])
 
     # This function loads the material from the material file that is referenced in the
     # Wavefront OBJ file.
@@ -107,6 +173,9 @@ class OBJModel():
         materialdata = materialdatatext.split("\n")
         materialsList = []
 
+        # Texture maps are collected as [material, attribute, filename] and loaded together.
+        textureMaps = []
+
         # Process line by line, beginning of the line designates that type of data to be loaded
         # into the material attribute structure.
         for i in range(len(materialdata)):
@@ -127,40 +196,42 @@ class OBJModel():
             elif line.startswith("Ke "):
                 materialsList[lastmat].emission = self.makeColorGLMVector(line[3:])
             elif line.startswith("map_Ka "):
-                filename = os.path.basename(line[7:])
-                tex = self.loadTexture(path, filename)
-                materialsList[lastmat].ambientTexture = tex
-                self.textureList.append(tex)
+                textureMaps.append([materialsList[lastmat], "ambientTexture", os.path.basename(line[7:])])
             elif line.startswith("map_Kd "):
-                filename = os.path.basename(line[7:])
-                tex = self.loadTexture(path, filename)
-                materialsList[lastmat].diffuseTexture = tex
-                self.textureList.append(tex)
+                textureMaps.append([materialsList[lastmat], "diffuseTexture", os.path.basename(line[7:])])
             elif line.startswith("map_Ks "):
-                filename = os.path.basename(line[7:])
-                tex = self.loadTexture(path, filename)
-                materialsList[lastmat].specularTexture = tex
-                self.textureList.append(tex)
+                textureMaps.append([materialsList[lastmat], "specularTexture", os.path.basename(line[7:])])
 
         if len(materialsList) == 0:
             return
 
+        texIDs = self.loadTextures(path, [texmap[2] for texmap in textureMaps])
+        for texmap, tex in zip(textureMaps, texIDs):
+            setattr(texmap[0], texmap[1], tex)
+            self.textureList.append(tex)
+
+        # Store the materials in a uniform buffer, loaded with a single call.
+        materialBuffer = MaterialBuffer(len(materialsList))
+        for i in range(len(materialsList)):
+            materialsList[i].StoreMaterial(materialBuffer, i)
+        materialBuffer.update()
+        self.materialBuffers.append(materialBuffer)
+
+        # With shared programs the textures and material range are bound when drawing.
+        if self.sharedProgram:
+            for i in range(len(materialsList)):
+                prog = self.variantProgram(materialsList[i])
+                materialBuffer.attach(prog)
+                self.addShaderEntry([materialsList[i].name, prog, materialBuffer, i, materialsList[i]])
+            self.LoadAll()
+            return
+
         # Create dummy program to retrieve the locations of the uniform variables.
         # Since the shaders are all the same the uniforms will have the same positions
         # and hence can be used in multiple shaders.
         shader = Shader()
         prog = shader.loadShaders(self.objvert, self.objfrag)
         glUseProgram(prog)
-        self.PVLoc = glGetUniformLocation(prog, "PV")
-        self.ModelLoc = glGetUniformLocation(prog, "Model")
-        self.NormalLoc = glGetUniformLocation(prog, "NormalMatrix")
-        self.EyeLoc = glGetUniformLocation(prog, "eye")
-
-        aloc = glGetUniformLocation(prog, "Mat.ambient")
-        dloc = glGetUniformLocation(prog, "Mat.diffuse")
-        sloc = glGetUniformLocation(prog, "Mat.specular")
-        eloc = glGetUniformLocation(prog, "Mat.emission")
-        shloc = glGetUniformLocation(prog, "Mat.shininess")
 
         atexloc = glGetUniformLocation(prog, "atex")
         dtexloc = glGetUniformLocation(prog, "dtex")
@@ -178,14 +249,12 @@ class OBJModel():
 
         # Convert marterials to shaders. So each material in the model will have
         # its own separate shader.
-        for mat in materialsList:
+        for i in range(len(materialsList)):
+            mat = materialsList[i]
             prog = shader.loadShaders(self.objvert, self.objfrag)
             glUseProgram(prog)
-            glUniform4fv(aloc, 1, glm.value_ptr(mat.ambient))
-            glUniform4fv(dloc, 1, glm.value_ptr(mat.diffuse))
-            glUniform4fv(sloc, 1, glm.value_ptr(mat.specular))
-            glUniform4fv(eloc, 1, glm.value_ptr(mat.emission))
-            glUniform1f(shloc, mat.shininess)
+            self.lightBuffer.attach(prog)
+            materialBuffer.attach(prog)
 
             if mat.ambientTexture:
                 glActiveTexture(GL_TEXTURE0 + mat.ambientTexture)
@@ -211,9 +280,40 @@ class OBJModel():
             else:
                 glUniform1i(susetexloc, False)
 
-            shaderentry = [mat.name, prog]
-            self.shaderList.append(shaderentry)
+            shaderentry = [mat.name, prog, materialBuffer, i, mat]
+            self.addShaderEntry(shaderentry)
+
+        self.LoadAll()
 
+    # Returns the shared program for the texture maps of the material.  The programs come
+    # from the variant cache of the Shader class and are set up the first time they are used.
+    def variantProgram(self, mat):
+        defines = {"USE_ATEX": bool(mat.ambientTexture),
+                   "USE_DTEX": bool(mat.diffuseTexture),
+                   "USE_STEX": bool(mat.specularTexture)}
+        prog = Shader().loadShaderVariant(self.objvertfile, self.objfragfile, defines)
+        if prog not in self.variantPrograms:
+            glUseProgram(prog)
+            self.lightBuffer.attach(prog)
+            prog.setInt("atex", 1)
+            prog.setInt("dtex", 2)
+            prog.setInt("stex", 3)
+            self.variantPrograms.append(prog)
+        return prog
+
+    def addShaderEntry(self, shaderentry):
+        self.shaderList.append(shaderentry)
+        self.shaderDict.setdefault(shaderentry[0], shaderentry)
+
+    # Returns the programs to load the uniforms to, the shared program or the program of
+    # each material.
+    def programs(self):
+        if self.sharedProgram:
+            return self.variantPrograms
+        return [sh[1] for sh in self.shaderList]
+
+    # Loads the stored matrices, lights and eye position to the programs.
+    def LoadAll(self):
         self.LoadMatrices(self.Model)
         self.LoadPV(self.PVMatrix)
         self.LoadLights(self.lights)
@@ -222,15 +322,40 @@ class OBJModel():
     # Load the data from the file into vertex, normal, and texture coordinate structures.
     # This data is then loaded into a single VBO and VAO.  The renderLayout list keeps the
     # vertex numbers for each segment and this can be used in the glDrawArrays command either
-    # in this class or in an external class.
-    def load(self, path, filename):
+    # in this class or in an external class.  By default the file is read with the streaming
+    # OBJParser, setting streaming to False uses the original line by line loader.
+    #
+    # If indexed is True (streaming loader only) duplicate vertices are merged and the model
+    # is drawn with glDrawElements.  The renderLayout positions are then element positions.
+    # Indexed models can be run through the MeshOptimizer before they are loaded to the
+    # graphics card, by setting optimize, and overdraw to also sort the triangle clusters.
+    def load(self, path, filename, streaming=True, indexed=True, optimize=False, overdraw=False):
         self.clearData()
 
-        vPosition = 0
-        vColor = 1  # Unused but in some shaders.
-        vNormal = 2
-        vTex = 3
+        if not streaming:
+            self.loadLineByLine(path, filename)
+            return
 
+        parser = OBJParser()
+        parser.parse(path + filename)
+
+        for materialfile in parser.materialFiles:
+            self.loadMaterials(path, materialfile)
+        self.renderLayout = parser.renderLayout
+
+        if indexed:
+            vdata, ndata, tdata, elements = parser.index()
+            if optimize:
+                segments = [seg[1] for seg in self.renderLayout]
+                elements, order = MeshOptimizer().optimize(elements, len(vdata), segments, vdata, overdraw)
+                vdata, ndata, tdata = vdata[order], ndata[order], tdata[order]
+            self.LoadDataToGraphicsCard(vdata, ndata, tdata, elements)
+        else:
+            vdata, ndata, tdata = parser.deindex()
+            self.LoadDataToGraphicsCard(vdata, ndata, tdata)
+
+    # Line by line loader, the face data is expanded in Python lists.
+    def loadLineByLine(self, path, filename):
         modeldatatext = open(path + filename, 'r').read()
         modeldata = modeldatatext.split("\n")
 
@@ -318,6 +443,21 @@ class OBJModel():
         vdata = np.array(GC_vertexdata).astype(ctypes.c_float)
         tdata = np.array(GC_texcoorddata).astype(ctypes.c_float)
         ndata = np.array(GC_normaldata).astype(ctypes.c_float)
+        self.LoadDataToGraphicsCard(vdata, ndata, tdata)
+
+    # Load vertex, normal and texture coordinate arrays to the VBO and set the attributes
+    # of the VAO.  Without elements the arrays have one entry per face corner.  With an
+    # element array (uint16 or uint32) the arrays hold the unique vertices and the
+    # elements are loaded to the element buffer of the VAO.
+    def LoadDataToGraphicsCard(self, vdata, ndata, tdata, elements=None):
+        vPosition = 0
+        vColor = 1  # Unused but in some shaders.
+        vNormal = 2
+        vTex = 3
+
+        vdata = np.ascontiguousarray(vdata, dtype=np.float32).ravel()
+        ndata = np.ascontiguousarray(ndata, dtype=np.float32).ravel()
+        tdata = np.ascontiguousarray(tdata, dtype=np.float32).ravel()
         floatsz = ctypes.sizeof(ctypes.c_float)
 
         # Bind (turn on) a vertex array.
@@ -345,74 +485,262 @@ class OBJModel():
         glEnableVertexAttribArray(vTex)
 
         self.numvertices = len(vdata) // 3
+        self.numelements = 0
+        self.meshData = (vdata, ndata, tdata, elements)
+        self.findSegmentBounds(vdata, elements)
+
+        if elements is not None:
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ElementBuffer)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, elements.nbytes, elements, GL_STATIC_DRAW)
+            self.numelements = len(elements)
+            self.elementSize = elements.itemsize
+            if elements.dtype == np.uint16:
+                self.elementType = GL_UNSIGNED_SHORT
+            else:
+                self.elementType = GL_UNSIGNED_INT
+
+        # Memory and vertex processing compared to drawing one vertex per face corner.
+        # With indexing each unique vertex is shaded at least once and at most once per
+        # corner, the lower bound is reached with an unbounded post-transform cache.
+        numcorners = self.numelements if elements is not None else self.numvertices
+        vertexsize = floatsz * 8
+        self.indexStats = {"corners": numcorners,
+                           "vertices": self.numvertices,
+                           "deindexedBytes": numcorners * vertexsize,
+                           "indexedBytes": self.numvertices * vertexsize + self.numelements * self.elementSize,
+                           "shaderInvocationsAvoided": numcorners - self.numvertices}
+
+    # Finds the bounding box and sphere of the model and of each segment of the renderLayout.
+    # The corners of the triangles are put in drawing order, so the boxes and the farthest
+    # corners from their centers are found for all of the segments at once with reduceat.
+    # Empty segments get a box and sphere of size 0 at the origin.
+    def findSegmentBounds(self, vdata, elements=None):
+        points = np.asarray(vdata, np.float32).reshape(-1, 3)
+        self.boundingBox, self.boundingSphere = meshBounds(points)
+        if elements is not None:
+            points = points[elements]
+
+        starts = np.array([segment[1] for segment in self.renderLayout], dtype=int)
+        ends = np.append(starts[1:], len(points)).astype(int)
+        self.segmentBoxes = np.zeros((len(starts), 2, 3), np.float32)
+        self.segmentSpheres = np.zeros((len(starts), 4), np.float32)
+        self.segmentVisibility = None
+        nonempty = np.flatnonzero(ends > starts)
+        self.findClusters(points, starts, ends)
+        if len(nonempty) == 0:
+            return
 
+        first = starts[nonempty]
+        self.segmentBoxes[nonempty, 0] = np.minimum.reduceat(points, first)
+        self.segmentBoxes[nonempty, 1] = np.maximum.reduceat(points, first)
+        centers = (self.segmentBoxes[:, 0] + self.segmentBoxes[:, 1]) / 2
+        segmentOf = np.repeat(np.arange(len(starts)), ends - starts)
+        distances = np.sqrt(((points[starts[0]:] - centers[segmentOf]) ** 2).sum(axis=1))
+        self.segmentSpheres[:, 0:3] = centers
+        self.segmentSpheres[nonempty, 3] = np.maximum.reduceat(distances, first - starts[0])
+
+    # Splits the segments, given by their first and end corners in the points in drawing
+    # order, into clusters of up to clusterSize triangles and builds the hierarchy over the
+    # boxes of the clusters.  A cluster never crosses the start of a segment.
+    def findClusters(self, points, starts, ends):
+        step = 3 * self.clusterSize
+        first = [np.arange(starts[i], ends[i], step) for i in range(len(starts))]
+        self.clusterFirst = np.concatenate(first + [np.zeros(0, int)]).astype(int)
+        self.clusterSegment = np.repeat(np.arange(len(starts)), [len(f) for f in first]).astype(int)
+        self.clusterCount = np.minimum(self.clusterFirst + step, ends[self.clusterSegment]) - self.clusterFirst
+        boxes = np.zeros((len(self.clusterFirst), 2, 3), np.float32)
+        if len(self.clusterFirst) > 0:
+            boxes[:, 0] = np.minimum.reduceat(points, self.clusterFirst)
+            boxes[:, 1] = np.maximum.reduceat(points, self.clusterFirst)
+        self.clusterBVH = BVH(boxes)
+
+    # Returns a boolean array, True for the segments that can be seen with the current PV and
+    # Model matrices.  The planes of the frustum are found in model coordinates and the
+    # hierarchy returns the visible clusters.  Clusters next to each other in the same segment
+    # are joined into one range of corners, the ranges of segment i are rangeFirst and
+    # rangeCount from segmentRanges[i] to segmentRanges[i + 1].
+    def visibleSegments(self):
+        if self.segmentVisibility is None:
+            self.frustum.set(self.PVMatrix * self.Model)
+            clusters = self.clusterBVH.queryFrustum(self.frustum)
+            self.culledClusters = len(self.clusterFirst) - len(clusters)
+
+            joined = np.zeros(len(clusters), bool)
+            joined[1:] = (np.diff(clusters) == 1) & (np.diff(self.clusterSegment[clusters]) == 0)
+            runs = np.flatnonzero(~joined)
+            self.rangeFirst = self.clusterFirst[clusters[runs]]
+            self.rangeCount = np.add.reduceat(self.clusterCount[clusters], runs) if len(runs) > 0 else runs
+            rangeSegment = self.clusterSegment[clusters[runs]]
+            self.segmentRanges = np.searchsorted(rangeSegment, np.arange(len(self.renderLayout) + 1))
+
+            visible = np.diff(self.segmentRanges) > 0
+            self.segmentVisibility = visible
+            self.culledSegments = len(visible) - int(visible.sum())
+        return self.segmentVisibility
+
+    # Prints the memory used by the model data and the vertex shader invocations avoided
+    # by indexing.
+    def printIndexStats(self):
+        stats = self.indexStats
+        if len(stats) == 0 or stats["corners"] == 0:
+            return
+        saved = stats["deindexedBytes"] - stats["indexedBytes"]
+        print("Face corners:", stats["corners"], " Unique vertices:", stats["vertices"])
+        print("Vertex data: %d bytes, %d bytes without indexing, %d bytes (%.1f%%) saved" %
+              (stats["indexedBytes"], stats["deindexedBytes"], saved, 100 * saved / stats["deindexedBytes"]))
+        print("Vertex shader invocations avoided: up to", stats["shaderInvocationsAvoided"],
+              "(%.2f corners per vertex)" % (stats["corners"] / stats["vertices"]))
+
+    # The uniforms are set through the ShaderProgram setters, so programs that already
+    # have the values are skipped.  The lights are stored in the light buffer, shared by
+    # all of the programs, and only the changed part of it is loaded.
     def LoadMatrices(self, model):
         NM = glm.inverse(glm.transpose(glm.mat3(model)))
         self.Model = model
-        for sh in self.shaderList:
-            glUseProgram(sh[1])
-            glUniformMatrix4fv(self.ModelLoc, 1, GL_FALSE, glm.value_ptr(model))
-            glUniformMatrix3fv(self.NormalLoc, 1, GL_FALSE, glm.value_ptr(NM))
+        self.segmentVisibility = None
+        for prog in self.programs():
+            glUseProgram(prog)
+            prog.setMat4("Model", model)
+            prog.setMat3("NormalMatrix", NM)
+
+    # Returns the number of the segment of the renderLayout that triangle number triangle is
+    # drawn in.
+    def triangleSegment(self, triangle):
+        starts = [segment[1] for segment in self.renderLayout]
+        return max(int(np.searchsorted(starts, 3 * triangle, side='right')) - 1, 0)
 
     def LoadPV(self, PV):
         self.PVMatrix = PV
-        for sh in self.shaderList:
-            glUseProgram(sh[1])
-            glUniformMatrix4fv(self.PVLoc, 1, GL_FALSE, glm.value_ptr(PV))
+        self.segmentVisibility = None
+        for prog in self.programs():
+            glUseProgram(prog)
+            prog.setMat4("PV", PV)
 
     def LoadLights(self, lights):
         self.lights = lights
-        for sh in self.shaderList:
-            glUseProgram(sh[1])
-            i = 0
-            glUniform1i(glGetUniformLocation(sh[1], "numLights"), len(lights))
-            for light in lights:
-                light.LoadLight(sh[1], "Lt[" + str(i) + "]")
-                i += 1
+        for i in range(len(lights)):
+            lights[i].StoreLight(self.lightBuffer, i)
+        self.lightBuffer.update()
+
+        for prog in self.programs():
+            glUseProgram(prog)
+            prog.setInt("numLights", len(lights))
 
     def LoadEye(self, eye):
         self.eye = eye
-        for sh in self.shaderList:
-            glUseProgram(sh[1])
-            glUniform3fv(self.EyeLoc, 1, glm.value_ptr(eye))
+        for prog in self.programs():
+            glUseProgram(prog)
+            prog.setVec3("eye", eye)
 
-    # Sends all the segments through the pipeline.
+    # Sends all the segments through the pipeline.  Only the state that differs from the
+    # previous segment is changed, consecutive segments with the same material change nothing.
+    # Segments outside of the view are skipped before any of their state is set and only the
+    # visible ranges of the others are drawn.
     def draw(self):
         glBindVertexArray(self.ModelVAO)
+        if len(self.shaderList) == 0:
+            return
+
+        # The program, material range and textures of the previous segment.
+        current = None
+        program = None
+        materialRange = None
+        boundTextures = [None, None, None]
+        visible = self.visibleSegments() if self.cullSegments else None
+
         for i in range(len(self.renderLayout)):
+            if visible is not None and not visible[i]:
+                continue
             matname = self.renderLayout[i][0]
 
-            # Find the shader program to use, that matches the material of the segment.
-            for sh in self.shaderList:
-                if sh[0] == matname:
-                    break
-
-            # Use the shader program.
-            glUseProgram(sh[1])
+            # Find the shader entry that matches the material of the segment, the last entry
+            # if there is no match.
+            sh = self.shaderDict.get(matname, self.shaderList[-1])
+
+            if sh is not current:
+                current = sh
+                if sh[1] is not program:
+                    program = sh[1]
+                    glUseProgram(program)
+                if materialRange != (sh[2], sh[3]):
+                    materialRange = (sh[2], sh[3])
+                    sh[2].bindRange(sh[3])
+                if self.sharedProgram:
+                    self.bindTextures(sh[4], boundTextures)
+
+            # Draw the visible ranges of the segment.
+            if visible is not None:
+                self.drawRanges(self.segmentRanges[i], self.segmentRanges[i + 1])
+                continue
 
             # Draw the segment.
             start = self.renderLayout[i][1]
             if i == len(self.renderLayout) - 1:
-                end = self.numvertices
+                end = self.numelements if self.numelements > 0 else self.numvertices
             else:
                 end = self.renderLayout[i + 1][1]
-            glDrawArrays(GL_TRIANGLES, start, end - start)
+            if self.numelements > 0:
+                glDrawElements(GL_TRIANGLES, end - start, self.elementType,
+                               ctypes.c_void_p(start * self.elementSize))
+            else:
+                glDrawArrays(GL_TRIANGLES, start, end - start)
+
+    # Draws the ranges of corners from first to last, one range with a single draw call and
+    # more with a multi-draw call.
+    def drawRanges(self, first, last):
+        if last - first == 1:
+            if self.numelements > 0:
+                glDrawElements(GL_TRIANGLES, int(self.rangeCount[first]), self.elementType,
+                               ctypes.c_void_p(int(self.rangeFirst[first]) * self.elementSize))
+            else:
+                glDrawArrays(GL_TRIANGLES, int(self.rangeFirst[first]), int(self.rangeCount[first]))
+            return
 
-    # Removes the data, VAO, VBO, and textures from the graphics card.
+        counts = self.rangeCount[first:last].astype(np.int32)
+        if self.numelements > 0:
+            offsets = (self.rangeFirst[first:last] * self.elementSize).astype(np.uintp)
+            glMultiDrawElements(GL_TRIANGLES, counts, self.elementType, offsets, last - first)
+        else:
+            glMultiDrawArrays(GL_TRIANGLES, self.rangeFirst[first:last].astype(np.int32), counts, last - first)
+
+    # Binds the texture maps of the material to texture units 1, 2 and 3 for the shared programs.
+    # The boundTextures list has the texture bound to each unit, units that already have the
+    # texture are not bound again.
+    def bindTextures(self, mat, boundTextures):
+        maps = [mat.ambientTexture, mat.diffuseTexture, mat.specularTexture]
+        for unit in range(3):
+            tex = maps[unit]
+            if tex and boundTextures[unit] != tex:
+                glActiveTexture(GL_TEXTURE1 + unit)
+                glBindTexture(GL_TEXTURE_2D, tex)
+                boundTextures[unit] = tex
+
+    # Removes the data, VAO, VBO, and texture references from the graphics card.
     def clearData(self):
         try:
             glBindVertexArray(self.ModelVAO)
             glBindBuffer(GL_ARRAY_BUFFER, self.ArrayBuffer)
             glBufferData(GL_ARRAY_BUFFER, 0, None, GL_STATIC_DRAW)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ElementBuffer)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, 0, None, GL_STATIC_DRAW)
+            self.numelements = 0
+            self.indexStats = {}
 
+            # Textures can be shared with other models, only the references are released.
             for tex in self.textureList:
-                glDeleteTextures(np.array(tex))
+                textureManager.release(tex)
 
-            for sh in self.shaderList:
-                glDeleteProgram(sh[1])
+            # The shared programs are kept for the next model.
+            if not self.sharedProgram:
+                for sh in self.shaderList:
+                    glDeleteProgram(sh[1])
+            for materialBuffer in self.materialBuffers:
+                materialBuffer.delete()
 
             self.textureList = []
             self.shaderList = []
+            self.shaderDict = {}
+            self.materialBuffers = []
             self.renderLayout = []
         except Exception as err:
             self.textureList = []
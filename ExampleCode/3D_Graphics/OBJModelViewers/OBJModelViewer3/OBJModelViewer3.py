@@ -99,6 +99,10 @@
 # If the wheel is moved then the camera will be moved foward and backward by
 # the amount of the wheel movement.
 #
+# For either camera, a click of the right mouse button picks the triangle of the model
+# under the mouse and prints the triangle, its material and the barycentric coordinates
+# of the point in the triangle.
+#
 # Don Spickler
 # 1/6/2022
 
@@ -0,0 +1,338 @@
+#! /usr/bin/env python3
+
+"""
+OBJ Parser object
+
+Streaming parser for Wavefront OBJ files.  The file is read in fixed size chunks
+and the lines of each chunk are only sorted by type in Python, all of the numeric
+conversion is done in bulk by NumPy.  Consecutive face lines with the same layout
+(v, v/t, v//n or v/t/n) and number of corners form a run that is converted with a
+single call and stored as an array of index triples, one (v, t, n) triple for each
+face corner.
+
+Faces with more than three corners are triangulated as fans, which is done for a
+whole run at once by selecting corners with an index array.  Once the positions
+are known, the polygons of four or more corners are checked for convexity in
+bulk and only the concave ones are triangulated again.  A polygon with a single reflex
+corner is star shaped from that corner and is fanned from there, again in bulk,
+and only polygons with several reflex corners are ear clipped one at a time.
+All of these give n - 2 triangles for an n-gon, so the faces are replaced in
+place.
+Faces with negative (relative) indices record the number of attributes read up
+to that point in the file and are resolved with the rest of their run.
+
+After parsing, the face corners are resolved against the attribute arrays with
+fancy indexing.  Corners that have no texture coordinate or normal index point
+to an extra zero row at the end of those arrays, which gives the same zero
+filled data as the line by line loader in the OBJModel class.
+
+The corners can also be resolved to an indexed mesh, where each unique (v, t, n)
+triple becomes one vertex and the faces are stored in an element array.  Since the
+element array has one entry per face corner, in the original order, the positions
+in the renderLayout are the same for both forms.
+
+The renderLayout list has the same meaning as in the OBJModel class, pairs of
+material name and the vertex (face corner) number where the material starts.
+"""
+
+import numpy as np
+
+
+class OBJParser():
+    # Face corner layouts, the number of integers per corner and which of the
+    # v, t, n slots they fill.
+    layouts = {"v": (1, [0]), "v/t": (2, [0, 1]), "v//n": (2, [0, 2]), "v/t/n": (3, [0, 1, 2])}
+
+    # Constructor
+    def __init__(self, chunksize=1 << 22):
+        self.chunksize = chunksize
+        self.clear()
+
+    # Resets the parser to an empty model.
+    def clear(self):
+        self.positions = np.zeros((0, 3), np.float32)
+        self.normals = np.zeros((0, 3), np.float32)
+        self.texcoords = np.zeros((0, 2), np.float32)
+        self.corners = np.zeros((0, 3), np.int64)
+        self.renderLayout = []
+        self.materialFiles = []
+
+        self.vertexLines = []
+        self.normalLines = []
+        self.texcoordLines = []
+        self.vertexBlocks = []
+        self.normalBlocks = []
+        self.texcoordBlocks = []
+        self.cornerBlocks = []
+        self.faceRun = []
+        self.faceRunKey = None
+        self.faceRunCounts = []
+        self.numcorners = 0
+        self.attributeCounts = [0, 0, 0]
+        self.polygonRuns = []
+
+    # Returns the layout name of a face corner string, such as 12/4/7.
+    def cornerLayout(self, corner):
+        numsep = corner.count("/")
+        if numsep == 0:
+            return "v"
+        elif numsep == 1:
+            return "v/t"
+        elif "//" in corner:
+            return "v//n"
+        return "v/t/n"
+
+    # Converts the lines of an attribute type in bulk and keeps the first size
+    # components of each line.  Lines with extra components, such as the optional
+    # w coordinate, are handled by splitting the lines individually.
+    def convertAttributeLines(self, lines, size):
+        data = np.fromstring(" ".join(lines), dtype=np.float32, sep=" ")
+        if len(data) == size * len(lines):
+            return data.reshape(-1, size)
+        return np.array([line.split()[0:size] for line in lines], np.float32)
+
+    # Converts the current run of face lines to corner index triples.
+    def flushFaceRun(self):
+        if len(self.faceRun) == 0:
+            return
+
+        layout, numfacecorners = self.faceRunKey
+        numints, slots = self.layouts[layout]
+        data = " ".join(self.faceRun).replace("//", " ").replace("/", " ")
+        ints = np.fromstring(data, dtype=np.int64, sep=" ").reshape(len(self.faceRun), numfacecorners, numints)
+
+        # Negative indices count back from the last attribute read before the face,
+        # -1 is the last one.  Missing slots are marked with 0, which is not a valid
+        # OBJ index.
+        corners = np.zeros((len(self.faceRun), numfacecorners, 3), np.int64)
+        corners[:, :, slots] = ints
+        if len(self.faceRunCounts) > 0:
+            faces, counts = zip(*self.faceRunCounts)
+            faces = np.array(faces, np.int64)
+            counts = np.array(counts, np.int64)[:, None, :] + 1
+            relative = corners[faces]
+            relative += np.where(relative < 0, counts, 0)
+            corners[faces] = relative
+
+        # Fan triangulation, triangle i of each face uses corners 0, i + 1 and i + 2.
+        if numfacecorners > 3:
+            self.polygonRuns.append((self.numcorners, len(self.faceRun), numfacecorners))
+            corners = corners[:, self.fanCorners(numfacecorners), :]
+        corners = corners.reshape(-1, 3)
+
+        self.cornerBlocks.append(corners)
+        self.numcorners += len(corners)
+        self.faceRun = []
+        self.faceRunKey = None
+        self.faceRunCounts = []
+
+    # Returns the (n - 2, 3) array of corner numbers of the fan triangulation of an n-gon.
+    def fanCorners(self, numfacecorners):
+        fan = np.arange(1, numfacecorners - 1)
+        return np.stack([np.zeros_like(fan), fan, fan + 1], axis=1)
+
+    # Converts the attribute lines collected from the current chunk.
+    def flushAttributes(self):
+        if len(self.vertexLines) > 0:
+            self.vertexBlocks.append(self.convertAttributeLines(self.vertexLines, 3))
+            self.attributeCounts[0] += len(self.vertexLines)
+            self.vertexLines = []
+        if len(self.texcoordLines) > 0:
+            self.texcoordBlocks.append(self.convertAttributeLines(self.texcoordLines, 2))
+            self.attributeCounts[1] += len(self.texcoordLines)
+            self.texcoordLines = []
+        if len(self.normalLines) > 0:
+            self.normalBlocks.append(self.convertAttributeLines(self.normalLines, 3))
+            self.attributeCounts[2] += len(self.normalLines)
+            self.normalLines = []
+
+    # Sort the lines of a chunk by type.  Numeric data is only collected here and
+    # converted when the chunk is flushed.  Faces with relative indices store the
+    # attribute counts at that line with their position in the run.
+    def processLines(self, lines):
+        for line in lines:
+            if line.startswith("v "):
+                self.vertexLines.append(line[2:])
+            elif line.startswith("vn "):
+                self.normalLines.append(line[3:])
+            elif line.startswith("vt "):
+                self.texcoordLines.append(line[3:])
+            elif line.startswith("f "):
+                face = line[2:].split()
+                if len(face) == 0:
+                    continue
+                key = (self.cornerLayout(face[0]), len(face))
+                if key != self.faceRunKey:
+                    self.flushFaceRun()
+                    self.faceRunKey = key
+                if "-" in line:
+                    self.faceRunCounts.append((len(self.faceRun),
+                                               (self.attributeCounts[0] + len(self.vertexLines),
+                                                self.attributeCounts[1] + len(self.texcoordLines),
+                                                self.attributeCounts[2] + len(self.normalLines))))
+                self.faceRun.append(line[2:])
+            elif line.startswith("usemtl "):
+                self.flushFaceRun()
+                self.renderLayout.append([line[7:].strip(), self.numcorners])
+            elif line.startswith("mtllib "):
+                self.materialFiles.append(line[7:].strip())
+
+        self.flushFaceRun()
+        self.flushAttributes()
+
+    # Parse the file, reading it in chunks of chunksize characters.
+    def parse(self, filename):
+        self.clear()
+
+        remainder = ""
+        with open(filename, 'r') as file:
+            while True:
+                chunk = file.read(self.chunksize)
+                if len(chunk) == 0:
+                    break
+                lines = (remainder + chunk).split("\n")
+                remainder = lines.pop()
+                self.processLines(lines)
+        self.processLines([remainder])
+
+        if len(self.vertexBlocks) > 0:
+            self.positions = np.concatenate(self.vertexBlocks)
+        if len(self.normalBlocks) > 0:
+            self.normals = np.concatenate(self.normalBlocks)
+        if len(self.texcoordBlocks) > 0:
+            self.texcoords = np.concatenate(self.texcoordBlocks)
+        if len(self.cornerBlocks) > 0:
+            self.corners = np.concatenate(self.cornerBlocks)
+
+        self.vertexBlocks = []
+        self.normalBlocks = []
+        self.texcoordBlocks = []
+        self.cornerBlocks = []
+
+        # OBJ indexing starts at 1, missing indices (0) point to the zero row that
+        # is appended to the end of the attribute arrays.
+        self.corners -= 1
+        self.corners[self.corners[:, 1] < 0, 1] = len(self.texcoords)
+        self.corners[self.corners[:, 2] < 0, 2] = len(self.normals)
+
+        for run in self.polygonRuns:
+            self.fixConcavePolygons(*run)
+        self.polygonRuns = []
+
+    # Re-triangulates the concave polygons of a fan triangulated run of faces.  The run
+    # starts at corner start and has numfaces faces with numfacecorners corners each.
+    def fixConcavePolygons(self, start, numfaces, numfacecorners):
+        numtris = numfacecorners - 2
+        block = self.corners[start:start + 3 * numtris * numfaces].reshape(numfaces, numtris, 3, 3)
+
+        # Recover the polygon corners from the fans, corners 0, 1, 2 from the first
+        # triangle and then the last corner of each following triangle.
+        polygons = np.concatenate([block[:, 0, :, :], block[:, 1:, 2, :]], axis=1)
+        points = self.positions[polygons[:, :, 0]].astype(np.float64)
+
+        # Polygon normals by Newell's method, a polygon is convex if every turn
+        # between consecutive edges agrees with the normal.
+        following = np.roll(points, -1, axis=1)
+        normals = np.cross(points, following).sum(axis=1)
+        edges = following - points
+        turns = np.einsum('fij,fj->fi', np.cross(edges, np.roll(edges, -1, axis=1)), normals)
+        scale = np.abs(turns).max(axis=1, initial=0) * 1e-9
+        reflex = turns < -scale[:, None]
+        numreflex = reflex.sum(axis=1)
+
+        # Turn i is at corner i + 1, polygons with one reflex corner are fanned from it.
+        single = np.nonzero(numreflex == 1)[0]
+        if len(single) > 0:
+            first = (np.argmax(reflex[single], axis=1) + 1)[:, None]
+            rotated = (first + np.arange(numfacecorners)) % numfacecorners
+            rotated = polygons[single[:, None], rotated]
+            block[single] = rotated[:, self.fanCorners(numfacecorners), :]
+
+        for f in np.nonzero(numreflex > 1)[0]:
+            triangles = self.earClip(points[f], normals[f])
+            block[f] = polygons[f][triangles]
+
+        self.corners[start:start + 3 * numtris * numfaces] = block.reshape(-1, 3)
+
+    # Ear clipping triangulation of a single polygon with the given normal.  Returns a
+    # (n - 2, 3) array of polygon corner numbers.  If no ear can be found, for example
+    # in a degenerate polygon, the remaining corners are triangulated as a fan.
+    def earClip(self, points, normal):
+        # Project to the coordinate plane most parallel to the polygon, keeping the
+        # orientation so that the polygon is counterclockwise.
+        axis = np.argmax(np.abs(normal))
+        uv = np.delete(points, axis, axis=1)
+        if (normal[axis] < 0) != (axis == 1):
+            uv = uv[:, ::-1]
+
+        def cross(a, b, c):
+            return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+        remaining = list(range(len(points)))
+        triangles = []
+        while len(remaining) > 3:
+            n = len(remaining)
+            for k in range(n):
+                a, b, c = remaining[k - 1], remaining[k], remaining[(k + 1) % n]
+                if cross(uv[a], uv[b], uv[c]) <= 0:
+                    continue
+                inside = False
+                for p in remaining:
+                    if p in (a, b, c):
+                        continue
+                    if cross(uv[a], uv[b], uv[p]) >= 0 and cross(uv[b], uv[c], uv[p]) >= 0 and \
+                            cross(uv[c], uv[a], uv[p]) >= 0:
+                        inside = True
+                        break
+                if not inside:
+                    triangles.append([a, b, c])
+                    remaining.pop(k)
+                    break
+            else:
+                break
+
+        for k in range(1, len(remaining) - 1):
+            triangles.append([remaining[0], remaining[k], remaining[k + 1]])
+
+        return np.array(triangles, np.int64)
+
+    # Returns contiguous float32 vertex, normal and texture coordinate arrays with one
+    # entry per face corner, ready to be drawn with glDrawArrays.
+    def deindex(self):
+        normals = np.concatenate([self.normals, np.zeros((1, 3), np.float32)])
+        texcoords = np.concatenate([self.texcoords, np.zeros((1, 2), np.float32)])
+
+        vdata = np.ascontiguousarray(self.positions[self.corners[:, 0]])
+        ndata = np.ascontiguousarray(normals[self.corners[:, 2]])
+        tdata = np.ascontiguousarray(texcoords[self.corners[:, 1]])
+        return vdata, ndata, tdata
+
+    # Returns an indexed form of the mesh, float32 vertex, normal and texture coordinate
+    # arrays with one entry per unique (v, t, n) triple, and the element array with one
+    # entry per face corner.  Unique vertices are numbered in order of first use.  The
+    # element array is uint16 if the vertex count allows it and uint32 otherwise.
+    def index(self):
+        normals = np.concatenate([self.normals, np.zeros((1, 3), np.float32)])
+        texcoords = np.concatenate([self.texcoords, np.zeros((1, 2), np.float32)])
+
+        # Hash each triple to a single integer key when the key range fits in an int64.
+        try:
+            keys = np.ravel_multi_index(self.corners.T, (len(self.positions), len(texcoords), len(normals)))
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        except ValueError:
+            _, first, inverse = np.unique(self.corners, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+
+        # Renumber the unique vertices by first use.
+        order = np.argsort(first)
+        rank = np.empty(len(order), np.int64)
+        rank[order] = np.arange(len(order))
+        unique = self.corners[first[order]]
+
+        elementtype = np.uint16 if len(unique) <= 65536 else np.uint32
+        elements = rank[inverse].astype(elementtype)
+
+        vdata = np.ascontiguousarray(self.positions[unique[:, 0]])
+        ndata = np.ascontiguousarray(normals[unique[:, 2]])
+        tdata = np.ascontiguousarray(texcoords[unique[:, 1]])
+        return vdata, ndata, tdata, elements
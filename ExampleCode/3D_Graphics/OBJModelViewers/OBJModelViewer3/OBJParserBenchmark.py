@@ -0,0 +1,101 @@
+#! /usr/bin/env python3
+#
+# Parser throughput for the models in the Models directory and for generated grids.
+#
+# Each Wavefront OBJ model is parsed with the OBJParser and the file size, number of
+# triangles and parse rates are reported.  The generated grids have the same surface
+# written with triangles, quads, convex hexagons and concave hexagons, once with
+# absolute and once with negative (relative) indices, to compare the polygon paths
+# with the triangle path.  The rates are per triangle after triangulation.
+#
+# Usage: python3 OBJParserBenchmark.py [model directory] [grid size] [repeats]
+
+import sys
+import os
+import time
+import tempfile
+import numpy as np
+from OBJParser import *
+
+
+# Writes an n by n grid of cells to filename.  Faces is "tri", "quad", "hex" or
+# "concave", the hexagons join two cells and the concave ones have a notch in the
+# middle of the top edge.  If relative is True the faces use negative indices and
+# follow the vertices they use.
+def writeGrid(filename, n, faces, relative=False):
+    i, j = np.meshgrid(np.arange(n + 1), np.arange(n + 1), indexing='ij')
+    positions = np.stack([i.ravel() / n, j.ravel() / n, np.zeros((n + 1) * (n + 1))], axis=1)
+
+    i, j = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+    p = (i * (n + 1) + j).ravel()
+    q = p + n + 1
+    if faces == "tri":
+        polygons = np.stack([p, q, q + 1, p, q + 1, p + 1], axis=1).reshape(-1, 3)
+    elif faces == "quad":
+        polygons = np.stack([p, q, q + 1, p + 1], axis=1)
+    else:
+        # Two cells side by side, the middle top vertex is pushed down for a notch.
+        p = p[(i.ravel() % 2) == 0]
+        q = p + n + 1
+        r = q + n + 1
+        polygons = np.stack([p, q, r, r + 1, q + 1, p + 1], axis=1)
+        if faces == "concave":
+            positions[np.unique(q + 1), 1] -= 0.5 / n
+
+    lines = ["v %f %f %f\n" % tuple(v) for v in positions.tolist()]
+    lines.append("vn 0 0 1\n")
+    if relative:
+        # Vertices are repeated before each face so that -1 is the last corner.
+        lines = ["vn 0 0 1\n"]
+        k = polygons.shape[1]
+        relativeface = "f " + " ".join("%d//-1" % (c - k) for c in range(k)) + "\n"
+        for polygon in polygons.tolist():
+            lines.extend("v %f %f %f\n" % tuple(positions[c]) for c in polygon)
+            lines.append(relativeface)
+    else:
+        lines.extend("f " + " ".join("%d//1" % (c + 1) for c in polygon) + "\n" for polygon in polygons.tolist())
+
+    with open(filename, 'w') as file:
+        file.writelines(lines)
+
+
+# Parses filename repeats times and returns the parser and the best time.
+def timeParse(filename, repeats):
+    best = float("inf")
+    for r in range(repeats):
+        parser = OBJParser()
+        start = time.perf_counter()
+        parser.parse(filename)
+        best = min(best, time.perf_counter() - start)
+    return parser, best
+
+
+def report(name, filename, parser, elapsed):
+    megabytes = os.path.getsize(filename) / (1 << 20)
+    triangles = len(parser.corners) // 3
+    print("%-34s %8.2f %9d %8.4f %8.1f %12.0f" % (name, megabytes, triangles, elapsed,
+                                                   megabytes / elapsed, triangles / elapsed))
+
+
+if __name__ == '__main__':
+    modeldir = sys.argv[1] if len(sys.argv) > 1 else "../Models"
+    gridsize = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    print("%-34s %8s %9s %8s %8s %12s" % ("Model", "Size(MB)", "Triangles", "Time(s)", "MB/s", "Triangles/s"))
+
+    for root, dirs, files in sorted(os.walk(modeldir)):
+        for filename in sorted(files):
+            if filename.lower().endswith(".obj"):
+                path = os.path.join(root, filename)
+                parser, elapsed = timeParse(path, repeats)
+                report(filename, path, parser, elapsed)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        for relative in [False, True]:
+            for faces in ["tri", "quad", "hex", "concave"]:
+                path = os.path.join(tempdir, "grid.obj")
+                writeGrid(path, gridsize, faces, relative)
+                parser, elapsed = timeParse(path, repeats)
+                name = "grid %d %s%s" % (gridsize, faces, " relative" if relative else "")
+                report(name, path, parser, elapsed)
@@ -3,7 +3,8 @@
 # Sphere object
 #
 # Creates the vertex and normal vector data for a sphere object and
-# loads the data to the grphics card.
+# loads the data to the grphics card.  If optimize is True the triangles and
+# vertices are reordered by the MeshOptimizer for better vertex cache use.
 #
 # Don Spickler
 # 1/7/2022
@@ -12,13 +13,15 @@ from OpenGL.GL import *
 import ctypes
 import numpy as np
 import glm
+from MeshOptimizer import *
+from Bounds import *
 
 
 class Sphere():
     # Constructor
     def __init__(self, r=1, lon=20, lat=20,
                  begintheta=0, endtheta=2 * np.pi,
-                 beginpsi=-np.pi / 2, endpsi=np.pi / 2):
+                 beginpsi=-np.pi / 2, endpsi=np.pi / 2, optimize=False):
         self.r = r
         self.lon = lon
         self.lat = lat
@@ -26,6 +29,7 @@ class Sphere():
         self.et = endtheta
         self.bp = beginpsi
         self.ep = endpsi
+        self.optimize = optimize
 
         # Setup VAO and buffers.
         self.VAO = glGenVertexArrays(1)
@@ -37,7 +41,7 @@ class Sphere():
     # Reset the properties of the object.
     def set(self, r=1, lon=20, lat=20,
               begintheta=0, endtheta=2 * np.pi,
-              beginpsi=-np.pi / 2, endpsi=np.pi / 2):
+              beginpsi=-np.pi / 2, endpsi=np.pi / 2, optimize=False):
         self.r = r
         self.lon = lon
         self.lat = lat
@@ -45,6 +49,7 @@ class Sphere():
         self.et = endtheta
         self.bp = beginpsi
         self.ep = endpsi
+        self.optimize = optimize
         self.LoadDataToGraphicsCard()
 
     # Load vertex, color, and index data to the graphics card.
@@ -54,71 +59,65 @@ class Sphere():
         vNormal = 2
         vTex = 3
 
-        vertices = []
-        normals = []
-        tex = []
-
-        # Load data into lists.
-        for i in range(self.lon + 1):
-            for j in range(self.lat + 1):
-                theta = self.bt + (self.et - self.bt) * (i / self.lon)
-                psi = self.bp + (self.ep - self.bp) * (j / self.lat)
-
-                # Calculate the vertices.
-                x = self.r * glm.cos(psi) * glm.cos(theta)
-                y = self.r * glm.cos(psi) * glm.sin(theta)
-                z = self.r * glm.sin(psi)
-
-                # Calculate the normals.
-                nx = x / self.r
-                ny = y / self.r
-                nz = z / self.r
-
-                vertices.extend([x, y, z])
-                normals.extend([nx, ny, nz])
-                tex.extend([i / self.lon, j / self.lat])
-
-        # Setup indexing array for triangles.
-        indices = []
-        for i in range(self.lon):
-            for j in range(self.lat):
-                indices.append(i * (self.lat + 1) + j)
-                indices.append((i + 1) * (self.lat + 1) + j)
-                indices.append((i + 1) * (self.lat + 1) + j + 1)
-                indices.append(i * (self.lat + 1) + j)
-                indices.append((i + 1) * (self.lat + 1) + j + 1)
-                indices.append(i * (self.lat + 1) + j + 1)
-
-        # Convert data to GLSL form and get machine sizes of data types.
-        indexdata = np.array(indices).astype(ctypes.c_uint)
-        vertexdata = np.array(vertices).astype(ctypes.c_float)
-        normaldata = np.array(normals).astype(ctypes.c_float)
-        texdata = np.array(tex).astype(ctypes.c_float)
-        floatsz = ctypes.sizeof(ctypes.c_float)
-        uintsz = ctypes.sizeof(ctypes.c_uint)
+        # Parameter grid, the first axis runs over the longitude (i) and the second
+        # over the latitude (j), matching the vertex order used by the index array.
+        i, j = np.meshgrid(np.arange(self.lon + 1), np.arange(self.lat + 1), indexing='ij')
+        theta = self.bt + (self.et - self.bt) * (i / self.lon)
+        psi = self.bp + (self.ep - self.bp) * (j / self.lat)
+
+        # Calculate the vertices.
+        vertices = np.stack([self.r * np.cos(psi) * np.cos(theta),
+                             self.r * np.cos(psi) * np.sin(theta),
+                             self.r * np.sin(psi)], axis=-1)
+
+        # Calculate the normals.
+        normals = vertices / self.r
+        tex = np.stack([i / self.lon, j / self.lat], axis=-1)
+
+        # Setup indexing array for triangles, two triangles for each grid cell.  The
+        # index p is the lower left corner of the cell and q is the one next to it in theta.
+        i, j = np.meshgrid(np.arange(self.lon), np.arange(self.lat), indexing='ij')
+        p = (i * (self.lat + 1) + j).ravel()
+        q = p + self.lat + 1
+        indexdata = np.stack([p, q, q + 1, p, q + 1, p + 1], axis=1).astype(np.uint32).ravel()
+
+        # Reorder the triangles and vertices for the vertex cache.
+        if self.optimize:
+            indexdata, order = MeshOptimizer().optimize(indexdata, (self.lon + 1) * (self.lat + 1))
+            vertices = vertices.reshape(-1, 3)[order]
+            normals = normals.reshape(-1, 3)[order]
+            tex = tex.reshape(-1, 2)[order]
+
+        # Convert data to GLSL form, flattened and tightly packed.
+        vertexdata = np.ascontiguousarray(vertices, dtype=np.float32).ravel()
+        normaldata = np.ascontiguousarray(normals, dtype=np.float32).ravel()
+        texdata = np.ascontiguousarray(tex, dtype=np.float32).ravel()
+
+        # Bounds for frustum culling.
+        self.boundingBox, self.boundingSphere = meshBounds(vertexdata.reshape(-1, 3))
 
         # Bind (turn on) a vertex array.
         glBindVertexArray(self.VAO)
 
         # Load the indexing arrays on the graphics card. Load the fill index array.
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO)
-        glBufferData(GL_ELEMENT_ARRAY_BUFFER, uintsz * len(indices), indexdata, GL_STATIC_DRAW)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indexdata.nbytes, indexdata, GL_STATIC_DRAW)
 
         # Bind (turn on) the vertex buffer (storage location).
         glBindBuffer(GL_ARRAY_BUFFER, self.ArrayBuffer)
 
         # Allocate space but not load data at this point.
-        glBufferData(GL_ARRAY_BUFFER, floatsz * (len(vertices) + len(normals) + len(tex)), None, GL_DYNAMIC_DRAW)
+        glBufferData(GL_ARRAY_BUFFER, vertexdata.nbytes + normaldata.nbytes + texdata.nbytes, None, GL_DYNAMIC_DRAW)
 
         # Load the data.
-        glBufferSubData(GL_ARRAY_BUFFER, 0, floatsz * len(vertices), vertexdata)
-        glBufferSubData(GL_ARRAY_BUFFER, floatsz * len(vertices), floatsz * len(normals), normaldata)
-        glBufferSubData(GL_ARRAY_BUFFER, floatsz * (len(vertices) + len(normals)), floatsz * len(tex), texdata)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, vertexdata.nbytes, vertexdata)
+        glBufferSubData(GL_ARRAY_BUFFER, vertexdata.nbytes, normaldata.nbytes, normaldata)
+        glBufferSubData(GL_ARRAY_BUFFER, vertexdata.nbytes + normaldata.nbytes, texdata.nbytes, texdata)
 
         # Setup attribute information.
         glVertexAttribPointer(vPosition, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
-        glVertexAttribPointer(vNormal, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(floatsz * len(vertices)))
-        glVertexAttribPointer(vTex, 2, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(floatsz * (len(vertices) + len(normals))))
+        glVertexAttribPointer(vNormal, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(vertexdata.nbytes))
+        glVertexAttribPointer(vTex, 2, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(vertexdata.nbytes + normaldata.nbytes))
 
         # Set position indexes for shader streams.
         glEnableVertexAttribArray(vPosition)
@@ -8,6 +8,7 @@
 import pygame
 from pygame.locals import *
 import datetime
+import time
 from GraphicsEngine import *
 import os
 
@@ -49,6 +50,9 @@ class UI():
             extension = os.path.splitext(filename)[1].lower()
             if extension == ".obj":
                 self.ge.wfmodel.load(totaldir, filename)
+                self.ge.wfmodel.printIndexStats()
+                textureManager.printStats()
+                self.ge.shader.printCacheStats()
 
     def processKeydown(self, event):
         # Toggle the camera between spherical and YPR.
@@ -313,6 +317,19 @@ class UI():
     def processMouseButtonDown(self, event):
         self.lastMousePosition = pygame.mouse.get_pos()
 
+        # Pick the triangle of the model under the mouse with the right button.
+        if event.button == 3:
+            start = time.perf_counter()
+            hit = self.ge.pick(event.pos)
+            elapsed = 1000 * (time.perf_counter() - start)
+            if hit is None:
+                print("Picked nothing (%.3f ms)" % elapsed)
+            else:
+                model = self.ge.wfmodel
+                material = model.renderLayout[model.triangleSegment(hit.triangle)][0] if model.renderLayout else ""
+                print("Picked triangle %d, material %s, distance %.3f, barycentric (%.3f, %.3f, %.3f) (%.3f ms)" %
+                      ((hit.triangle, material, hit.distance) + tuple(hit.barycentric) + (elapsed,)))
+
     # def processMouseButtonUp(self, event):
     #     print(event)
 
@@ -153,8 +153,8 @@ class GraphicsEngine():
     def loadTexture(self, filename):
         teximg = Image.open(filename)
         teximg = teximg.convert('RGBA')
-        teximg = teximg.transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        # Flip the rows while copying out the pixels, OpenGL expects the bottom row first.
+        img_data = teximg.tobytes("raw", "RGBA", 0, -1)
 
         texID = glGenTextures(1)
         glBindTexture(GL_TEXTURE_2D, texID)
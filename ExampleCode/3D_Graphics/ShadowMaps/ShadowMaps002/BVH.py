@@ -0,0 +1,388 @@
+#! /usr/bin/env python3
+#
+# Bounding volume hierarchy
+#
+# A binary tree of axis aligned boxes over a list of items, each item given by its
+# box, such as the world boxes of the objects of a scene or the boxes of clusters of
+# triangles of a model.  Testing the tree against a frustum or a ray skips every
+# item under a node whose box is missed, so a query looks at a small part of a large
+# scene instead of every item.
+#
+# The tree is stored in flat NumPy arrays, node i has the box nodeBoxes[i], a (2, 3)
+# array of the minimum and maximum corners, and the range first[i] to first[i] +
+# count[i] of the items array, which holds the item numbers in tree order.  The two
+# children of an internal node are left[i] and left[i] + 1, left[i] is -1 for a
+# leaf.  Node 0 is the root.  Frustum queries work on a whole level of the tree at
+# a time and ray queries on a few cuts across the tree, with NumPy, so there is no
+# Python loop over the nodes.
+#
+# The tree is built top down.  The items of a node are sorted by the centers of
+# their boxes along each axis and the split with the lowest surface area heuristic
+# cost is used, the cost of a split is the surface area of each side times the
+# number of items on that side.  A node stays a leaf when it has leafSize items or
+# fewer, or when splitting costs more than testing all of its items and it has
+# maxLeafSize items or fewer.
+#
+# The top down build costs a few sorts per node, for hundreds of thousands of items,
+# such as the triangles of a large model, buildLinear is much faster.  It sorts the
+# items once along a Morton curve through the centers of their boxes, items close on
+# the curve are close in space, and splits each range of the sorted items at the
+# highest bit where the Morton codes of its ends differ, one level of the tree at a
+# time.  Its trees are not as good for queries as the surface area heuristic trees.
+#
+# When items move, refit updates the boxes of the nodes without changing the tree,
+# only the nodes above the changed items if they are given.  The tree gets worse as
+# the items move away from where they were when it was built, build it again after
+# large changes.
+
+import numpy as np
+
+
+# Returns the surface areas of boxes given by their (N, 3) minimum and maximum corners.
+def surfaceArea(lo, hi):
+    d = np.maximum(hi - lo, 0)
+    return 2 * (d[:, 0] * d[:, 1] + d[:, 1] * d[:, 2] + d[:, 2] * d[:, 0])
+
+
+# Returns the numbers first[i], first[i] + 1, ..., first[i] + count[i] - 1 of all of the
+# ranges, one after the other.
+def rangeIndices(first, count):
+    count = np.asarray(count, np.int64)
+    total = int(count.sum())
+    if total == 0:
+        return np.zeros(0, np.int64)
+    starts = np.cumsum(count) - count
+    return np.repeat(np.asarray(first, np.int64) - starts, count) + np.arange(total)
+
+
+class BVH():
+    leafSize = 4
+    maxLeafSize = 16
+
+    # Cost of testing a node relative to testing an item, for the surface area heuristic.
+    traversalCost = 1.0
+
+    # Largest number of nodes that ray queries start from, and of the nodes of the next cut
+    # under a node of a cut, see findLevels.
+    startSize = 256
+    cutBranching = 32
+
+    # Constructor, builds the tree over the (N, 2, 3) item boxes if they are given.
+    def __init__(self, boxes=None):
+        self.build(np.zeros((0, 2, 3), np.float32) if boxes is None else boxes)
+
+    # Builds the tree over the (N, 2, 3) item boxes.
+    def build(self, boxes):
+        boxes = np.array(boxes, np.float32).reshape(-1, 2, 3)
+        n = len(boxes)
+        self.itemBoxes = boxes
+        self.items = np.arange(n, dtype=np.int32)
+
+        size = max(2 * n - 1, 1)
+        self.nodeBoxes = np.zeros((size, 2, 3), np.float32)
+        self.first = np.zeros(size, np.int32)
+        self.count = np.zeros(size, np.int32)
+        self.left = np.full(size, -1, np.int32)
+        self.parent = np.full(size, -1, np.int32)
+        self.depth = np.zeros(size, np.int32)
+        self.nodeCount = 1
+
+        centers = (boxes[:, 0] + boxes[:, 1]) / 2
+        stack = [(0, 0, n)]
+        while stack:
+            node, start, end = stack.pop()
+            items = self.items[start:end]
+            nodeBoxes = boxes[items]
+            self.nodeBoxes[node, 0] = nodeBoxes[:, 0].min(axis=0) if end > start else 0
+            self.nodeBoxes[node, 1] = nodeBoxes[:, 1].max(axis=0) if end > start else 0
+            self.first[node] = start
+            self.count[node] = end - start
+            if end - start <= self.leafSize:
+                continue
+
+            split = self.findSplit(nodeBoxes, centers[items], self.nodeBoxes[node])
+            if split is None:
+                continue
+            order, k = split
+            self.items[start:end] = items[order]
+
+            child = self.nodeCount
+            self.nodeCount += 2
+            self.left[node] = child
+            self.parent[child:child + 2] = node
+            self.depth[child:child + 2] = self.depth[node] + 1
+            stack.append((child + 1, start + k, end))
+            stack.append((child, start, start + k))
+
+        for name in ["nodeBoxes", "first", "count", "left", "parent", "depth"]:
+            setattr(self, name, getattr(self, name)[0:self.nodeCount])
+        self.findLevels()
+
+    # Builds the tree over the (N, 2, 3) item boxes from the Morton codes of their centers.
+    # The nodes of each level are split at once, the boxes of the nodes are then found from
+    # the bottom up by refit.
+    def buildLinear(self, boxes):
+        boxes = np.array(boxes, np.float32).reshape(-1, 2, 3)
+        n = len(boxes)
+        if n == 0:
+            self.build(boxes)
+            return
+
+        # Morton codes of 10 bits per axis, the bits of x, y and z interleaved.
+        centers = (boxes[:, 0] + boxes[:, 1]) / 2
+        low = centers.min(axis=0)
+        size = np.maximum(centers.max(axis=0) - low, 1e-30)
+        cells = np.minimum((centers - low) / size * 1024, 1023).astype(np.int64)
+        codes = np.zeros(n, np.int64)
+        for bit in range(10):
+            for axis in range(3):
+                codes |= ((cells[:, axis] >> bit) & 1) << (3 * bit + 2 - axis)
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        self.items = order.astype(np.int32)
+        self.itemBoxes = boxes
+
+        size = max(2 * n - 1, 1)
+        self.nodeBoxes = np.zeros((size, 2, 3), np.float32)
+        self.first = np.zeros(size, np.int32)
+        self.count = np.zeros(size, np.int32)
+        self.left = np.full(size, -1, np.int32)
+        self.parent = np.full(size, -1, np.int32)
+        self.depth = np.zeros(size, np.int32)
+        self.count[0] = n
+        self.nodeCount = 1
+
+        nodes = np.zeros(1, np.int64)
+        depth = 0
+        while len(nodes) > 0:
+            nodes = nodes[self.count[nodes] > self.leafSize]
+            if len(nodes) == 0:
+                break
+            start = self.first[nodes].astype(np.int64)
+            end = start + self.count[nodes]
+
+            # The first item with the highest differing bit set, or the middle if the codes
+            # of the range are all the same.
+            differ = codes[start] ^ codes[end - 1]
+            bit = np.floor(np.log2(np.maximum(differ, 1))).astype(np.int64)
+            split = np.searchsorted(codes, (codes[end - 1] >> bit) << bit)
+            split = np.where(differ > 0, split, (start + end) // 2)
+            split = np.clip(split, start + 1, end - 1)
+
+            children = self.nodeCount + 2 * np.arange(len(nodes))
+            self.nodeCount += 2 * len(nodes)
+            self.left[nodes] = children
+            self.parent[children] = self.parent[children + 1] = nodes
+            self.depth[children] = self.depth[children + 1] = depth + 1
+            self.first[children] = start
+            self.count[children] = split - start
+            self.first[children + 1] = split
+            self.count[children + 1] = end - split
+            nodes = np.concatenate([children, children + 1])
+            depth += 1
+
+        for name in ["nodeBoxes", "first", "count", "left", "parent", "depth"]:
+            setattr(self, name, getattr(self, name)[0:self.nodeCount])
+        self.findLevels()
+        self.refit(boxes)
+
+    # Returns the order of the items and the number of items on the left side of the best
+    # split, or None if the node is better left as a leaf.
+    def findSplit(self, boxes, centers, nodeBox):
+        n = len(boxes)
+        bestCost = np.inf
+        best = None
+        before = np.arange(1, n)
+        after = n - before
+        for axis in range(3):
+            order = np.argsort(centers[:, axis], kind='stable')
+            lo = boxes[order, 0]
+            hi = boxes[order, 1]
+            leftArea = surfaceArea(np.minimum.accumulate(lo), np.maximum.accumulate(hi))
+            rightArea = surfaceArea(np.minimum.accumulate(lo[::-1])[::-1], np.maximum.accumulate(hi[::-1])[::-1])
+            cost = leftArea[:-1] * before + rightArea[1:] * after
+            k = int(np.argmin(cost))
+            if cost[k] < bestCost:
+                bestCost = cost[k]
+                best = (order, k + 1)
+
+        area = surfaceArea(nodeBox[0:1], nodeBox[1:2])[0]
+        if area > 0 and n <= self.maxLeafSize and self.traversalCost + bestCost / area >= n:
+            return None
+        if area == 0:
+            # All of the boxes are the same point, split them in half.
+            best = (np.arange(n), n // 2)
+        return best
+
+    # Finds the leaves, the leaf of each item and the internal nodes at each depth, used by
+    # refit.
+    def findLevels(self):
+        isLeaf = self.left < 0
+        self.leaves = np.flatnonzero(isLeaf)
+        self.leaves = self.leaves[np.argsort(self.first[self.leaves], kind='stable')]
+        self.itemLeaf = np.zeros(len(self.items), np.int32)
+        self.itemLeaf[self.items[rangeIndices(self.first[self.leaves], self.count[self.leaves])]] = \
+            np.repeat(self.leaves, self.count[self.leaves])
+        internal = np.flatnonzero(~isLeaf)
+        self.levels = [internal[self.depth[internal] == d] for d in range(int(self.depth.max()) + 1)]
+
+        # Ray queries go down through a few cuts of the tree instead of every level.  A cut is
+        # the nodes at one depth and the leaves above it, which hold each item once, and going
+        # down a depth never makes a cut smaller.  The first cut is the deepest with at most
+        # startSize nodes, each next cut the deepest with at most cutBranching times as many
+        # nodes as the cut before, and the last cut is the leaves.  The nodes of a cut are
+        # sorted by their first items, so the nodes of the next cut under a node of a cut are
+        # the range cutStart to cutEnd of the next cut.
+        counts = np.bincount(self.depth)
+        sizes = counts + np.concatenate([[0], np.cumsum(np.bincount(self.depth[self.leaves],
+                                                                   minlength=len(counts)))[:-1]])
+        depths = []
+        limit = self.startSize
+        while len(depths) == 0 or depths[-1] < len(counts) - 1:
+            depth = np.flatnonzero(sizes <= limit)[-1]
+            if len(depths) > 0:
+                depth = max(depth, depths[-1] + 1)
+            depths.append(depth)
+            limit = sizes[depth] * self.cutBranching
+
+        self.cuts = []
+        for depth in depths:
+            nodes = np.flatnonzero((self.depth == depth) | (isLeaf & (self.depth < depth)))
+            self.cuts.append(nodes[np.argsort(self.first[nodes], kind='stable')])
+        self.cutStart = []
+        self.cutEnd = []
+        for cut, nextCut in zip(self.cuts[:-1], self.cuts[1:]):
+            nextFirst = self.first[nextCut]
+            self.cutStart.append(np.searchsorted(nextFirst, self.first[cut]))
+            self.cutEnd.append(np.searchsorted(nextFirst, self.first[cut] + self.count[cut]))
+
+    # Sets the boxes of the leaves to the boxes around their items.
+    def refitLeaves(self, leaves):
+        leaves = leaves[self.count[leaves] > 0]
+        if len(leaves) == 0:
+            return
+        counts = self.count[leaves]
+        boxes = self.itemBoxes[self.items[rangeIndices(self.first[leaves], counts)]]
+        offsets = np.cumsum(counts) - counts
+        self.nodeBoxes[leaves, 0] = np.minimum.reduceat(boxes[:, 0], offsets)
+        self.nodeBoxes[leaves, 1] = np.maximum.reduceat(boxes[:, 1], offsets)
+
+    # Sets the boxes of the internal nodes to the boxes around their children.
+    def refitNodes(self, nodes):
+        children = self.left[nodes]
+        self.nodeBoxes[nodes, 0] = np.minimum(self.nodeBoxes[children, 0], self.nodeBoxes[children + 1, 0])
+        self.nodeBoxes[nodes, 1] = np.maximum(self.nodeBoxes[children, 1], self.nodeBoxes[children + 1, 1])
+
+    # Updates the tree for the new (N, 2, 3) item boxes.  If the changed item numbers are
+    # given only the boxes of those items are read and only the nodes above them are
+    # updated, otherwise every node is.  The nodes are updated one depth at a time from the
+    # bottom up, so each node sees the new boxes of its children.
+    def refit(self, boxes, changed=None):
+        boxes = np.asarray(boxes, np.float32).reshape(-1, 2, 3)
+        if changed is None:
+            self.itemBoxes[:] = boxes
+            self.refitLeaves(self.leaves)
+            for nodes in reversed(self.levels):
+                self.refitNodes(nodes)
+            return
+
+        changed = np.asarray(changed, np.int64)
+        if len(changed) == 0:
+            return
+        self.itemBoxes[changed] = boxes[changed]
+        nodes = np.unique(self.itemLeaf[changed])
+        self.refitLeaves(nodes)
+
+        ancestors = []
+        nodes = self.parent[nodes]
+        nodes = np.unique(nodes[nodes >= 0])
+        while len(nodes) > 0:
+            ancestors.append(nodes)
+            nodes = self.parent[nodes]
+            nodes = np.unique(nodes[nodes >= 0])
+        if len(ancestors) == 0:
+            return
+        ancestors = np.unique(np.concatenate(ancestors))
+        depths = self.depth[ancestors]
+        for d in range(int(depths.max()), -1, -1):
+            self.refitNodes(ancestors[depths == d])
+
+    # Returns the sorted numbers of the items whose boxes are not outside of the frustum, a
+    # Frustum object.  Nodes entirely inside of the frustum add all of their items without
+    # testing their children.  If testItems is True the items of the leaves that cross the
+    # planes are tested by their own boxes, otherwise they are all returned.
+    def queryFrustum(self, frustum, testItems=True):
+        if len(self.items) == 0:
+            return np.zeros(0, np.int64)
+        normals = frustum.planes[:, 0:3]
+        offsets = frustum.planes[:, 3]
+        absNormals = np.abs(normals)
+
+        inside = []
+        crossing = []
+        frontier = np.zeros(1, np.int64)
+        while len(frontier) > 0:
+            boxes = self.nodeBoxes[frontier]
+            center = (boxes[:, 0] + boxes[:, 1]) / 2
+            extent = (boxes[:, 1] - boxes[:, 0]) / 2
+            distance = center @ normals.T + offsets
+            reach = extent @ absNormals.T
+            seen = np.all(distance + reach >= 0, axis=1)
+            whole = seen & np.all(distance - reach >= 0, axis=1)
+            inside.append(frontier[whole])
+
+            partial = frontier[seen & ~whole]
+            isLeaf = self.left[partial] < 0
+            crossing.append(partial[isLeaf])
+            children = self.left[partial[~isLeaf]]
+            frontier = np.concatenate([children, children + 1])
+
+        inside = np.concatenate(inside)
+        crossing = np.concatenate(crossing)
+        found = self.items[rangeIndices(self.first[inside], self.count[inside])]
+        candidates = self.items[rangeIndices(self.first[crossing], self.count[crossing])]
+        if testItems and len(candidates) > 0:
+            candidates = candidates[frustum.testBoxes(self.itemBoxes[candidates])]
+        return np.sort(np.concatenate([found, candidates]))
+
+    # Returns the numbers of the items whose boxes are hit by the ray, in the order that the
+    # ray enters their leaves, and the distance along the ray where it enters the leaf of each
+    # item.  Distances are in units of the length of the direction.  Items beyond maxDistance
+    # are left out.  A caller looking for the closest hit can stop once the distance of the
+    # next item is past the closest hit found.
+    def queryRay(self, origin, direction, maxDistance=np.inf):
+        if len(self.items) == 0:
+            return np.zeros(0, np.int64), np.zeros(0, np.float32)
+        # A direction of 0 along an axis is made tiny instead, which keeps the distances to
+        # the planes of that axis finite.
+        origin = np.asarray(origin, np.float32).reshape(3)
+        direction = np.asarray(direction, np.float32).reshape(3)
+        inverse = 1 / np.where(np.abs(direction) < 1e-30, np.float32(1e-30), direction)
+
+        # Positions in the current cut of the nodes to test.
+        positions = np.arange(len(self.cuts[0]))
+        for k in range(len(self.cuts)):
+            nodes = self.cuts[k][positions]
+            enter, hit = self.slabs(self.nodeBoxes[nodes], origin, inverse, maxDistance)
+            if k == len(self.cuts) - 1:
+                break
+            positions = positions[hit]
+            start = self.cutStart[k][positions]
+            positions = rangeIndices(start, self.cutEnd[k][positions] - start)
+
+        leaves = nodes[hit]
+        entries = enter[hit]
+        order = np.argsort(entries, kind='stable')
+        leaves = leaves[order]
+        items = self.items[rangeIndices(self.first[leaves], self.count[leaves])]
+        return items, np.repeat(entries[order], self.count[leaves])
+
+    # Returns the distances where the ray enters the (N, 2, 3) boxes and which boxes it hits
+    # between 0 and maxDistance.
+    def slabs(self, boxes, origin, inverse, maxDistance):
+        t = (boxes - origin) * inverse
+        near = np.minimum(t[:, 0], t[:, 1])
+        far = np.maximum(t[:, 0], t[:, 1])
+        enter = np.maximum(np.maximum(near[:, 0], near[:, 1]), np.maximum(near[:, 2], 0))
+        leave = np.minimum(np.minimum(far[:, 0], far[:, 1]), far[:, 2])
+        return enter, (enter <= leave) & (enter <= maxDistance)
@@ -0,0 +1,89 @@
+#! /usr/bin/env python3
+#
+# Bounding volume hierarchy benchmark.
+#
+# Times building the BVH over random boxes in a cube, refitting all of the nodes,
+# refitting after a tenth of the boxes have moved, frustum queries compared to
+# testing every box with Frustum.testBoxes, and ray queries compared to a slab test
+# of every box.  The frustum and the rays come from cameras placed at random inside
+# the cube.  No OpenGL context is needed.
+#
+# Usage: python3 BVHBenchmark.py [box count ...]
+
+import sys
+import time
+import numpy as np
+import glm
+from Bounds import *
+from BVH import *
+
+
+def randomBoxes(rng, count, size=500):
+    centers = rng.uniform(-size, size, (count, 3)).astype(np.float32)
+    extents = rng.uniform(0.5, 5, (count, 3)).astype(np.float32)
+    return np.stack([centers - extents, centers + extents], axis=1)
+
+
+def randomFrustums(rng, count, size=500):
+    projection = glm.perspective(glm.radians(50), 1.5, 0.1, size / 2)
+    frustums = []
+    for i in range(count):
+        eye = glm.vec3(*rng.uniform(-size, size, 3))
+        target = eye + glm.vec3(*rng.normal(size=3))
+        frustums.append(Frustum(projection * glm.lookAt(eye, target, glm.vec3(0, 1, 0))))
+    return frustums
+
+
+def slabTest(boxes, origin, direction):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1 / direction
+        near = (boxes[:, 0] - origin) * inverse
+        far = (boxes[:, 1] - origin) * inverse
+        enter = np.maximum(np.fmax.reduce(np.fmin(near, far), axis=1), 0)
+        leave = np.fmin.reduce(np.fmax(near, far), axis=1)
+    return np.flatnonzero(enter <= leave)
+
+
+def timeRepeated(function, repeats):
+    start = time.perf_counter()
+    for i in range(repeats):
+        function(i)
+    return (time.perf_counter() - start) / repeats
+
+
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] if len(sys.argv) > 1 else [1000, 10000, 100000]
+    rng = np.random.default_rng(1)
+    repeats = 20
+
+    print("%8s %6s %6s %9s %9s %9s %9s %9s %9s %9s" %
+          ("Boxes", "Nodes", "Depth", "Build(ms)", "Refit(ms)", "Moved(ms)",
+           "BVHView", "AllView", "BVHRay", "AllRay"))
+    for count in counts:
+        boxes = randomBoxes(rng, count)
+        start = time.perf_counter()
+        bvh = BVH(boxes)
+        build = time.perf_counter() - start
+
+        refit = timeRepeated(lambda i: bvh.refit(boxes), repeats)
+        moved = rng.choice(count, max(1, count // 10), replace=False)
+        movedBoxes = boxes.copy()
+        movedBoxes[moved] += rng.uniform(-2, 2, (len(moved), 1, 3)).astype(np.float32)
+        refitMoved = timeRepeated(lambda i: bvh.refit(movedBoxes, moved), repeats)
+
+        frustums = randomFrustums(rng, repeats)
+        for frustum in frustums:
+            if not np.array_equal(bvh.queryFrustum(frustum), np.flatnonzero(frustum.testBoxes(movedBoxes))):
+                raise Exception("BVH frustum query does not match the brute force test.")
+        viewBVH = timeRepeated(lambda i: bvh.queryFrustum(frustums[i]), repeats)
+        viewAll = timeRepeated(lambda i: np.flatnonzero(frustums[i].testBoxes(movedBoxes)), repeats)
+
+        origins = rng.uniform(-500, 500, (repeats, 3))
+        directions = rng.normal(size=(repeats, 3))
+        rayBVH = timeRepeated(lambda i: bvh.queryRay(origins[i], directions[i]), repeats)
+        rayAll = timeRepeated(lambda i: slabTest(movedBoxes, origins[i], directions[i]), repeats)
+
+        print("%8d %6d %6d %9.2f %9.3f %9.3f %9.3f %9.3f %9.3f %9.3f" %
+              (count, bvh.nodeCount, bvh.depth.max(), 1000 * build, 1000 * refit, 1000 * refitMoved,
+               1000 * viewBVH, 1000 * viewAll, 1000 * rayBVH, 1000 * rayAll))
+    print("Query times are in ms.  Moved refits the nodes above a tenth of the boxes.")
@@ -31,6 +31,15 @@ from SphericalCamera import *
 from YPRCamera import *
 from Light import *
 from Material import *
+from UniformBuffer import *
+from TextureManager import *
+from RenderQueue import *
+from InstanceBuffer import *
+from MeshPool import *
+from Bounds import *
+from BVH import *
+from SceneGraph import *
+from Picking import *
 
 
 class GraphicsEngine():
@@ -46,19 +55,62 @@ class GraphicsEngine():
     screenWidth = 0
     screenHeight = 0
 
+    # Build the shaders again when their files are edited.
+    watchShaders = True
+    shaderReloader = None
+
+    # Leave out the objects outside of the view, and of the view of the light in the depth
+    # pass.  The number left out in the last frame is kept in culled.
+    cullObjects = True
+    culled = 0
+
+    # Cascaded shadow maps.  The view up to shadowDistance is split into one cascade for each
+    # entry of cascadeResolutions, the width and height of its shadow map, at most
+    # maxCascades.  Each split is a blend of a logarithmic split, weighted by
+    # cascadeSplitWeight, and an even split.  When cascadedShadows is False one shadow map of
+    # shadowResolution covers the whole room.
+    cascadedShadows = True
+    cascadeResolutions = [2048, 2048, 2048, 1024]
+    maxCascades = 4
+    shadowDistance = 150
+    cascadeSplitWeight = 0.75
+    shadowResolution = 4096
+
     # Constructor
     def __init__(self):
+        # The objects of the scene are stored in one mesh pool.  If the context can draw
+        # indirect, the objects with the same texture are drawn with one draw call by the
+        # pooled programs, otherwise they are drawn one at a time by the other programs.
+        self.meshPool = MeshPool()
+        self.PooledTextureShader = None
+        self.PooledDepthShader = None
+
         # Load shaders and compile shader programs.
         try:
             shader = Shader()
             self.AxesShader = shader.loadShadersFromFile("Shaders/VertexShaderBasic3D.glsl",
                                                          "Shaders/PassThroughFrag.glsl")
-            self.TextureShader = shader.loadShadersFromFile("Shaders/VertexShaderLightingTextureShadow.glsl",
-                                                            "Shaders/PhongMultipleLightsAndTextureShadow.glsl")
+            # Every object in the scene is textured, shadowed and lit by the one light, so these
+            # are compiled in as constants.
+            self.TextureShader = shader.loadShaderVariant("Shaders/VertexShaderLightingTextureShadow.glsl",
+                                                          "Shaders/PhongMultipleLightsAndTextureShadow.glsl",
+                                                          {"NUM_LIGHTS": 1, "USE_TEXTURE": True, "USE_SHADOW": True})
+            self.InstancedTextureShader = shader.loadShaderVariant("Shaders/VertexShaderLightingTextureShadow.glsl",
+                                                                   "Shaders/PhongMultipleLightsAndTextureShadow.glsl",
+                                                                   {"NUM_LIGHTS": 1, "USE_TEXTURE": True,
+                                                                    "USE_SHADOW": True, "INSTANCED": True})
             self.ConstColorShader = shader.loadShadersFromFile("Shaders/VertexShaderBasic3D.glsl",
                                                                "Shaders/ConstantColorFrag.glsl")
             self.DepthShader = shader.loadShadersFromFile("Shaders/SimpleDepthVert.glsl",
                                                           "Shaders/SimpleDepthFrag.glsl")
+            if self.meshPool.indirect:
+                self.PooledTextureShader = shader.loadShaderVariant("Shaders/VertexShaderLightingTextureShadow.glsl",
+                                                                    "Shaders/PhongMultipleLightsAndTextureShadow.glsl",
+                                                                    {"NUM_LIGHTS": 1, "USE_TEXTURE": True,
+                                                                     "USE_SHADOW": True, "POOLED": True})
+                self.PooledDepthShader = shader.loadShaderVariant("Shaders/SimpleDepthVert.glsl",
+                                                                  "Shaders/SimpleDepthFrag.glsl", {"POOLED": True})
+            shader.printCacheStats()
 
         except Exception as err:
             for i in range(len(err.args)):
@@ -70,20 +122,15 @@ class GraphicsEngine():
         self.projviewLocAxes = glGetUniformLocation(self.AxesShader, "ProjView")
         self.modelLocAxes = glGetUniformLocation(self.AxesShader, "Model")
 
-        glUseProgram(self.TextureShader)
-        self.projviewLocPhong = glGetUniformLocation(self.TextureShader, "PV")
-        self.modelLocPhong = glGetUniformLocation(self.TextureShader, "Model")
-        self.normalMatrixLocPhong = glGetUniformLocation(self.TextureShader, "NormalMatrix")
-        GlobalAmbient = glm.vec4(0.2, 0.2, 0.2, 1)
-        glUniform4fv(glGetUniformLocation(self.TextureShader, "GlobalAmbient"),
-                     1, glm.value_ptr(GlobalAmbient))
-        glUniform1i(glGetUniformLocation(self.TextureShader, "numLights"), 3)
-        self.texLocRender = glGetUniformLocation(self.TextureShader, "tex1")
-        self.texYNLocRender = glGetUniformLocation(self.TextureShader, "useTexture")
-        self.texTransform = glGetUniformLocation(self.TextureShader, "textrans")
-
-        self.locLightMatrix = glGetUniformLocation(self.TextureShader, "lightSpaceMatrix")
-        self.texLocDepthTexture = glGetUniformLocation(self.TextureShader, "shadowMap")
+        # The lights and material are stored in uniform buffers that the shader reads
+        # through its LightBlock and MaterialBlock.
+        self.lightBuffer = LightBuffer()
+        self.materialBuffer = MaterialBuffer()
+
+        self.setTextureShader(self.TextureShader)
+        self.setLightingProgram("InstancedTextureShader", self.InstancedTextureShader)
+        if self.PooledTextureShader is not None:
+            self.setLightingProgram("PooledTextureShader", self.PooledTextureShader)
 
         glUseProgram(self.ConstColorShader)
         self.projviewLocConst = glGetUniformLocation(self.ConstColorShader, "ProjView")
@@ -92,9 +139,9 @@ class GraphicsEngine():
         glUniform4fv(glGetUniformLocation(self.ConstColorShader, "ConstantColor"),
                      1, glm.value_ptr(lightcol))
 
-        glUseProgram(self.DepthShader)
-        self.locDepthPV = glGetUniformLocation(self.DepthShader, "PV")
-        self.locDepthModel = glGetUniformLocation(self.DepthShader, "Model")
+        self.setDepthShader(self.DepthShader)
+        if self.PooledDepthShader is not None:
+            self.setPooledDepthShader(self.PooledDepthShader)
 
         self.setProjectionMatrix(pygame.display.get_surface().get_size())
 
@@ -116,10 +163,33 @@ class GraphicsEngine():
         self.teapot = ModelData("Data/teapotDataTNV.txt", "TNV")
         self.simpleplane = SimplePlane()
 
+        # Copies of the objects in the mesh pool, the light sphere and the walls are drawn
+        # from their own buffers.
+        self.cubeMesh = self.meshPool.add(self.cube)
+        self.torusMesh = self.meshPool.add(self.torus)
+        self.trefoilMesh = self.meshPool.add(self.trefiol)
+        self.teapotMesh = self.meshPool.add(self.teapot)
+        self.planeMesh = self.meshPool.add(self.simpleplane)
+
+        # The objects and the walls of the room are placed by the nodes of a scene graph, the
+        # walls are under the room node.
+        self.sceneGraph = SceneGraph()
+        self.room = self.sceneGraph.addNode()
+        self.wallNodes = [
+            self.sceneGraph.addNode(self.room, (0, 50, -50), scale=50),
+            self.sceneGraph.addNode(self.room, (0, 50, 50), glm.angleAxis(glm.radians(180), glm.vec3(0, 1, 0)), 50),
+            self.sceneGraph.addNode(self.room, (50, 50, 0), glm.angleAxis(glm.radians(-90), glm.vec3(0, 1, 0)), 50),
+            self.sceneGraph.addNode(self.room, (-50, 50, 0), glm.angleAxis(glm.radians(90), glm.vec3(0, 1, 0)), 50)]
+
+        # The objects are drawn through the render queue, sorted to change as little state as
+        # possible.
+        self.renderQueue = RenderQueue()
+
         # Load Lights and Materials
         self.mat = Material()
         self.mat.WhitePlastic()
-        self.mat.LoadMaterial(self.TextureShader, "Mat")
+        self.mat.StoreMaterial(self.materialBuffer)
+        self.materialBuffer.update()
 
         self.lights = []
         self.lights.append(Light())
@@ -127,15 +197,18 @@ class GraphicsEngine():
 
         # Set light positions.  Light 0 will ne locked to the lightcamera object.
         self.lights[0].position = glm.vec4(self.lightcamera.getPosition(), 1)
-
-        # Load in textures.
-        self.texID1 = self.loadTexture("Images/cat003.png")
-        self.texID2 = self.loadTexture("Images/metal024.bmp")
-        self.texID3 = self.loadTexture("Images/oakH.jpg")
-        self.texID4 = self.loadTexture("Images/amazaque.bmp")
-        self.texID5 = self.loadTexture("Images/stucco001.jpg")
-        self.texID6 = self.loadTexture("Images/knotted.jpg")
-        self.texID7 = self.loadTexture("Images/ash.jpg")
+        self.lights[0].StoreLight(self.lightBuffer, 0)
+        self.lightBuffer.update()
+
+        # Load in textures, the images are decoded in parallel.
+        (self.texID1, self.texID2, self.texID3, self.texID4,
+         self.texID5, self.texID6, self.texID7) = self.loadTextures(["Images/cat003.png",
+                                                                     "Images/metal024.bmp",
+                                                                     "Images/oakH.jpg",
+                                                                     "Images/amazaque.bmp",
+                                                                     "Images/stucco001.jpg",
+                                                                     "Images/knotted.jpg",
+                                                                     "Images/ash.jpg"])
 
         # Link the texture ID to different texture units.
         glActiveTexture(GL_TEXTURE0 + self.texID1)
@@ -159,182 +232,326 @@ class GraphicsEngine():
         glActiveTexture(GL_TEXTURE0 + self.texID7)
         glBindTexture(GL_TEXTURE_2D, self.texID7)
 
-        glUniform1i(self.texLocRender, self.texID3)
-        glUniform1i(self.texYNLocRender, True)
+        glUseProgram(self.TextureShader)
+        self.TextureShader.setInt("tex1", self.texID3)
+
+        # The objects of the scene, the mesh, model matrix, texture, texture matrix and whether
+        # the object is drawn into the shadow map, and the scene node of each object.  The
+        # model matrices are the world matrices of the nodes.
+        self.sceneObjects = []
+        self.objectNodes = []
+        self.objectNames = []
 
-        textureMat = glm.mat4(3)
-        glUniformMatrix4fv(self.texTransform, 1, GL_FALSE, glm.value_ptr(textureMat))
+        def addObject(name, mesh, node, texture, textureMat, castsShadow):
+            self.sceneObjects.append((mesh, node.worldMatrix(), texture, textureMat, castsShadow))
+            self.objectNodes.append(node.index)
+            self.objectNames.append(name)
 
-        # Shadowmap Buffer and texture.
-        self.depthMapFBO = glGenFramebuffers(1)
-        # self.SHADOW_WIDTH = 1024
-        # self.SHADOW_HEIGHT = 1024
+        graph = self.sceneGraph
+        textureMat = glm.mat4(1)
+        addObject("cube", self.cubeMesh, graph.addNode(None, (15, 2.5, 10), scale=5), self.texID1, textureMat, True)
+        addObject("cube", self.cubeMesh, graph.addNode(None, (-10, 5, 3),
+                                                       glm.angleAxis(glm.radians(30), glm.normalize(glm.vec3(1, 1, 1))), 5),
+                  self.texID1, textureMat, True)
+        addObject("torus", self.torusMesh, graph.addNode(None, (7, 6, -10), scale=3), self.texID4, textureMat, True)
+        addObject("teapot", self.teapotMesh, graph.addNode(None, (-10, 5, -15), scale=5), self.texID2, textureMat, True)
 
-        # Use high-res shadow-map.
-        self.SHADOW_WIDTH = 4096
-        self.SHADOW_HEIGHT = 4096
+        textureMat = glm.scale(glm.vec3(50, 3, 1))
+        addObject("trefoil", self.trefoilMesh, graph.addNode(None, (0, 6, 15), scale=3), self.texID7, textureMat, True)
 
+        # Room
+        # Floor
+        textureMat = glm.mat4(10)
+        addObject("floor", self.planeMesh,
+                  graph.addNode(self.room, (0, 0, 0), glm.angleAxis(-np.pi / 2, glm.vec3(1, 0, 0)), 50),
+                  self.texID3, textureMat, False)
+
+        # Ceiling
+        addObject("ceiling", self.planeMesh,
+                  graph.addNode(self.room, (0, 50, 0), glm.angleAxis(np.pi / 2, glm.vec3(1, 0, 0)), 50),
+                  self.texID6, textureMat, False)
+        self.wallModels = graph.worldMatrices[[node.index for node in self.wallNodes]]
+
+        # Bounding volume hierarchy over the world boxes of the objects, used to find the
+        # objects in the view and in the view of the light.
+        self.sceneBVH = BVH(self.objectBoxes())
+
+        # Finds the objects under the mouse.
+        self.picker = Picker()
+
+        # Shadowmap Buffer and texture, the shadow maps are the layers of a texture array.
+        self.depthMapFBO = glGenFramebuffers(1)
         self.depthMap = glGenTextures(1)
+        self.allocateShadowMaps()
+
+        # Watch the lighting and shadow shaders, edits are compiled between frames.
+        if self.watchShaders:
+            self.shaderReloader = ShaderReloader()
+            self.shaderReloader.watch(self.TextureShader, "Shaders/VertexShaderLightingTextureShadow.glsl",
+                                      "Shaders/PhongMultipleLightsAndTextureShadow.glsl",
+                                      {"NUM_LIGHTS": 1, "USE_TEXTURE": True, "USE_SHADOW": True},
+                                      self.setTextureShader)
+            self.shaderReloader.watch(self.InstancedTextureShader, "Shaders/VertexShaderLightingTextureShadow.glsl",
+                                      "Shaders/PhongMultipleLightsAndTextureShadow.glsl",
+                                      {"NUM_LIGHTS": 1, "USE_TEXTURE": True, "USE_SHADOW": True, "INSTANCED": True},
+                                      lambda program: self.setLightingProgram("InstancedTextureShader", program))
+            self.shaderReloader.watch(self.DepthShader, "Shaders/SimpleDepthVert.glsl",
+                                      "Shaders/SimpleDepthFrag.glsl", None, self.setDepthShader)
+            if self.meshPool.indirect:
+                self.shaderReloader.watch(self.PooledTextureShader, "Shaders/VertexShaderLightingTextureShadow.glsl",
+                                          "Shaders/PhongMultipleLightsAndTextureShadow.glsl",
+                                          {"NUM_LIGHTS": 1, "USE_TEXTURE": True, "USE_SHADOW": True,
+                                           "POOLED": True},
+                                          lambda program: self.setLightingProgram("PooledTextureShader", program))
+                self.shaderReloader.watch(self.PooledDepthShader, "Shaders/SimpleDepthVert.glsl",
+                                          "Shaders/SimpleDepthFrag.glsl", {"POOLED": True}, self.setPooledDepthShader)
+
+    # Makes the program the texture shader.
+    def setTextureShader(self, program):
+        self.setLightingProgram("TextureShader", program)
+
+    # Makes the program the lighting program stored in the attribute of the given name, the
+    # texture, instanced or pooled texture shader, attaches the buffers it reads and loads
+    # the uniforms that are not set every frame.
+    def setLightingProgram(self, name, program):
+        setattr(self, name, program)
+        glUseProgram(program)
+        program.setVec4("GlobalAmbient", glm.vec4(0.2, 0.2, 0.2, 1))
+        program.setMat4("textrans", glm.mat4(3))
+        program.setMat4("PV", self.projectionMatrix * self.viewMatrix)
+        self.lightBuffer.attach(program)
+        self.materialBuffer.attach(program)
+        if self.meshPool.indirect:
+            self.meshPool.attach(program)
+
+    # Returns the programs that draw the lit, textured and shadowed objects.
+    def lightingPrograms(self):
+        programs = [self.TextureShader, self.InstancedTextureShader]
+        if self.PooledTextureShader is not None:
+            programs.append(self.PooledTextureShader)
+        return programs
+
+    # Makes the program the depth shader and gets the locations of its uniforms, the
+    # uniforms are set every frame.
+    def setDepthShader(self, program):
+        self.DepthShader = program
+        self.locDepthPV = glGetUniformLocation(self.DepthShader, "PV")
+        self.locDepthModel = glGetUniformLocation(self.DepthShader, "Model")
+
+    # Makes the program the pooled depth shader and attaches the draw data of the mesh pool.
+    def setPooledDepthShader(self, program):
+        self.PooledDepthShader = program
+        self.meshPool.attach(program)
+
+    # Textures are shared through the texture manager, loading an image that is already
+    # on the graphics card returns the same texture ID.
+    def loadTexture(self, filename):
+        return textureManager.acquire(filename)
+
+    # Loads a list of textures at once, decoding the images on worker threads.
+    def loadTextures(self, filenames):
+        return textureManager.acquireAll(filenames)
+
+    # Returns the (N, 2, 3) world boxes of the objects of the scene.
+    def objectBoxes(self):
+        return transformBoxes([obj[0].boundingBox for obj in self.sceneObjects],
+                              self.sceneGraph.worldMatrices[self.objectNodes])
+
+    # Updates the scene graph.  The objects and walls whose nodes moved get their new model
+    # matrices and the nodes of the scene BVH above the moved objects are refit.
+    def updateScene(self):
+        changed = self.sceneGraph.update()
+        if len(changed) == 0:
+            return
+        moved = np.flatnonzero(np.isin(self.objectNodes, changed))
+        for i in moved:
+            node = self.sceneGraph.nodes[self.objectNodes[i]]
+            self.sceneObjects[i] = self.sceneObjects[i][0:1] + (node.worldMatrix(),) + self.sceneObjects[i][2:]
+        if len(moved) > 0:
+            self.sceneBVH.refit(self.objectBoxes(), moved)
+        self.wallModels = self.sceneGraph.worldMatrices[[node.index for node in self.wallNodes]]
+
+    # Returns the resolutions of the shadow maps, one for each cascade or the one for the room.
+    def shadowResolutions(self):
+        if self.cascadedShadows:
+            return list(self.cascadeResolutions)
+        return [self.shadowResolution]
+
+    # Makes the depth texture array, a layer for each shadow map.  The layers all have the
+    # size of the largest shadow map, a smaller one is drawn into the lower left corner of its
+    # layer.  The whole layer is cleared to the far depth, and so is the border, so nothing
+    # outside of a shadow map is in shadow.
+    def allocateShadowMaps(self):
+        resolutions = self.shadowResolutions()
+        if len(resolutions) > self.maxCascades:
+            raise Exception("At most " + str(self.maxCascades) + " shadow cascades are supported.")
+        size = max(resolutions)
+
         glActiveTexture(GL_TEXTURE0 + self.depthMap)
-        glBindTexture(GL_TEXTURE_2D, self.depthMap)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_DEPTH_COMPONENT,
-                     self.SHADOW_WIDTH, self.SHADOW_HEIGHT, 0, GL_DEPTH_COMPONENT, GL_FLOAT, None)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.depthMap)
+        glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, GL_DEPTH_COMPONENT,
+                     size, size, len(resolutions), 0, GL_DEPTH_COMPONENT, GL_FLOAT, None)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
         borderColor = [1.0, 1.0, 1.0, 1.0]
-        glTexParameterfv(GL_TEXTURE_2D, GL_TEXTURE_BORDER_COLOR, borderColor)
+        glTexParameterfv(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_BORDER_COLOR, borderColor)
 
         glBindFramebuffer(GL_FRAMEBUFFER, self.depthMapFBO)
-        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_TEXTURE_2D, self.depthMap, 0)
+        glFramebufferTextureLayer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, self.depthMap, 0, 0)
         glDrawBuffer(GL_NONE)
         glReadBuffer(GL_NONE)
         glBindFramebuffer(GL_FRAMEBUFFER, 0)
 
-    def loadTexture(self, filename):
-        teximg = Image.open(filename)
-        teximg = teximg.convert('RGBA')
-        teximg = teximg.transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
-
-        texID = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_2D, texID)
-        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, teximg.width, teximg.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
-        glGenerateMipmap(GL_TEXTURE_2D)
-
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-
-        return texID
-
-    def matLoad(self, model, depthPass):
+    # Returns the distances from the camera where the cascades start and end, one more than
+    # the number of cascades.  The near and far planes are found from the projection matrix.
+    def cascadeSplits(self):
+        P = self.projectionMatrix
+        near = P[3][2] / (P[2][2] - 1)
+        far = min(P[3][2] / (P[2][2] + 1), self.shadowDistance)
+        fractions = np.arange(len(self.cascadeResolutions) + 1) / len(self.cascadeResolutions)
+        logarithmic = near * (far / near) ** fractions
+        even = near + (far - near) * fractions
+        return self.cascadeSplitWeight * logarithmic + (1 - self.cascadeSplitWeight) * even
+
+    # Returns the light space matrices, projection * view, of the cascades.  The projection of
+    # a cascade is an orthographic box around the sphere around the corners of its part of the
+    # view frustum.  The sphere is found in the coordinates of the camera, so it does not
+    # change as the camera moves or turns, and its center is moved to a whole number of shadow
+    # map texels in the view of the light.  The texels of the shadow map then stay in place in
+    # the world as the camera moves and the edges of the shadows do not shimmer.  The depth
+    # range of each box is the depth range of the scene seen by the light, so every object
+    # that can cast a shadow into the cascade is in it.
+    def cascadeMatrices(self, lightView):
+        splits = self.cascadeSplits()
+        P = self.projectionMatrix
+        # Stored by columns, so the points are moved by multiplying them as rows.
+        cameraToLight = np.array(lightView * glm.inverse(self.viewMatrix), np.float64).T
+        view = np.array(lightView, np.float64).T
+
+        # The corners of the box around the objects and the walls in the view of the light.
+        boxes = np.concatenate([self.objectBoxes(),
+                                transformBoxes([self.simpleplane.boundingBox] * len(self.wallModels),
+                                               self.wallModels)])
+        sceneBox = np.array([boxes[:, 0].min(axis=0), boxes[:, 1].max(axis=0)])
+        corners = np.array(np.meshgrid(*sceneBox.T, indexing='ij')).reshape(3, -1).T
+        depths = (np.append(corners, np.ones((8, 1)), axis=1) @ view)[:, 2]
+        near, far = -depths.max(), -depths.min()
+
+        matrices = []
+        for i, resolution in enumerate(self.cascadeResolutions):
+            # The corners of the part of the view frustum between the split distances, in the
+            # coordinates of the camera.
+            points = np.array([[x * d / P[0][0], y * d / P[1][1], -d]
+                               for x in (-1, 1) for y in (-1, 1) for d in splits[i:i + 2]])
+            center = points.mean(axis=0)
+            radius = np.ceil(16 * np.sqrt(((points - center) ** 2).sum(axis=1).max())) / 16
+
+            texel = 2 * radius / resolution
+            center = (np.append(center, 1) @ cameraToLight)[0:2]
+            center = np.floor(center / texel) * texel
+            projection = glm.orthoRH(center[0] - radius, center[0] + radius, center[1] - radius,
+                                     center[1] + radius, near, far)
+            matrices.append(projection * lightView)
+        return matrices
+
+    # Toggle between cascaded shadow maps and one shadow map for the room.
+    def toggleCascades(self):
+        self.cascadedShadows = not self.cascadedShadows
+        self.allocateShadowMaps()
+
+    # Returns the PickHit of the object of the scene under the mouse position, in pixels from
+    # the top left corner of the window, or None.  The object of the hit is the number of the
+    # object in the scene.  The scene BVH gives the objects whose boxes the ray goes through,
+    # nearest first.
+    def pick(self, position):
+        origin, direction = mouseRay(position, (self.screenWidth, self.screenHeight),
+                                     self.projectionMatrix, self.viewMatrix)
+        indices, entries = self.sceneBVH.queryRay(origin, direction, 1)
+        objects = [(i, self.sceneObjects[i][0], self.sceneObjects[i][1]) for i in indices]
+        return self.picker.pick(origin, direction, objects, entries)
+
+    # Submits the objects of the scene to the render queue and draws them.  The depth pass
+    # draws with the depth shader, without textures, and leaves out the walls of the room.
+    # The objects come from the mesh pool and use the pooled programs if there are any.
+    # The scene BVH finds the objects that can be seen in the frustum and only those are
+    # submitted, in the order of the object list.
+    def renderScene(self, depthPass, frustum):
         if depthPass:
-            glUniformMatrix4fv(self.locDepthModel, 1, GL_FALSE, glm.value_ptr(model))
+            program = self.PooledDepthShader or self.DepthShader
         else:
-            self.LoadMatrices(model)
+            program = self.PooledTextureShader or self.TextureShader
+        material = (self.materialBuffer, 0)
 
-    def renderScene(self, depthPass):
-        if depthPass:
-            glUseProgram(self.DepthShader)
+        if self.cullObjects:
+            indices = self.sceneBVH.queryFrustum(frustum)
         else:
-            glUseProgram(self.TextureShader)
-
-        textureMat = glm.mat4(1)
-        if not depthPass:
-            glUniformMatrix4fv(self.texTransform, 1, GL_FALSE, glm.value_ptr(textureMat))
-            glUniform1i(self.texLocRender, self.texID1)
-        model = glm.translate(glm.vec3(15, 2.5, 10))
-        model = glm.scale(model, glm.vec3(5))
-        self.matLoad(model, depthPass)
-        self.cube.draw()
-
-        model = glm.translate(glm.vec3(-10, 5, 3))
-        model = glm.rotate(model, glm.radians(30), glm.vec3(1, 1, 1))
-        model = glm.scale(model, glm.vec3(5))
-        self.matLoad(model, depthPass)
-        self.cube.draw()
-
-        if not depthPass:
-            glUniform1i(self.texLocRender, self.texID4)
-        model = glm.translate(glm.vec3(7, 6, -10))
-        model = glm.scale(model, glm.vec3(3))
-        self.matLoad(model, depthPass)
-        self.torus.draw()
-
-        if not depthPass:
-            glUniform1i(self.texLocRender, self.texID2)
-        model = glm.translate(glm.vec3(-10, 5, -15))
-        model = glm.scale(model, glm.vec3(5))
-        self.matLoad(model, depthPass)
-        self.teapot.draw()
-
-        textureMat = glm.scale(glm.vec3(50, 3, 1))
-        if not depthPass:
-            glUniformMatrix4fv(self.texTransform, 1, GL_FALSE, glm.value_ptr(textureMat))
-            glUniform1i(self.texLocRender, self.texID7)
-        model = glm.translate(glm.vec3(0, 6, 15))
-        model = glm.scale(model, glm.vec3(3))
-        self.matLoad(model, depthPass)
-        self.trefiol.draw()
-
-        # Do not add in the walls to the depth map, will self shadow on scene.
+            indices = range(len(self.sceneObjects))
+
+        drawn = 0
+        for i in indices:
+            mesh, model, texture, textureMat, castsShadow = self.sceneObjects[i]
+            # Do not add in the walls to the depth map, will self shadow on scene.
+            if depthPass and not castsShadow:
+                continue
+            if depthPass:
+                self.renderQueue.submit(program, (), None, mesh, model)
+            else:
+                self.renderQueue.submit(program, (("tex1", texture),), material, mesh, model, textureMat)
+            drawn += 1
         if depthPass:
-            return
-
-        # Room
-        # Floor
-        textureMat = glm.mat4(10)
-        if not depthPass:
-            glUniformMatrix4fv(self.texTransform, 1, GL_FALSE, glm.value_ptr(textureMat))
-            glUniform1i(self.texLocRender, self.texID3)
-        model = glm.scale(glm.vec3(50))
-        model = glm.rotate(model, -np.pi / 2, glm.vec3(1, 0, 0))
-        self.matLoad(model, depthPass)
-        self.simpleplane.draw()
-
-        # Ceiling
-        if not depthPass:
-            glUniform1i(self.texLocRender, self.texID6)
-        model = glm.translate(glm.vec3(0, 50, 0))
-        model = glm.scale(model, glm.vec3(50))
-        model = glm.rotate(model, np.pi / 2, glm.vec3(1, 0, 0))
-        self.matLoad(model, depthPass)
-        self.simpleplane.draw()
-
-        # Walls
-        if not depthPass:
-            glUniform1i(self.texLocRender, self.texID5)
-        model = glm.translate(glm.vec3(0, 50, -50))
-        model = glm.scale(model, glm.vec3(50))
-        self.matLoad(model, depthPass)
-        self.simpleplane.draw()
-
-        if not depthPass:
-            glUniform1i(self.texLocRender, self.texID5)
-        model = glm.translate(glm.vec3(0, 50, 50))
-        model = glm.rotate(model, glm.radians(180), glm.vec3(0, 1, 0))
-        model = glm.scale(model, glm.vec3(50))
-        self.matLoad(model, depthPass)
-        self.simpleplane.draw()
+            self.culled += sum(1 for obj in self.sceneObjects if obj[4]) - drawn
+        else:
+            self.culled += len(self.sceneObjects) - drawn
 
+        # Walls, the four walls have the same texture and are drawn as instances of the plane.
         if not depthPass:
-            glUniform1i(self.texLocRender, self.texID5)
-        model = glm.translate(glm.vec3(50, 50, 0))
-        model = glm.rotate(model, glm.radians(-90), glm.vec3(0, 1, 0))
-        model = glm.scale(model, glm.vec3(50))
-        self.matLoad(model, depthPass)
-        self.simpleplane.draw()
+            wallModels = self.wallModels
+            if self.cullObjects:
+                visible = frustum.testMeshes([self.simpleplane] * len(wallModels), wallModels)
+                self.culled += len(wallModels) - int(visible.sum())
+                wallModels = wallModels[visible]
+            if len(wallModels) > 0:
+                self.renderQueue.submitInstanced(self.InstancedTextureShader, (("tex1", self.texID5),), material,
+                                                 self.simpleplane, wallModels, glm.mat4(10))
 
-        if not depthPass:
-            glUniform1i(self.texLocRender, self.texID5)
-        model = glm.translate(glm.vec3(-50, 50, 0))
-        model = glm.rotate(model, glm.radians(90), glm.vec3(0, 1, 0))
-        model = glm.scale(model, glm.vec3(50))
-        self.matLoad(model, depthPass)
-        self.simpleplane.draw()
+        self.renderQueue.execute()
 
     # Turn on shader, clear screen, draw axes, cubes, or box.
     def update(self):
-        # Render depth map.
-        glUseProgram(self.DepthShader)
-        lightProjection = glm.orthoRH(-50.0, 50.0, -50.0, 50.0, 0.1, 150)
-
+        # Swap in the programs of edited shader files.
+        if self.shaderReloader is not None:
+            self.shaderReloader.update()
+        self.renderQueue.newFrame()
+        self.culled = 0
+        self.updateScene()
+
+        # Render depth maps, one for each cascade or one for the whole room.
         lightView = glm.lookAt(self.lightcamera.getPosition(),
                                glm.vec3(0.0, 0.0, 0.0),
                                glm.vec3(0.0, 1.0, 0.0))
-        lightSpaceMatrix = lightProjection * lightView
-        glUniformMatrix4fv(self.locDepthPV, 1, GL_FALSE, glm.value_ptr(lightSpaceMatrix))
+        if self.cascadedShadows:
+            lightSpaceMatrices = self.cascadeMatrices(lightView)
+        else:
+            lightProjection = glm.orthoRH(-50.0, 50.0, -50.0, 50.0, 0.1, 150)
+            lightSpaceMatrices = [lightProjection * lightView]
+        resolutions = self.shadowResolutions()
 
-        glViewport(0, 0, self.SHADOW_WIDTH, self.SHADOW_HEIGHT)
         glBindFramebuffer(GL_FRAMEBUFFER, self.depthMapFBO)
-        glClear(GL_DEPTH_BUFFER_BIT)
+        for layer, lightSpaceMatrix in enumerate(lightSpaceMatrices):
+            glUseProgram(self.DepthShader)
+            glUniformMatrix4fv(self.locDepthPV, 1, GL_FALSE, glm.value_ptr(lightSpaceMatrix))
+            if self.PooledDepthShader is not None:
+                glUseProgram(self.PooledDepthShader)
+                self.PooledDepthShader.setMat4("PV", lightSpaceMatrix)
+
+            glFramebufferTextureLayer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, self.depthMap, 0, layer)
+            glViewport(0, 0, resolutions[layer], resolutions[layer])
+            glClear(GL_DEPTH_BUFFER_BIT)
 
-        self.renderScene(True)
+            self.renderScene(True, Frustum(lightSpaceMatrix))
 
         glBindFramebuffer(GL_FRAMEBUFFER, 0)
 
@@ -359,14 +576,11 @@ class GraphicsEngine():
             self.lightsphere.draw()
 
         # Draw remainder of scene.
-        glUseProgram(self.TextureShader)
-
-        glUniform1i(self.texLocDepthTexture, self.depthMap)
-        glUniformMatrix4fv(self.locLightMatrix, 1, GL_FALSE, glm.value_ptr(lightSpaceMatrix))
-
-        # Set the light position from the light "camera". Load to shader.
+        # Set the light position from the light "camera". Load to the light buffer, only
+        # when the light has moved.
         self.lights[0].position = glm.vec4(self.lightcamera.getPosition(), 1)
-        self.lights[0].LoadLight(self.TextureShader, "Lt[0]")
+        self.lights[0].StoreLight(self.lightBuffer, 0)
+        self.lightBuffer.update()
 
         # Get the position of the camera and load to the shader.
         eye = glm.vec3(0, 0, 0)
@@ -375,9 +589,16 @@ class GraphicsEngine():
         elif self.cameranum == 1:
             eye = self.yprcamera.getPosition()
 
-        glUniform3fv(glGetUniformLocation(self.TextureShader, "eye"), 1, glm.value_ptr(eye))
+        for program in self.lightingPrograms():
+            glUseProgram(program)
+            program.setInt("shadowMap", self.depthMap)
+            program.setInt("cascadeCount", len(lightSpaceMatrices))
+            for layer, lightSpaceMatrix in enumerate(lightSpaceMatrices):
+                program.setMat4("cascadeMatrices[" + str(layer) + "]", lightSpaceMatrix)
+                program.setFloat("cascadeScales[" + str(layer) + "]", resolutions[layer] / max(resolutions))
+            program.setVec3("eye", eye)
 
-        self.renderScene(False)
+        self.renderScene(False, Frustum(self.projectionMatrix * self.viewMatrix))
 
         self.printOpenGLErrors()
 
@@ -393,13 +614,6 @@ class GraphicsEngine():
     def setPoint(self):
         self.mode = GL_POINT
 
-    # Loads the model matrix, calculates the normal matrix, (M^(-1))^T, and loads
-    # it to the shader.  Function assumes that the lighting shader program is active.
-    def LoadMatrices(self, model):
-        glUniformMatrix4fv(self.modelLocPhong, 1, GL_FALSE, glm.value_ptr(model))
-        NM = glm.inverse(glm.transpose(glm.mat3(model)))
-        glUniformMatrix3fv(self.normalMatrixLocPhong, 1, GL_FALSE, glm.value_ptr(NM))
-
     # Set and load the projection matrix to the graphics card.
     def setProjectionMatrix(self, size):
         w, h = size
@@ -407,8 +621,9 @@ class GraphicsEngine():
         PV = self.projectionMatrix * self.viewMatrix
         glUseProgram(self.AxesShader)
         glUniformMatrix4fv(self.projviewLocAxes, 1, GL_FALSE, glm.value_ptr(PV))
-        glUseProgram(self.TextureShader)
-        glUniformMatrix4fv(self.projviewLocPhong, 1, GL_FALSE, glm.value_ptr(PV))
+        for program in self.lightingPrograms():
+            glUseProgram(program)
+            program.setMat4("PV", PV)
         glUseProgram(self.ConstColorShader)
         glUniformMatrix4fv(self.projviewLocConst, 1, GL_FALSE, glm.value_ptr(PV))
         self.screenWidth = w
@@ -424,8 +639,9 @@ class GraphicsEngine():
         PV = self.projectionMatrix * self.viewMatrix
         glUseProgram(self.AxesShader)
         glUniformMatrix4fv(self.projviewLocAxes, 1, GL_FALSE, glm.value_ptr(PV))
-        glUseProgram(self.TextureShader)
-        glUniformMatrix4fv(self.projviewLocPhong, 1, GL_FALSE, glm.value_ptr(PV))
+        for program in self.lightingPrograms():
+            glUseProgram(program)
+            program.setMat4("PV", PV)
         glUseProgram(self.ConstColorShader)
         glUniformMatrix4fv(self.projviewLocConst, 1, GL_FALSE, glm.value_ptr(PV))
 
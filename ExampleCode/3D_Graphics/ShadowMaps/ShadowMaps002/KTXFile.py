@@ -0,0 +1,185 @@
+#! /usr/bin/env python3
+#
+# KTX file object
+#
+# Reads, writes and uploads textures stored in the KTX 1.1 container format,
+# https://registry.khronos.org/KTX/specs/1.0/ktxspec.v1.html.  A KTX file holds
+# the OpenGL type and format of the data followed by every mipmap level of the
+# texture, all six faces of each level for a cube map, so it can be uploaded with
+# one glTexImage2D or glCompressedTexImage2D call per level and face without
+# decoding an image or generating mipmaps.
+#
+# The files are made by the TextureBaker script and are stored next to the image
+# they were baked from, as image.jpg.ktx for a 2D texture, image.jpg.cross.ktx for
+# a cube map cut from a skybox cross and image.jpg.one.ktx for a cube map with the
+# image on all six faces.  A baked file is only used while it is newer than its
+# image.
+#
+# The data of 2D textures is stored bottom row first, as OpenGL expects it, and
+# the faces of cube maps top row first, the same as the loaders in the examples.
+
+from OpenGL.GL import *
+from OpenGL.GL.EXT.texture_compression_s3tc import *
+import numpy as np
+import os
+
+
+class KTXFile():
+    identifier = bytes([0xAB, 0x4B, 0x54, 0x58, 0x20, 0x31, 0x31, 0xBB, 0x0D, 0x0A, 0x1A, 0x0A])
+    cubeFaces = [GL_TEXTURE_CUBE_MAP_POSITIVE_X, GL_TEXTURE_CUBE_MAP_NEGATIVE_X,
+                 GL_TEXTURE_CUBE_MAP_POSITIVE_Y, GL_TEXTURE_CUBE_MAP_NEGATIVE_Y,
+                 GL_TEXTURE_CUBE_MAP_POSITIVE_Z, GL_TEXTURE_CUBE_MAP_NEGATIVE_Z]
+
+    # Formats the baker can write, (glType, glFormat, glInternalFormat, bytes per 4x4 block).
+    # Uncompressed formats have glType and glFormat, compressed ones have 0 for both.
+    formats = {"rgba": (GL_UNSIGNED_BYTE, GL_RGBA, GL_RGBA8, 64),
+               "bc1": (0, 0, int(GL_COMPRESSED_RGB_S3TC_DXT1_EXT), 8),
+               "bc3": (0, 0, int(GL_COMPRESSED_RGBA_S3TC_DXT5_EXT), 16)}
+
+    # Constructor, reads the file if a filename is given.
+    def __init__(self, filename=None):
+        self.glType = GL_UNSIGNED_BYTE
+        self.glFormat = GL_RGBA
+        self.glInternalFormat = GL_RGBA8
+        self.glBaseInternalFormat = GL_RGBA
+        self.width = 0
+        self.height = 0
+        self.numfaces = 1
+        self.keyValues = {}
+
+        # The data of each level, levels[level][face] is a NumPy uint8 array.
+        self.levels = []
+
+        if filename is not None:
+            self.read(filename)
+
+    # Sets the format by name, one of the keys of the formats dictionary.
+    def setFormat(self, name):
+        self.glType, self.glFormat, self.glInternalFormat, blocksize = self.formats[name]
+        self.glBaseInternalFormat = GL_RGB if name == "bc1" else GL_RGBA
+
+    def isCompressed(self):
+        return self.glType == 0
+
+    # Total size of the texture data in bytes.
+    def dataSize(self):
+        return sum(len(face) for level in self.levels for face in level)
+
+    def read(self, filename):
+        with open(filename, 'rb') as file:
+            data = file.read()
+
+        if data[0:12] != self.identifier:
+            raise Exception("Not a KTX 1.1 file: " + filename)
+
+        byteorder = '<u4' if np.frombuffer(data, '<u4', 1, 12)[0] == 0x04030201 else '>u4'
+        header = np.frombuffer(data, byteorder, 13, 12).tolist()
+        (endianness, self.glType, glTypeSize, self.glFormat, self.glInternalFormat, self.glBaseInternalFormat,
+         self.width, self.height, depth, arrayelements, self.numfaces, numlevels, kvbytes) = header
+        numlevels = max(numlevels, 1)
+
+        # Key and value pairs, each is a size, then the key and value as null terminated strings.
+        self.keyValues = {}
+        offset = 64
+        end = offset + kvbytes
+        while offset < end:
+            size = int(np.frombuffer(data, byteorder, 1, offset)[0])
+            pair = data[offset + 4:offset + 4 + size].split(b'\0')
+            self.keyValues[pair[0].decode()] = pair[1].decode() if len(pair) > 1 else ""
+            offset += 4 + size + (-size % 4)
+        offset = end
+
+        # Levels, the image size is the size of one face.  The arrays are views of the file data.
+        self.levels = []
+        for level in range(numlevels):
+            imagesize = int(np.frombuffer(data, byteorder, 1, offset)[0])
+            offset += 4
+            faces = []
+            for face in range(self.numfaces):
+                faces.append(np.frombuffer(data, np.uint8, imagesize, offset))
+                offset += imagesize + (-imagesize % 4)
+            self.levels.append(faces)
+
+    def write(self, filename):
+        keyvalue = b''
+        for key, value in self.keyValues.items():
+            pair = key.encode() + b'\0' + value.encode() + b'\0'
+            keyvalue += np.array([len(pair)], '<u4').tobytes() + pair + b'\0' * (-len(pair) % 4)
+
+        glTypeSize = 1
+        header = np.array([0x04030201, self.glType, glTypeSize, self.glFormat, self.glInternalFormat,
+                           self.glBaseInternalFormat, self.width, self.height, 0, 0, self.numfaces,
+                           len(self.levels), len(keyvalue)], '<u4')
+
+        # Write to a temporary file first so that a partly written file is never used.
+        tempname = filename + ".tmp"
+        with open(tempname, 'wb') as file:
+            file.write(self.identifier)
+            file.write(header.tobytes())
+            file.write(keyvalue)
+            for faces in self.levels:
+                file.write(np.array([len(faces[0])], '<u4').tobytes())
+                for face in faces:
+                    file.write(face.tobytes())
+                    file.write(b'\0' * (-len(face) % 4))
+        os.replace(tempname, filename)
+
+    # Creates a texture with all of the levels and faces and returns the texture ID and the
+    # size of the data.  Mipmaps are only generated if the file has a single level and the
+    # minification filter needs them.
+    def load(self, wrap=GL_REPEAT, magfilter=GL_LINEAR, minfilter=GL_LINEAR_MIPMAP_LINEAR):
+        target = GL_TEXTURE_CUBE_MAP if self.numfaces == 6 else GL_TEXTURE_2D
+        facetargets = self.cubeFaces if self.numfaces == 6 else [GL_TEXTURE_2D]
+
+        texID = glGenTextures(1)
+        glBindTexture(target, texID)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+
+        for level, faces in enumerate(self.levels):
+            width = max(1, self.width >> level)
+            height = max(1, self.height >> level)
+            for facetarget, data in zip(facetargets, faces):
+                if self.isCompressed():
+                    glCompressedTexImage2D(facetarget, level, self.glInternalFormat, width, height, 0,
+                                           len(data), data)
+                else:
+                    glTexImage2D(facetarget, level, self.glInternalFormat, width, height, 0,
+                                 self.glFormat, self.glType, data)
+
+        size = self.dataSize()
+        mipmapped = minfilter in (GL_NEAREST_MIPMAP_NEAREST, GL_LINEAR_MIPMAP_NEAREST,
+                                  GL_NEAREST_MIPMAP_LINEAR, GL_LINEAR_MIPMAP_LINEAR)
+        if len(self.levels) == 1 and mipmapped and not self.isCompressed():
+            glGenerateMipmap(target)
+            size = size * 4 // 3
+        else:
+            glTexParameteri(target, GL_TEXTURE_MAX_LEVEL, len(self.levels) - 1)
+
+        glTexParameteri(target, GL_TEXTURE_WRAP_S, wrap)
+        glTexParameteri(target, GL_TEXTURE_WRAP_T, wrap)
+        if target == GL_TEXTURE_CUBE_MAP:
+            glTexParameteri(target, GL_TEXTURE_WRAP_R, wrap)
+        glTexParameteri(target, GL_TEXTURE_MAG_FILTER, magfilter)
+        glTexParameteri(target, GL_TEXTURE_MIN_FILTER, minfilter)
+
+        return texID, size
+
+
+# Returns the name of the baked file for an image, layout is None for a 2D texture and
+# "cross" or "one" for the cube map layouts.
+def bakedFileName(filename, layout=None):
+    if layout is None:
+        return filename + ".ktx"
+    return filename + "." + layout + ".ktx"
+
+
+# Returns the name of the baked file for an image if there is one that is up to date,
+# otherwise None.
+def findBakedFile(filename, layout=None):
+    bakedname = bakedFileName(filename, layout)
+    try:
+        if os.path.getmtime(bakedname) >= os.path.getmtime(filename):
+            return bakedname
+    except OSError:
+        pass
+    return None
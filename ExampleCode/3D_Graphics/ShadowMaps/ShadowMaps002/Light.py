@@ -8,7 +8,8 @@
 # Single floats for shininess for the spot cutoff and spot exponent
 # and a boolean that determines if the light is on or not.
 # The class also has a function for loading the data to the shaders
-# assuming the shader uses the following struct.
+# assuming the shader uses the following struct, and one for storing it in
+# a LightBuffer, the uniform buffer of an array of these structs.
 #
 # struct Light
 # {
@@ -56,16 +57,29 @@ class Light():
         self.attenuation = glm.vec3(1, 0, 0)
 
     # Loads the light information to the shader light struct.  The shader parameter is
-    # the shader address and the name is the variable name of the light structure variable
-    # in the shader.
+    # the ShaderProgram and the name is the variable name of the light structure variable
+    # in the shader.  Values that have not changed since the last load are not sent.
     def LoadLight(self, shader, name):
         glUseProgram(shader)
-        glUniform1i(glGetUniformLocation(shader, name + ".on"), self.on)
-        glUniform4fv(glGetUniformLocation(shader, name + ".position"), 1, glm.value_ptr(self.position))
-        glUniform3fv(glGetUniformLocation(shader, name + ".spotDirection"), 1, glm.value_ptr(self.spotDirection))
-        glUniform4fv(glGetUniformLocation(shader, name + ".ambient"), 1, glm.value_ptr(self.ambient))
-        glUniform4fv(glGetUniformLocation(shader, name + ".diffuse"), 1, glm.value_ptr(self.diffuse))
-        glUniform4fv(glGetUniformLocation(shader, name + ".specular"), 1, glm.value_ptr(self.specular))
-        glUniform1f(glGetUniformLocation(shader, name + ".spotCutoff"), self.spotCutoff)
-        glUniform1f(glGetUniformLocation(shader, name + ".spotExponent"), self.spotExponent)
-        glUniform3fv(glGetUniformLocation(shader, name + ".attenuation"), 1, glm.value_ptr(self.attenuation))
+        shader.setBool(name + ".on", self.on)
+        shader.setVec4(name + ".position", self.position)
+        shader.setVec3(name + ".spotDirection", self.spotDirection)
+        shader.setVec4(name + ".ambient", self.ambient)
+        shader.setVec4(name + ".diffuse", self.diffuse)
+        shader.setVec4(name + ".specular", self.specular)
+        shader.setFloat(name + ".spotCutoff", self.spotCutoff)
+        shader.setFloat(name + ".spotExponent", self.spotExponent)
+        shader.setVec3(name + ".attenuation", self.attenuation)
+
+    # Stores the light information as element index of a LightBuffer.  Only the fields that
+    # changed are marked dirty, the buffer update function loads them to the graphics card.
+    def StoreLight(self, buffer, index):
+        buffer.set(index, "on", self.on)
+        buffer.set(index, "position", self.position)
+        buffer.set(index, "spotDirection", self.spotDirection)
+        buffer.set(index, "ambient", self.ambient)
+        buffer.set(index, "diffuse", self.diffuse)
+        buffer.set(index, "specular", self.specular)
+        buffer.set(index, "spotCutoff", self.spotCutoff)
+        buffer.set(index, "spotExponent", self.spotExponent)
+        buffer.set(index, "attenuation", self.attenuation)
@@ -0,0 +1,246 @@
+#! /usr/bin/env python3
+#
+# Mesh pool
+#
+# Holds the static meshes of a scene in one vertex buffer and one index buffer, so
+# that they are all drawn from the same vertex array.  The vertices are stored with
+# a common layout, the position, normal and texture coordinate of a vertex next to
+# each other, at the attribute locations the shaders use.
+#
+# layout(location = 0) in vec4 vposition;
+# layout(location = 2) in vec3 vnormal;
+# layout(location = 3) in vec2 in_tex_coord;
+#
+# The add function copies the data of a mesh into the pool and returns a PooledMesh,
+# the first index, index count and base vertex of the mesh in the pool, with the
+# bounding box, bounding sphere and meshData of the mesh.  The mesh objects keep
+# their data in meshData, a tuple of the flattened vertex, normal, texture coordinate
+# and index arrays, the index array is None for meshes that are not indexed.  The
+# vertex colors of a mesh are not kept.  The buffers double in size when a mesh does
+# not fit, the meshes already in the pool are copied on the graphics card.
+#
+# A PooledMesh is drawn by itself with glDrawElementsBaseVertex, with the Model and
+# NormalMatrix uniforms of the program, which works on an OpenGL 3.3 context.  On
+# OpenGL 4.3 and later the drawIndirect function draws a list of pooled meshes with
+# a single glMultiDrawElementsIndirect call.  The draw commands are loaded to the
+# indirect buffer and the model and normal matrices of the draws to a shader storage
+# buffer, read by programs compiled with POOLED defined, see PoolDraws.glsl.  Each
+# command has the number of its draw as the base instance, and the drawIndex
+# attribute, with a divisor of 1, reads the number from a buffer of 0, 1, 2, ... so
+# the shader knows which matrices to use.  The attach function connects the storage
+# block of a program to the binding point of the pool.
+
+from OpenGL.GL import *
+import ctypes
+import numpy as np
+from InstanceBuffer import *
+
+positionLocation = 0
+normalLocation = 2
+texLocation = 3
+drawIndexLocation = 12
+
+# Binding point of the DrawBlock storage buffer.
+drawBinding = 2
+
+# std430 layout of the data of a draw, each column of the mat3 starts on a 16 byte
+# boundary.
+drawDType = np.dtype({"names": ["model", "normal"],
+                      "formats": [("<f4", (4, 4)), ("<f4", (3, 4))],
+                      "offsets": [0, 64],
+                      "itemsize": 112})
+
+
+class PooledMesh():
+    # Constructor
+    def __init__(self, pool, firstIndex, count, baseVertex):
+        self.pool = pool
+        self.firstIndex = firstIndex
+        self.count = count
+        self.baseVertex = baseVertex
+
+    # Draws the mesh from the buffers of the pool.
+    def draw(self):
+        glBindVertexArray(self.pool.VAO)
+        glDrawElementsBaseVertex(GL_TRIANGLES, self.count, GL_UNSIGNED_INT,
+                                 ctypes.c_void_p(4 * self.firstIndex), self.baseVertex)
+
+
+class MeshPool():
+    # Set to False to draw the meshes one at a time on any context.
+    useIndirect = True
+
+    # Number of floats in a vertex, the position, normal and texture coordinate.
+    vertexSize = 8
+
+    # Constructor, creates the buffers with room for the given number of vertices and
+    # indices.  Checks if the context can draw indirect.
+    def __init__(self, vertexCapacity=4096, indexCapacity=16384):
+        version = (glGetIntegerv(GL_MAJOR_VERSION), glGetIntegerv(GL_MINOR_VERSION))
+        self.indirect = self.useIndirect and version >= (4, 3)
+        self.meshes = []
+        self.vertexCount = 0
+        self.indexCount = 0
+        self.vertexCapacity = 0
+        self.indexCapacity = 0
+        self.drawCapacity = 0
+
+        self.VAO = glGenVertexArrays(1)
+        self.ArrayBuffer = 0
+        self.EBO = 0
+        self.allocate(vertexCapacity, indexCapacity)
+
+        if self.indirect:
+            self.commandBuffer = glGenBuffers(1)
+            self.drawBuffer = glGenBuffers(1)
+            self.drawIndexBuffer = glGenBuffers(1)
+
+    # Makes new buffers of the given sizes and copies the data of the old ones to them, then
+    # sets up the attributes of the vertex array.
+    def allocate(self, vertexCapacity, indexCapacity):
+        floatsz = ctypes.sizeof(ctypes.c_float)
+        uintsz = ctypes.sizeof(ctypes.c_uint)
+        stride = self.vertexSize * floatsz
+
+        arrayBuffer = glGenBuffers(1)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, arrayBuffer)
+        glBufferData(GL_COPY_WRITE_BUFFER, vertexCapacity * stride, None, GL_STATIC_DRAW)
+        indexBuffer = glGenBuffers(1)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, indexBuffer)
+        glBufferData(GL_COPY_WRITE_BUFFER, indexCapacity * uintsz, None, GL_STATIC_DRAW)
+
+        if self.vertexCapacity > 0:
+            glBindBuffer(GL_COPY_READ_BUFFER, self.ArrayBuffer)
+            glBindBuffer(GL_COPY_WRITE_BUFFER, arrayBuffer)
+            glCopyBufferSubData(GL_COPY_READ_BUFFER, GL_COPY_WRITE_BUFFER, 0, 0, self.vertexCount * stride)
+            glBindBuffer(GL_COPY_READ_BUFFER, self.EBO)
+            glBindBuffer(GL_COPY_WRITE_BUFFER, indexBuffer)
+            glCopyBufferSubData(GL_COPY_READ_BUFFER, GL_COPY_WRITE_BUFFER, 0, 0, self.indexCount * uintsz)
+            glBindBuffer(GL_COPY_READ_BUFFER, 0)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, 0)
+        if self.vertexCapacity > 0:
+            glDeleteBuffers(2, [self.ArrayBuffer, self.EBO])
+
+        self.ArrayBuffer = arrayBuffer
+        self.EBO = indexBuffer
+        self.vertexCapacity = vertexCapacity
+        self.indexCapacity = indexCapacity
+
+        glBindVertexArray(self.VAO)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO)
+        glBindBuffer(GL_ARRAY_BUFFER, self.ArrayBuffer)
+        glVertexAttribPointer(positionLocation, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(0))
+        glVertexAttribPointer(normalLocation, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(3 * floatsz))
+        glVertexAttribPointer(texLocation, 2, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(6 * floatsz))
+        glEnableVertexAttribArray(positionLocation)
+        glEnableVertexAttribArray(normalLocation)
+        glEnableVertexAttribArray(texLocation)
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    # Copies the data of the mesh into the pool and returns the PooledMesh that draws it.
+    def add(self, mesh):
+        if getattr(mesh, "meshData", None) is None:
+            raise Exception("The mesh has no data to add to the pool.")
+        vertices, normals, tex, indices = mesh.meshData
+
+        # Positions of 4 components, as in the cube, are cut to 3.
+        count = len(normals) // 3
+        data = np.empty((count, self.vertexSize), np.float32)
+        data[:, 0:3] = np.asarray(vertices, np.float32).reshape(count, -1)[:, 0:3]
+        data[:, 3:6] = np.asarray(normals, np.float32).reshape(count, 3)
+        data[:, 6:8] = np.asarray(tex, np.float32).reshape(count, 2)
+        if indices is None:
+            indices = np.arange(count, dtype=np.uint32)
+        indices = np.ascontiguousarray(indices, np.uint32)
+
+        vertexCapacity = self.vertexCapacity
+        while self.vertexCount + count > vertexCapacity:
+            vertexCapacity *= 2
+        indexCapacity = self.indexCapacity
+        while self.indexCount + len(indices) > indexCapacity:
+            indexCapacity *= 2
+        if vertexCapacity > self.vertexCapacity or indexCapacity > self.indexCapacity:
+            self.allocate(vertexCapacity, indexCapacity)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.ArrayBuffer)
+        glBufferSubData(GL_ARRAY_BUFFER, self.vertexCount * data.itemsize * self.vertexSize, data.nbytes, data)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, self.EBO)
+        glBufferSubData(GL_COPY_WRITE_BUFFER, self.indexCount * indices.itemsize, indices.nbytes, indices)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, 0)
+
+        pooled = PooledMesh(self, self.indexCount, len(indices), self.vertexCount)
+        pooled.boundingBox = getattr(mesh, "boundingBox", None)
+        pooled.boundingSphere = getattr(mesh, "boundingSphere", None)
+        pooled.meshData = mesh.meshData
+        self.meshes.append(pooled)
+        self.vertexCount += count
+        self.indexCount += len(indices)
+        return pooled
+
+    # Connects the DrawBlock of the program to the binding point of the pool.  Returns False
+    # if the program does not have the block.
+    def attach(self, program):
+        index = glGetProgramResourceIndex(program, GL_SHADER_STORAGE_BLOCK, "DrawBlock")
+        if index == GL_INVALID_INDEX:
+            return False
+        glShaderStorageBlockBinding(program, index, drawBinding)
+        return True
+
+    # Grows the buffers of the draw commands and draw data to hold count draws.
+    def reserveDraws(self, count):
+        if count <= self.drawCapacity:
+            return
+        self.drawCapacity = max(count, 2 * self.drawCapacity)
+        glBindBuffer(GL_ARRAY_BUFFER, self.drawIndexBuffer)
+        drawIndices = np.arange(self.drawCapacity, dtype=np.int32)
+        glBufferData(GL_ARRAY_BUFFER, drawIndices.nbytes, drawIndices, GL_STATIC_DRAW)
+
+        glBindVertexArray(self.VAO)
+        glVertexAttribIPointer(drawIndexLocation, 1, GL_INT, 0, ctypes.c_void_p(0))
+        glVertexAttribDivisor(drawIndexLocation, 1)
+        glEnableVertexAttribArray(drawIndexLocation)
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    # Draws the pooled meshes, each with its model matrix, with one glMultiDrawElementsIndirect
+    # call.  The models are glm matrices or an (N, 4, 4) array stored by columns, the program
+    # must be compiled with POOLED defined and attached to the pool.
+    def drawIndirect(self, meshes, models):
+        if not self.indirect:
+            raise Exception("Drawing indirect needs OpenGL 4.3.")
+        if not isinstance(models, np.ndarray):
+            models = modelMatrices(models)
+        count = len(meshes)
+        self.reserveDraws(count)
+
+        commands = np.empty((count, 5), np.uint32)
+        commands[:, 0] = [mesh.count for mesh in meshes]
+        commands[:, 1] = 1
+        commands[:, 2] = [mesh.firstIndex for mesh in meshes]
+        commands[:, 3] = [mesh.baseVertex for mesh in meshes]
+        commands[:, 4] = np.arange(count)
+
+        draws = np.zeros(count, drawDType)
+        draws["model"] = models
+        draws["normal"][:, :, 0:3] = normalMatrices(models)
+
+        # Orphan the buffers, the draws of the last call may still read them.
+        glBindBuffer(GL_DRAW_INDIRECT_BUFFER, self.commandBuffer)
+        glBufferData(GL_DRAW_INDIRECT_BUFFER, commands.nbytes, commands, GL_STREAM_DRAW)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.drawBuffer)
+        glBufferData(GL_SHADER_STORAGE_BUFFER, draws.nbytes, draws.view(np.uint8), GL_STREAM_DRAW)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER, drawBinding, self.drawBuffer)
+
+        glBindVertexArray(self.VAO)
+        glMultiDrawElementsIndirect(GL_TRIANGLES, GL_UNSIGNED_INT, None, count, 0)
+        glBindBuffer(GL_DRAW_INDIRECT_BUFFER, 0)
+
+    # Removes the buffers from the graphics card.
+    def delete(self):
+        glDeleteBuffers(2, [self.ArrayBuffer, self.EBO])
+        glDeleteVertexArrays(1, [self.VAO])
+        if self.indirect:
+            glDeleteBuffers(3, [self.commandBuffer, self.drawBuffer, self.drawIndexBuffer])
+        self.meshes = []
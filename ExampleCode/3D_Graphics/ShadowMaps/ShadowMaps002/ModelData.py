@@ -10,6 +10,11 @@
 # Order of the components must be (x, y, z), (nx, ny, nz), and (tx, ty).
 # The values on each vertex line must be separated by spaces.
 #
+# Parsing the text file is slow for large models so the parsed data is cached in a
+# binary sidecar file, <datafile>.<formattype>.npy, next to the data file.  The cache
+# holds the vertex, normal and texture coordinate blocks in the order they are loaded
+# to the graphics card.  It is rebuilt whenever the data file is newer than the cache.
+#
 # Don Spickler
 # 1/7/2022
 
@@ -17,15 +22,18 @@ from OpenGL.GL import *
 import ctypes
 import numpy as np
 import glm
+import os
 from PIL import Image
+from Bounds import *
 
 
 class ModelData():
     # Constructor, img is assumed to be a PIL Image.
-    def __init__(self, datafile=None, formattype="VNT"):
+    def __init__(self, datafile=None, formattype="VNT", usecache=True):
         # Setup VAO and buffers.
         self.datafilename = datafile
         self.type = formattype.upper()
+        self.usecache = usecache
         self.vertexcount = 0
 
         self.VAO = glGenVertexArrays(1)
@@ -34,9 +42,10 @@ class ModelData():
         self.LoadDataToGraphicsCard()
 
     # Reset the properties of the object, img is assumed to be a PIL Image.
-    def set(self, datafile=None, formattype="VNT"):
+    def set(self, datafile=None, formattype="VNT", usecache=True):
         self.datafilename = datafile
         self.type = formattype.upper()
+        self.usecache = usecache
         self.vertexcount = 0
 
         self.LoadDataToGraphicsCard()
@@ -55,6 +64,62 @@ class ModelData():
         # Convert number strings to numeric values. Store in list structure and return.
         return [float(n) for n in datastringlist]
 
+    # Name of the binary cache file for the current data file and format type.
+    def cacheFileName(self):
+        return self.datafilename + "." + self.type + ".npy"
+
+    # Parse the text data file in bulk.  Returns a single float32 array with all of the
+    # vertices, followed by all of the normals, followed by all of the texture coordinates.
+    def parseDataFile(self):
+        with open(self.datafilename, 'r') as file:
+            data = np.fromstring(file.read(), dtype=np.float64, sep=" ")
+        data = data.reshape(-1, 8)
+
+        # Find the columns of each component from the format type string.
+        sizes = {"V": 3, "N": 3, "T": 2}
+        columns = {}
+        col = 0
+        for c in self.type:
+            columns[c] = data[:, col:col + sizes[c]]
+            col += sizes[c]
+
+        return np.concatenate([columns["V"].ravel(), columns["N"].ravel(),
+                               columns["T"].ravel()]).astype(np.float32)
+
+    # Get the model data, from the cache if it is up-to-date and otherwise by parsing
+    # the data file and then writing the cache.  Cache errors are not fatal, a cache that
+    # cannot be read, such as an empty or cut off file, is removed and the data is parsed
+    # again.
+    def loadData(self):
+        if sorted(self.type) != sorted("VNT"):
+            raise Exception("The format type must be an ordering of VNT, not " + self.type + ".")
+
+        cachefile = self.cacheFileName()
+        if self.usecache:
+            try:
+                if os.path.getmtime(cachefile) >= os.path.getmtime(self.datafilename):
+                    return np.load(cachefile, mmap_mode='r')
+            except OSError:
+                pass
+            except (ValueError, EOFError):
+                try:
+                    os.remove(cachefile)
+                except OSError:
+                    pass
+
+        modeldata = self.parseDataFile()
+
+        if self.usecache:
+            try:
+                # Write to a temporary file and rename so a partial cache is never read.
+                tempfile = cachefile + ".tmp.npy"
+                np.save(tempfile, modeldata)
+                os.replace(tempfile, cachefile)
+            except OSError:
+                pass
+
+        return modeldata
+
     # Load vertex, normal, and index data to the graphics card.
     def LoadDataToGraphicsCard(self):
         vPosition = 0
@@ -65,75 +130,36 @@ class ModelData():
         if self.datafilename is None:
             return
 
-        data = open(self.datafilename, 'r').read()
-        data = data.split("\n")
-
-        vertices = []
-        normals = []
-        texcoords = []
-
-        for i in range(len(data)):
-            dataline = data[i].rstrip().lstrip()
-            if len(dataline) > 0:
-                line = self.makeDataList(dataline)
-                if self.type == "VNT":
-                    vertices.extend(line[0:3])
-                    normals.extend(line[3:6])
-                    texcoords.extend(line[6:])
-                elif self.type == "VTN":
-                    vertices.extend(line[0:3])
-                    texcoords.extend(line[3:5])
-                    normals.extend(line[5:])
-                elif self.type == "TVN":
-                    texcoords.extend(line[0:2])
-                    vertices.extend(line[2:5])
-                    normals.extend(line[5:])
-                elif self.type == "TNV":
-                    texcoords.extend(line[0:2])
-                    normals.extend(line[2:5])
-                    vertices.extend(line[5:])
-                elif self.type == "NVT":
-                    normals.extend(line[0:3])
-                    vertices.extend(line[3:6])
-                    texcoords.extend(line[6:])
-                elif self.type == "NTV":
-                    normals.extend(line[0:3])
-                    texcoords.extend(line[3:5])
-                    vertices.extend(line[5:])
-
-        # Convert data to GLSL form and get machine sizes of data types.
-        vertexdata = np.array(vertices).astype(ctypes.c_float)
-        normaldata = np.array(normals).astype(ctypes.c_float)
-        texcoorddata = np.array(texcoords).astype(ctypes.c_float)
+        # Data is in blocks, vertices then normals then texture coordinates.
+        modeldata = self.loadData()
+        self.vertexcount = len(modeldata) // 8
         floatsz = ctypes.sizeof(ctypes.c_float)
 
+        # Keep the data for the MeshPool, the triangles are not indexed, and the bounds for
+        # frustum culling.
+        n = self.vertexcount
+        self.meshData = (modeldata[0:3 * n], modeldata[3 * n:6 * n], modeldata[6 * n:8 * n], None)
+        self.boundingBox, self.boundingSphere = meshBounds(modeldata[0:3 * n].reshape(-1, 3))
+
         # Bind (turn on) a vertex array.
         glBindVertexArray(self.VAO)
 
         # Bind (turn on) the vertex buffer (storage location).
         glBindBuffer(GL_ARRAY_BUFFER, self.ArrayBuffer)
 
-        # Allocate space for the vertex, normal, and texture coordinate data. Do not load data at this point.
-        glBufferData(GL_ARRAY_BUFFER, floatsz * (len(vertices) + len(normals) + len(texcoords)), None, GL_DYNAMIC_DRAW)
-
-        # Load the data vertex at the beginning, then normals, then texture coordinates.
-        glBufferSubData(GL_ARRAY_BUFFER, 0, floatsz * len(vertices), vertexdata)
-        glBufferSubData(GL_ARRAY_BUFFER, floatsz * len(vertices), floatsz * len(normals), normaldata)
-        glBufferSubData(GL_ARRAY_BUFFER, floatsz * (len(vertices) + len(normals)), floatsz * len(texcoords),
-                        texcoorddata)
+        # Load the vertex, normal, and texture coordinate data in a single transfer.
+        glBufferData(GL_ARRAY_BUFFER, modeldata.nbytes, np.ascontiguousarray(modeldata), GL_DYNAMIC_DRAW)
 
         # Setup attribute information. Note that the 5th parameter is 0, indicating tightly packed.
         glVertexAttribPointer(vPosition, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
-        glVertexAttribPointer(vNormal, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(floatsz * len(vertices)))
-        glVertexAttribPointer(vTex, 2, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(floatsz * (len(vertices) + len(normals))))
+        glVertexAttribPointer(vNormal, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(floatsz * 3 * self.vertexcount))
+        glVertexAttribPointer(vTex, 2, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(floatsz * 6 * self.vertexcount))
 
         # Set position indexes for shader streams.
         glEnableVertexAttribArray(vPosition)
         glEnableVertexAttribArray(vNormal)
         glEnableVertexAttribArray(vTex)
 
-        self.vertexcount = len(vertices) // 3
-
     # Draw the Object.
     def draw(self):
         glBindVertexArray(self.VAO)
@@ -0,0 +1,158 @@
+#! /usr/bin/env python3
+#
+# Picking
+#
+# Finds the object and the triangle under the mouse.  The mouse position is moved
+# back through the inverse of the projection * view matrix to a ray in world
+# coordinates, from the near plane to the far plane, see mouseRay.
+#
+# Each mesh that can be picked has a TriangleBVH, a BVH over the boxes of its
+# triangles built with buildLinear, which is fast enough for models of millions of
+# triangles.  The Picker makes the tree of a mesh from its meshData the first time the
+# mesh is picked and keeps it until the mesh is given new meshData.  The ray is moved to the coordinates of a mesh by the
+# inverse of the model matrix of the object, so the tree does not change when the
+# object moves, and distances along the ray are the same in both coordinates.  The
+# tree returns the triangles in the leaves that the ray enters, nearest first, and
+# they are tested in batches with the Moller-Trumbore ray triangle test, all of the
+# triangles of a batch at once with NumPy, until the next batch starts beyond the
+# closest hit found.
+#
+# A hit is a PickHit with the object, the number of the triangle in the mesh, the
+# distance along the ray from the near plane, the barycentric coordinates of the
+# point in the triangle and the point in world coordinates.
+
+import numpy as np
+import glm
+from BVH import *
+
+
+# Returns the origin and direction of the ray through the mouse position, in pixels from
+# the top left corner of a window of the size, for the projection and view matrices.  The
+# origin is on the near plane and origin + direction on the far plane.
+def mouseRay(position, size, projection, view):
+    x = 2 * (position[0] + 0.5) / size[0] - 1
+    y = 1 - 2 * (position[1] + 0.5) / size[1]
+    inverse = glm.inverse(projection * view)
+    near = inverse * glm.vec4(x, y, -1, 1)
+    far = inverse * glm.vec4(x, y, 1, 1)
+    near = glm.vec3(near) / near.w
+    far = glm.vec3(far) / far.w
+    return np.array(near, np.float64), np.array(far - near, np.float64)
+
+
+# Returns the cross products of the rows of a and b, (3,) or (N, 3) arrays.  Faster than
+# np.cross for the small batches of a pick.
+def cross(a, b):
+    a = a.T
+    b = b.T
+    return np.stack([a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]], axis=-1)
+
+
+# Returns the distances along the ray to the triangles, given by a corner and the two edges
+# from it as (N, 3) arrays, and the barycentric coordinates u and v of the hits for the
+# other two corners.  Triangles that are missed, or hit behind the origin, get a distance of
+# infinity.  Both sides of a triangle can be hit.
+def intersectTriangles(origin, direction, corners, edges1, edges2):
+    p = cross(direction, edges2)
+    determinants = np.einsum('ij,ij->i', edges1, p)
+    valid = np.abs(determinants) > 1e-30
+    inverse = 1 / np.where(valid, determinants, 1)
+    s = origin - corners
+    u = np.einsum('ij,ij->i', s, p) * inverse
+    q = cross(s, edges1)
+    v = (q @ direction) * inverse
+    t = np.einsum('ij,ij->i', q, edges2) * inverse
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf), u, v
+
+
+class TriangleBVH():
+    leafSize = 8
+    batchSize = 64
+
+    # Constructor, points is the (N, 3) array of the vertex positions and triangles the
+    # (T, 3) array of the vertex numbers of the corners of each triangle, or None if each
+    # three points in order are a triangle.
+    def __init__(self, points, triangles=None):
+        points = np.asarray(points, np.float32).reshape(-1, 3)
+        if triangles is None:
+            corners = points[0:len(points) // 3 * 3].reshape(-1, 3, 3)
+        else:
+            corners = points[np.asarray(triangles, np.int64).reshape(-1, 3)]
+        self.corners = corners[:, 0]
+        self.edges1 = corners[:, 1] - corners[:, 0]
+        self.edges2 = corners[:, 2] - corners[:, 0]
+
+        self.bvh = BVH()
+        self.bvh.leafSize = self.leafSize
+        self.bvh.buildLinear(np.stack([corners.min(axis=1), corners.max(axis=1)], axis=1))
+
+    # Returns the closest hit of the ray as the triangle number, the distance in units of the
+    # length of the direction and the barycentric coordinates u and v, or None if the ray
+    # misses the mesh before maxDistance.
+    def intersect(self, origin, direction, maxDistance=np.inf):
+        items, entries = self.bvh.queryRay(origin, direction, maxDistance)
+        closest = None
+        for start in range(0, len(items), self.batchSize):
+            if entries[start] > maxDistance:
+                break
+            batch = items[start:start + self.batchSize]
+            t, u, v = intersectTriangles(origin, direction, self.corners[batch], self.edges1[batch],
+                                         self.edges2[batch])
+            i = int(np.argmin(t))
+            if t[i] < maxDistance:
+                maxDistance = t[i]
+                closest = (int(batch[i]), float(t[i]), float(u[i]), float(v[i]))
+        return closest
+
+
+class PickHit():
+    # Constructor
+    def __init__(self, obj, triangle, distance, barycentric, position):
+        self.object = obj
+        self.triangle = triangle
+        self.distance = distance
+        self.barycentric = barycentric
+        self.position = position
+
+
+class Picker():
+    # Constructor
+    def __init__(self):
+        self.meshTrees = {}
+
+    # Returns the TriangleBVH of the mesh, made from its meshData the first time and again
+    # when the meshData changes.
+    def meshTree(self, mesh):
+        data, tree = self.meshTrees.get(mesh, (None, None))
+        if data is not mesh.meshData:
+            vertices, normals, tex, indices = mesh.meshData
+            count = len(normals) // 3
+            points = np.asarray(vertices, np.float32).reshape(count, -1)[:, 0:3]
+            tree = TriangleBVH(points, indices)
+            self.meshTrees[mesh] = (mesh.meshData, tree)
+        return tree
+
+    # Returns the closest PickHit of the ray with the objects, or None.  The objects are a
+    # list of (object, mesh, model) with the glm model matrix of each.  If the distances along
+    # the ray where it reaches the bounds of the objects are given, in the same order, the
+    # objects should be sorted by them and the ones past the closest hit are not tested.
+    def pick(self, origin, direction, objects, entries=None):
+        closest = None
+        maxDistance = np.inf
+        for i, (obj, mesh, model) in enumerate(objects):
+            if entries is not None and entries[i] > maxDistance:
+                break
+            inverse = glm.inverse(model)
+            modelOrigin = np.array(glm.vec3(inverse * glm.vec4(*origin, 1)), np.float64)
+            modelDirection = np.array(glm.vec3(inverse * glm.vec4(*direction, 0)), np.float64)
+            hit = self.meshTree(mesh).intersect(modelOrigin, modelDirection, maxDistance)
+            if hit is not None:
+                triangle, t, u, v = hit
+                maxDistance = t
+                closest = (obj, triangle, t, u, v)
+
+        if closest is None:
+            return None
+        obj, triangle, t, u, v = closest
+        return PickHit(obj, triangle, float(t * np.linalg.norm(direction)), (1 - u - v, u, v), origin + t * direction)
@@ -12,6 +12,7 @@ from OpenGL.GL import *
 import ctypes
 import numpy as np
 import glm
+from Bounds import *
 
 
 class Plane():
@@ -44,68 +45,59 @@ class Plane():
         vNormal = 2
         vTex = 3
 
-        vertices = []
-        normals = []
-        tex = []
-
-        # Load data into lists.
-        for i in range(self.lon + 1):
-            for j in range(self.lat + 1):
-                # Calculate vertices.
-                x = -self.w/2 +self.w* (i / self.lon)
-                y = -self.h/2 +self.h* (j / self.lat)
-                z = 0
-
-                # Calculate normals.
-                nx = 0
-                ny = 0
-                nz = 1
-
-                vertices.extend([x, y, z])
-                normals.extend([nx, ny, nz])
-                tex.extend([i / self.lon, j / self.lat])
-
-        # Setup indexing array for triangles.
-        indices = []
-        for i in range(self.lon):
-            for j in range(self.lat):
-                indices.append(i * (self.lat + 1) + j)
-                indices.append((i + 1) * (self.lat + 1) + j)
-                indices.append((i + 1) * (self.lat + 1) + j + 1)
-                indices.append(i * (self.lat + 1) + j)
-                indices.append((i + 1) * (self.lat + 1) + j + 1)
-                indices.append(i * (self.lat + 1) + j + 1)
-
-        # Convert data to GLSL form and get machine sizes of data types.
-        indexdata = np.array(indices).astype(ctypes.c_uint)
-        vertexdata = np.array(vertices).astype(ctypes.c_float)
-        normaldata = np.array(normals).astype(ctypes.c_float)
-        texdata = np.array(tex).astype(ctypes.c_float)
-        floatsz = ctypes.sizeof(ctypes.c_float)
-        uintsz = ctypes.sizeof(ctypes.c_uint)
+        # Parameter grid, the first axis runs over the longitude (i) and the second
+        # over the latitude (j), matching the vertex order used by the index array.
+        i, j = np.meshgrid(np.arange(self.lon + 1), np.arange(self.lat + 1), indexing='ij')
+
+        # Calculate vertices.
+        vertices = np.stack([-self.w / 2 + self.w * (i / self.lon),
+                             -self.h / 2 + self.h * (j / self.lat),
+                             np.zeros(i.shape)], axis=-1)
+
+        # Calculate normals, all pointing in the positive z direction.
+        normals = np.zeros(vertices.shape)
+        normals[..., 2] = 1
+        tex = np.stack([i / self.lon, j / self.lat], axis=-1)
+
+        # Setup indexing array for triangles, two triangles for each grid cell.  The
+        # index p is the lower left corner of the cell and q is the lower right corner, the
+        # next vertex in i, the longitude direction, so p + 1 and q + 1 are the upper corners.
+        i, j = np.meshgrid(np.arange(self.lon), np.arange(self.lat), indexing='ij')
+        p = (i * (self.lat + 1) + j).ravel()
+        q = p + self.lat + 1
+        indexdata = np.stack([p, q, q + 1, p, q + 1, p + 1], axis=1).astype(np.uint32).ravel()
+
+        # Convert data to GLSL form, flattened and tightly packed.
+        vertexdata = np.ascontiguousarray(vertices, dtype=np.float32).ravel()
+        normaldata = np.ascontiguousarray(normals, dtype=np.float32).ravel()
+        texdata = np.ascontiguousarray(tex, dtype=np.float32).ravel()
+
+        # Keep the data for the MeshPool and the bounds for frustum culling.
+        self.meshData = (vertexdata, normaldata, texdata, indexdata)
+        self.boundingBox, self.boundingSphere = meshBounds(vertexdata.reshape(-1, 3))
 
         # Bind (turn on) a vertex array.
         glBindVertexArray(self.VAO)
 
         # Load the indexing arrays on the graphics card. Load the fill index array.
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO)
-        glBufferData(GL_ELEMENT_ARRAY_BUFFER, uintsz * len(indices), indexdata, GL_STATIC_DRAW)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indexdata.nbytes, indexdata, GL_STATIC_DRAW)
 
         # Bind (turn on) the vertex buffer (storage location).
         glBindBuffer(GL_ARRAY_BUFFER, self.ArrayBuffer)
 
         # Allocate space but not load data at this point.
-        glBufferData(GL_ARRAY_BUFFER, floatsz * (len(vertices) + len(normals) + len(tex)), None, GL_DYNAMIC_DRAW)
+        glBufferData(GL_ARRAY_BUFFER, vertexdata.nbytes + normaldata.nbytes + texdata.nbytes, None, GL_DYNAMIC_DRAW)
 
         # Load the data.
-        glBufferSubData(GL_ARRAY_BUFFER, 0, floatsz * len(vertices), vertexdata)
-        glBufferSubData(GL_ARRAY_BUFFER, floatsz * len(vertices), floatsz * len(normals), normaldata)
-        glBufferSubData(GL_ARRAY_BUFFER, floatsz * (len(vertices) + len(normals)), floatsz * len(tex), texdata)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, vertexdata.nbytes, vertexdata)
+        glBufferSubData(GL_ARRAY_BUFFER, vertexdata.nbytes, normaldata.nbytes, normaldata)
+        glBufferSubData(GL_ARRAY_BUFFER, vertexdata.nbytes + normaldata.nbytes, texdata.nbytes, texdata)
 
         # Setup attribute information.
         glVertexAttribPointer(vPosition, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
-        glVertexAttribPointer(vNormal, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(floatsz * len(vertices)))
-        glVertexAttribPointer(vTex, 2, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(floatsz * (len(vertices) + len(normals))))
+        glVertexAttribPointer(vNormal, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(vertexdata.nbytes))
+        glVertexAttribPointer(vTex, 2, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(vertexdata.nbytes + normaldata.nbytes))
 
         # Set position indexes for shader streams.
         glEnableVertexAttribArray(vPosition)
@@ -0,0 +1,160 @@
+#! /usr/bin/env python3
+#
+# Render queue
+#
+# Objects are drawn by submitting items to the queue instead of setting the OpenGL
+# state and drawing them one at a time.  An item is the program, the texture set,
+# the material, the mesh and the model matrix of a draw.  The execute function
+# sorts the items by a state key, the program first, then the textures, the
+# material and the mesh, and draws them in one pass, changing only the state that
+# differs from the item before it.  Items with the same state keep the order they
+# were submitted in.
+#
+# The texture set is a tuple of (sampler name, texture ID) pairs with an optional
+# texture matrix, loaded to the textrans uniform.  As in the rest of the examples
+# each texture is bound to the texture unit of its ID, so the sampler is set to the
+# texture ID.  The material is a (MaterialBuffer, index) pair, or None to keep the
+# material that is bound.  A buffer of more than one material is bound a material
+# at a time with bindRange.  The mesh is any object with a draw function, the model
+# matrix is loaded to the Model uniform and its normal matrix to the NormalMatrix
+# uniform if the program has one.  The programs must be ShaderProgram objects, their
+# setters skip values the program already has.
+#
+# An instanced item draws a copy of the mesh for each matrix of an (N, 4, 4) array
+# of model matrices with the drawInstanced function of the mesh, its program reads
+# the matrices from the instance attributes, see the InstanceBuffer object.
+#
+# Meshes of a MeshPool share the vertex array of the pool, so they are sorted as one
+# mesh.  If the pool draws indirect, the items in a row with the same program,
+# textures and material are drawn with one glMultiDrawElementsIndirect call, their
+# program must be compiled with POOLED defined.
+#
+# The counts of state changes and draw calls are kept for each frame, newFrame
+# starts a new frame and keeps the counts of the last one in frameStats.
+
+from OpenGL.GL import *
+import glm
+
+
+class RenderQueue():
+    maxStates = 4096
+
+    # Constructor
+    def __init__(self):
+        self.items = []
+        self.stateOrder = {}
+        self.stats = self.emptyStats()
+        self.frameStats = self.emptyStats()
+        self.boundTextures = set()
+
+    # Returns the counters of a frame set to zero.
+    def emptyStats(self):
+        return {"programs": 0, "textures": 0, "materials": 0, "meshes": 0, "draws": 0}
+
+    # Starts a new frame.  The counts of the frame that ended are moved to frameStats and the
+    # textures bound to the texture units are checked again, other code may have changed them.
+    # The state numbers are started over if animated texture matrices have made too many.
+    def newFrame(self):
+        self.frameStats = self.stats
+        self.stats = self.emptyStats()
+        self.boundTextures = set()
+        if len(self.stateOrder) > self.maxStates:
+            self.stateOrder = {}
+
+    # Returns the total number of state changes of the last frame.
+    def stateChanges(self):
+        return sum(self.frameStats[name] for name in ["programs", "textures", "materials", "meshes"])
+
+    # Returns a number for the state, the order in which the state was first seen.  The
+    # numbers keep the sort stable from frame to frame without comparing matrices or meshes.
+    def order(self, state):
+        number = self.stateOrder.get(state)
+        if number is None:
+            number = len(self.stateOrder)
+            self.stateOrder[state] = number
+        return number
+
+    # Adds an item to the queue.
+    def submit(self, program, textures, material, mesh, model, textureMatrix=None):
+        self.addItem(program, textures, material, mesh, model, textureMatrix, False)
+
+    # Adds an instanced item to the queue, models is the (N, 4, 4) array of model matrices.
+    def submitInstanced(self, program, textures, material, mesh, models, textureMatrix=None):
+        self.addItem(program, textures, material, mesh, models, textureMatrix, True)
+
+    # Adds an item with its state key to the queue.
+    def addItem(self, program, textures, material, mesh, model, textureMatrix, instanced):
+        if textureMatrix is not None:
+            textureMatrix = glm.mat4(textureMatrix)
+            textureState = (tuple(textures), tuple(tuple(column) for column in textureMatrix))
+        else:
+            textureState = (tuple(textures), None)
+        materialState = None if material is None else (id(material[0]), material[1])
+
+        key = (int(program), self.order(("textures",) + textureState),
+               self.order(("material", materialState)), self.order(("mesh", id(getattr(mesh, "pool", mesh)))))
+        self.items.append((key, len(self.items), program, textures, textureMatrix, material, mesh, model,
+                           instanced))
+
+    # Sorts the items by their state and draws them, then empties the queue.
+    def execute(self):
+        self.items.sort(key=lambda item: (item[0], item[1]))
+
+        currentProgram = None
+        currentTextures = None
+        currentMaterial = None
+        currentMesh = None
+        items = self.items
+        i = 0
+        while i < len(items):
+            key, number, program, textures, textureMatrix, material, mesh, model, instanced = items[i]
+            if currentProgram is None or key[0] != int(currentProgram):
+                glUseProgram(program)
+                currentProgram = program
+                currentTextures = None
+                self.stats["programs"] += 1
+
+            if key[1] != currentTextures:
+                for sampler, texture in textures:
+                    if texture not in self.boundTextures:
+                        glActiveTexture(GL_TEXTURE0 + texture)
+                        glBindTexture(GL_TEXTURE_2D, texture)
+                        self.boundTextures.add(texture)
+                    program.setInt(sampler, texture)
+                if textureMatrix is not None:
+                    program.setMat4("textrans", textureMatrix)
+                currentTextures = key[1]
+                if textures or textureMatrix is not None:
+                    self.stats["textures"] += 1
+
+            if material is not None and key[2] != currentMaterial:
+                buffer, index = material
+                if len(buffer.data) > 1:
+                    buffer.bindRange(index)
+                else:
+                    buffer.bind()
+                currentMaterial = key[2]
+                self.stats["materials"] += 1
+
+            if key[3] != currentMesh:
+                currentMesh = key[3]
+                self.stats["meshes"] += 1
+
+            pool = getattr(mesh, "pool", None)
+            if instanced:
+                mesh.drawInstanced(model)
+            elif pool is not None and pool.indirect:
+                end = i + 1
+                while end < len(items) and items[end][0] == key and not items[end][8]:
+                    end += 1
+                pool.drawIndirect([item[6] for item in items[i:end]], [item[7] for item in items[i:end]])
+                i = end - 1
+            else:
+                program.setMat4("Model", model)
+                if program.location("NormalMatrix") >= 0:
+                    program.setMat3("NormalMatrix", glm.inverse(glm.transpose(glm.mat3(model))))
+                mesh.draw()
+            self.stats["draws"] += 1
+            i += 1
+
+        self.items = []
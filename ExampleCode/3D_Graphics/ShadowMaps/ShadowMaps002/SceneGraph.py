@@ -0,0 +1,212 @@
+#! /usr/bin/env python3
+#
+# Scene graph
+#
+# A tree of nodes, each with a local translation, rotation and scale and a parent.
+# The world matrix of a node is the world matrix of its parent times its local
+# matrix, translate * rotate * scale, so moving a node moves everything under it.
+# The world matrices and their normal matrices are cached and only found again for
+# the nodes that changed and the nodes under them.
+#
+# The nodes are stored in flat NumPy arrays in the SceneGraph, a SceneNode is the
+# number of a node in those arrays.  Changing the translation, rotation or scale of a
+# node marks it dirty, nothing is computed until update is called.  update works one
+# depth of the tree at a time from the root down, a node is dirty if its parent is,
+# and the local and world matrices of all of the dirty nodes at a depth are found
+# with a few NumPy operations.  A wide hierarchy of thousands of nodes is updated in
+# a few array operations per depth, a chain such as a robot arm in one step per link.
+#
+# The matrices are stored by columns, the order OpenGL reads them in, as (N, 4, 4)
+# and (N, 3, 3) arrays, the transpose of np.array(glm.mat4).  They can be loaded to an
+# instance buffer directly, worldMatrix and normalMatrix of a node return glm
+# matrices.  The rotations are unit quaternions stored as (w, x, y, z).
+
+import numpy as np
+import glm
+from InstanceBuffer import *
+
+
+class SceneNode():
+    # Constructor, node number index of the graph.
+    def __init__(self, graph, index):
+        self.graph = graph
+        self.index = index
+
+    # Returns the parent node, None for a root.
+    def parent(self):
+        parent = self.graph.parents[self.index]
+        return self.graph.nodes[parent] if parent >= 0 else None
+
+    # Returns the list of the child nodes.
+    def children(self):
+        return [self.graph.nodes[i] for i in np.flatnonzero(self.graph.parents[0:self.graph.count] == self.index)]
+
+    # Sets the translation of the node, a glm.vec3 or 3 numbers.
+    def setTranslation(self, translation):
+        self.graph.setValue(self.graph.translations, self.index, np.asarray(translation, np.float32).reshape(3))
+
+    # Sets the rotation of the node, a glm.quat.
+    def setRotation(self, rotation):
+        self.graph.setValue(self.graph.rotations, self.index, np.array([rotation.w, rotation.x, rotation.y,
+                                                                        rotation.z], np.float32))
+
+    # Sets the rotation of the node to the angle in radians about the axis.
+    def setAngleAxis(self, angle, axis):
+        self.setRotation(glm.angleAxis(angle, glm.normalize(glm.vec3(axis))))
+
+    # Sets the scale of the node, a glm.vec3, 3 numbers or one number for all three axes.
+    def setScale(self, scale):
+        self.graph.setValue(self.graph.scales, self.index,
+                            np.broadcast_to(np.asarray(scale, np.float32).reshape(-1), 3))
+
+    # Moves the node under the parent node, None for a root.
+    def setParent(self, parent):
+        self.graph.setParent(self.index, -1 if parent is None else parent.index)
+
+    # Returns the local matrix of the node as a glm matrix.
+    def localMatrix(self):
+        self.graph.update()
+        return glm.mat4(*self.graph.localMatrices[self.index].ravel())
+
+    # Returns the world matrix of the node as a glm matrix, updating the graph if needed.
+    def worldMatrix(self):
+        self.graph.update()
+        return glm.mat4(*self.graph.worldMatrices[self.index].ravel())
+
+    # Returns the normal matrix of the world matrix of the node as a glm matrix.
+    def normalMatrix(self):
+        self.graph.update()
+        return glm.mat3(*self.graph.normalMatrices[self.index].ravel())
+
+
+class SceneGraph():
+    # Constructor, space for capacity nodes is made at first, it grows as needed.
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.nodes = []
+        self.allocate(capacity)
+        self.levels = []
+        self.levelsValid = True
+
+    # Makes the arrays large enough for capacity nodes, the data of the nodes is kept.
+    def allocate(self, capacity):
+        fields = [("parents", (), -1, np.int32), ("depths", (), 0, np.int32),
+                  ("translations", (3,), 0, np.float32), ("rotations", (4,), 0, np.float32),
+                  ("scales", (3,), 1, np.float32), ("localMatrices", (4, 4), 0, np.float32),
+                  ("worldMatrices", (4, 4), 0, np.float32), ("normalMatrices", (3, 3), 0, np.float32),
+                  ("localDirty", (), False, bool), ("worldDirty", (), False, bool)]
+        for name, shape, fill, dtype in fields:
+            array = np.full((capacity,) + shape, fill, dtype)
+            if self.count > 0:
+                array[0:self.count] = getattr(self, name)[0:self.count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    # Adds a node under the parent node, a root if parent is None, and returns it.
+    def addNode(self, parent=None, translation=(0, 0, 0), rotation=None, scale=1):
+        if self.count == self.capacity:
+            self.allocate(2 * self.capacity)
+        index = self.count
+        self.count += 1
+        node = SceneNode(self, index)
+        self.nodes.append(node)
+
+        # A new node has no children, so it cannot be moved under itself.
+        self.parents[index] = -1 if parent is None else parent.index
+        self.rotations[index] = [1, 0, 0, 0]
+        self.localDirty[index] = True
+        self.worldDirty[index] = True
+        self.levelsValid = False
+        node.setTranslation(translation)
+        if rotation is not None:
+            node.setRotation(rotation)
+        node.setScale(scale)
+        return node
+
+    # Stores the value of a node in one of the local arrays and marks the node dirty if the
+    # value changed.
+    def setValue(self, array, index, value):
+        if not np.array_equal(array[index], value):
+            array[index] = value
+            self.localDirty[index] = True
+            self.worldDirty[index] = True
+
+    # Moves node index under node parent, -1 for a root.  The depths of the nodes are found
+    # again when the graph is next updated.
+    def setParent(self, index, parent):
+        node = parent
+        while node >= 0:
+            if node == index:
+                raise Exception("A scene node cannot be moved under itself.")
+            node = self.parents[node]
+        self.parents[index] = parent
+        self.worldDirty[index] = True
+        self.levelsValid = False
+
+    # Finds the depth of each node and the nodes at each depth.  Each step adds the distance
+    # from the ancestor of a node to the ancestor of that ancestor and jumps to it, so the
+    # depths of a tree of depth d are found in log2(d) steps.
+    def findLevels(self):
+        ancestors = self.parents[0:self.count].copy()
+        depths = (ancestors >= 0).astype(np.int32)
+        jumping = np.flatnonzero(ancestors >= 0)
+        while len(jumping) > 0:
+            above = ancestors[jumping]
+            depths[jumping] += depths[above]
+            ancestors[jumping] = ancestors[above]
+            jumping = jumping[ancestors[jumping] >= 0]
+        self.depths[0:self.count] = depths
+        order = np.argsort(depths, kind='stable')
+        bounds = np.searchsorted(depths[order], np.arange(depths.max(initial=0) + 2))
+        self.levels = [order[bounds[d]:bounds[d + 1]] for d in range(len(bounds) - 1)]
+        self.levelsValid = True
+
+    # Finds the (N, 4, 4) local matrices, stored by columns, of the nodes.
+    def findLocalMatrices(self, nodes):
+        w, x, y, z = self.rotations[nodes].T
+        scales = self.scales[nodes]
+        local = np.zeros((len(nodes), 4, 4), np.float32)
+        local[:, 0, 0:3] = np.stack([1 - 2 * (y * y + z * z), 2 * (x * y + w * z), 2 * (x * z - w * y)], axis=1)
+        local[:, 1, 0:3] = np.stack([2 * (x * y - w * z), 1 - 2 * (x * x + z * z), 2 * (y * z + w * x)], axis=1)
+        local[:, 2, 0:3] = np.stack([2 * (x * z + w * y), 2 * (y * z - w * x), 1 - 2 * (x * x + y * y)], axis=1)
+        local[:, 0:3, 0:3] *= scales[:, :, None]
+        local[:, 3, 0:3] = self.translations[nodes]
+        local[:, 3, 3] = 1
+        self.localMatrices[nodes] = local
+
+    # Finds the world and normal matrices of the dirty nodes and of the nodes under them and
+    # returns the numbers of the nodes whose world matrices changed.
+    def update(self):
+        count = self.count
+        if not self.worldDirty[0:count].any():
+            return np.zeros(0, np.int64)
+        if not self.levelsValid:
+            self.findLevels()
+
+        dirty = np.flatnonzero(self.localDirty[0:count])
+        if len(dirty) > 0:
+            self.findLocalMatrices(dirty)
+            self.localDirty[dirty] = False
+
+        # The levels above the highest dirty node are skipped, and the levels below the lowest
+        # dirty node once a level has no dirty nodes left.
+        depths = self.depths[np.flatnonzero(self.worldDirty[0:count])]
+        changed = []
+        for depth in range(int(depths.min()), len(self.levels)):
+            level = self.levels[depth]
+            if depth > 0:
+                self.worldDirty[level] |= self.worldDirty[self.parents[level]]
+            nodes = level[self.worldDirty[level]]
+            if len(nodes) == 0 and depth > depths.max():
+                break
+            if depth == 0:
+                self.worldMatrices[nodes] = self.localMatrices[nodes]
+            else:
+                # Stored by columns, parent * local is local @ parent.
+                self.worldMatrices[nodes] = self.localMatrices[nodes] @ self.worldMatrices[self.parents[nodes]]
+            changed.append(nodes)
+
+        changed = np.concatenate(changed)
+        self.normalMatrices[changed] = normalMatrices(self.worldMatrices[changed])
+        self.worldDirty[changed] = False
+        return changed
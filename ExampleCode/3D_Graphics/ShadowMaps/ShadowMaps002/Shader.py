@@ -3,22 +3,170 @@
 # Shader object that will load and compile vertex and fragment shaders
 # either from files or from strings.
 #
+# The programs are returned as ShaderProgram objects.  These are the program
+# address, so they can be used anywhere an address is expected, and also keep
+# the locations and types of all active uniforms, read once after linking, and
+# the last value set to each uniform through their setters.  Setting a uniform
+# to the value it already has does not call OpenGL at all.
+#
+# Linked programs are saved to a program binary cache in the ShaderCache
+# directory, when the driver supports program binaries.  The file name is a
+# hash of the vertex and fragment source, with any defines in it, and the GL
+# vendor, renderer and version strings, so a change to any of them compiles
+# the program again.  A binary the driver rejects, after a driver update for
+# example, is removed and the program is compiled from the source.  The
+# cacheStats dictionary counts the hits and misses and the time spent.
+#
+# Shader files are run through a small preprocessor.  A line
+#
+# #include "LightingBlocks.glsl"
+#
+# is replaced by the file, found relative to the including file, and each file
+# is included once per shader.  Defines given as a dictionary are added after the
+# #version line, True and False as true and false.  The loadShaderVariant function
+# builds a program for a set of defines once and returns the same program for
+# later calls, so the shaders can use defines in place of uniforms that are
+# constant for a draw and let the compiler remove the branches.
+#
+# A ShaderReloader watches the files of programs, with the files they include, and
+# builds a program again when one of them is edited.  A worker thread checks the
+# file times and reads and preprocesses the changed shaders, the program is then
+# compiled by the update function, which is called on the thread of the OpenGL
+# context between frames.  The new program is passed to a callback that replaces
+# the old one and loads the uniforms that are not set every frame, so the old
+# program draws until the new one is ready.  A program that does not compile is
+# reported and the old program is kept, so a typo does not stop the example.
+#
 # Don Spickler
 # 11/20/2021
 
 from OpenGL.GL import *
 from OpenGL.GL.shaders import *
+import glm
+import hashlib
+import numpy as np
+import os
+import queue
+import threading
+import time
+
+
+class ShaderProgram(int):
+    # Constructor, program is the address of a linked program.
+    def __new__(cls, program):
+        self = super().__new__(cls, program)
+        self.introspect()
+        return self
+
+    # Reads the active uniforms of the program and stores them by name as
+    # (location, type, size).  Arrays of basic types are stored by the name of each
+    # element and by the name without the index for the first one.
+    def introspect(self):
+        self.uniforms = {}
+        self.values = {}
+        self.uploads = 0
+        self.skipped = 0
+
+        for index in range(glGetProgramiv(self, GL_ACTIVE_UNIFORMS)):
+            name, size, type = glGetActiveUniform(self, index)
+            name = name.decode() if isinstance(name, bytes) else name
+            location = glGetUniformLocation(self, name)
+            if location < 0:
+                continue
+
+            self.uniforms[name] = (location, type, size)
+            if name.endswith("[0]"):
+                base = name[:-3]
+                self.uniforms[base] = (location, type, size)
+                for element in range(1, size):
+                    elementname = base + "[" + str(element) + "]"
+                    self.uniforms[elementname] = (glGetUniformLocation(self, elementname), type, 1)
+
+    # Returns the location of the uniform, -1 if the program does not have it.
+    def location(self, name):
+        uniform = self.uniforms.get(name)
+        if uniform is None:
+            return -1
+        return uniform[0]
+
+    # Forgets the last values, for when uniforms were set without the setters.
+    def invalidate(self):
+        self.values = {}
+
+    # Stores the value and returns True if it differs from the last value set to the
+    # location.  The program must be in use when the value is uploaded.
+    def changed(self, location, value):
+        if location < 0:
+            return False
+        if location in self.values and self.values[location] == value:
+            self.skipped += 1
+            return False
+        self.values[location] = value
+        self.uploads += 1
+        return True
+
+    def setInt(self, name, value):
+        location = self.location(name)
+        if self.changed(location, int(value)):
+            glUniform1i(location, int(value))
+
+    def setBool(self, name, value):
+        self.setInt(name, value)
+
+    def setFloat(self, name, value):
+        location = self.location(name)
+        if self.changed(location, float(value)):
+            glUniform1f(location, value)
+
+    def setVec3(self, name, value):
+        location = self.location(name)
+        if self.changed(location, glm.vec3(value)):
+            glUniform3fv(location, 1, glm.value_ptr(value))
+
+    def setVec4(self, name, value):
+        location = self.location(name)
+        if self.changed(location, glm.vec4(value)):
+            glUniform4fv(location, 1, glm.value_ptr(value))
+
+    def setMat3(self, name, value):
+        location = self.location(name)
+        if self.changed(location, glm.mat3(value)):
+            glUniformMatrix3fv(location, 1, GL_FALSE, glm.value_ptr(value))
+
+    def setMat4(self, name, value):
+        location = self.location(name)
+        if self.changed(location, glm.mat4(value)):
+            glUniformMatrix4fv(location, 1, GL_FALSE, glm.value_ptr(value))
+
 
 class Shader():
     lasterror = ""
 
+    # Directory of the program binary cache, None turns the cache off.  The statistics are
+    # shared by all Shader objects.
+    cacheDirectory = "ShaderCache"
+    cacheStats = {"hits": 0, "misses": 0, "rejected": 0, "loadTime": 0.0, "compileTime": 0.0}
+
+    # Programs made by loadShaderVariant, by vertex file, fragment file and defines.
+    variants = {}
+
     # Constructor
     def __init__(self):
         """No need to do anything here."""
 
     # Loads shaders as strings, compiles and links the program and returns
-    # the shader program address.
+    # the shader program address.  The program is loaded from the binary cache
+    # if it has been linked before.
     def loadShaders(self, vert, frag):
+        start = time.perf_counter()
+        key = self.cacheKey(vert, frag)
+        if key is not None:
+            shaderProgram = self.loadProgramBinary(key)
+            if shaderProgram is not None:
+                self.cacheStats["hits"] += 1
+                self.cacheStats["loadTime"] += time.perf_counter() - start
+                return ShaderProgram(shaderProgram)
+
         vertexShader = compileShader(vert, GL_VERTEX_SHADER)
         compileSuccess = glGetShaderiv(vertexShader, GL_COMPILE_STATUS)
         if not compileSuccess:
@@ -39,6 +187,8 @@ class Shader():
         shaderProgram = glCreateProgram()
         glAttachShader(shaderProgram, vertexShader)
         glAttachShader(shaderProgram, fragmentShader)
+        if key is not None:
+            glProgramParameteri(shaderProgram, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
         glLinkProgram(shaderProgram)
 
         linkSuccess = glGetProgramiv(shaderProgram, GL_LINK_STATUS)
@@ -47,12 +197,143 @@ class Shader():
             glDeleteProgram(shaderProgram)
             raise Exception(self.lasterror)
 
+        if key is not None:
+            self.saveProgramBinary(key, shaderProgram)
+        self.cacheStats["misses"] += 1
+        self.cacheStats["compileTime"] += time.perf_counter() - start
+
+        return ShaderProgram(shaderProgram)
+
+    # Returns the cache key of a program, None if the cache is off or the driver has no
+    # program binary formats.
+    def cacheKey(self, vert, frag):
+        if self.cacheDirectory is None or not bool(glGetProgramBinary):
+            return None
+        if glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS) == 0:
+            return None
+
+        key = hashlib.sha256()
+        for text in [glGetString(GL_VENDOR), glGetString(GL_RENDERER), glGetString(GL_VERSION), vert, frag]:
+            if isinstance(text, str):
+                text = text.encode()
+            key.update(text if text is not None else b'')
+            key.update(b'\0')
+        return key.hexdigest()
+
+    # Creates a program from the cached binary.  Returns None if there is no binary or the
+    # driver does not accept it, in which case the file is removed.  A file too short to
+    # hold the binary format and a binary, such as one cut off while it was written, is
+    # removed the same way.
+    def loadProgramBinary(self, key):
+        filename = os.path.join(self.cacheDirectory, key + ".bin")
+        try:
+            with open(filename, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        shaderProgram = None
+        linkSuccess = False
+        if len(data) > 4:
+            binaryFormat = int(np.frombuffer(data, '<u4', 1)[0])
+            shaderProgram = glCreateProgram()
+            try:
+                glProgramBinary(shaderProgram, binaryFormat, data[4:], len(data) - 4)
+                linkSuccess = glGetProgramiv(shaderProgram, GL_LINK_STATUS)
+            except GLError:
+                linkSuccess = False
+
+        if not linkSuccess:
+            if shaderProgram is not None:
+                glDeleteProgram(shaderProgram)
+            self.cacheStats["rejected"] += 1
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            return None
+
         return shaderProgram
 
+    # Saves the binary of a linked program to the cache, stored as the binary format followed
+    # by the binary.  The cache is only an optimization, so a failed save is ignored.
+    def saveProgramBinary(self, key, shaderProgram):
+        size = glGetProgramiv(shaderProgram, GL_PROGRAM_BINARY_LENGTH)
+        if size <= 0:
+            return
+
+        length = np.zeros(1, np.int32)
+        binaryFormat = np.zeros(1, np.uint32)
+        binary = np.zeros(size, np.uint8)
+        glGetProgramBinary(shaderProgram, size, length, binaryFormat, binary)
+
+        filename = os.path.join(self.cacheDirectory, key + ".bin")
+        tempname = filename + ".tmp"
+        try:
+            os.makedirs(self.cacheDirectory, exist_ok=True)
+            with open(tempname, 'wb') as file:
+                file.write(binaryFormat.astype('<u4').tobytes())
+                file.write(binary[0:length[0]].tobytes())
+            os.replace(tempname, filename)
+        except OSError:
+            pass
+
     # Loads shaders from files and calls the compiler method to compile and link the
     # program. Returns the shader program address.
     def loadShadersFromFile(self, vert, frag):
-        return self.loadShaders(open(vert, 'r').read(), open(frag, 'r').read())
+        return self.loadShaders(self.preprocessFile(vert), self.preprocessFile(frag))
+
+    # Returns the preprocessed source of a shader file with the defines added.  The files
+    # included by the shader are added to the included list.
+    def preprocessFile(self, filename, defines=None, included=None):
+        return self.preprocess(open(filename, 'r').read(), defines, os.path.dirname(filename), included)
+
+    # Resolves the includes of the source, relative to the path, and adds the defines after
+    # the #version line.  The #line directives keep the line numbers of compile errors the
+    # line numbers of the files, the source string number of an error is 0 for the shader
+    # file and n for the nth included file.  The included list has the files already included.
+    def preprocess(self, source, defines=None, path="", included=None, sourceNumber=0):
+        if included is None:
+            included = []
+
+        lines = []
+        for number, line in enumerate(source.split("\n"), 1):
+            stripped = line.strip()
+            if stripped.startswith("#include"):
+                filename = os.path.normpath(os.path.join(path, stripped[8:].strip().strip('"<>')))
+                if filename not in included:
+                    included.append(filename)
+                    try:
+                        text = open(filename, 'r').read()
+                    except OSError:
+                        raise Exception("Cannot open the included shader file " + filename)
+                    lines.append("#line 1 " + str(len(included)))
+                    lines.append(self.preprocess(text, None, os.path.dirname(filename), included, len(included)))
+                    lines.append("#line " + str(number + 1) + " " + str(sourceNumber))
+                else:
+                    lines.append("")
+            elif stripped.startswith("#version") and defines:
+                lines.append(line)
+                for name, value in defines.items():
+                    if isinstance(value, bool):
+                        value = "true" if value else "false"
+                    lines.append("#define " + name + " " + str(value))
+                lines.append("#line " + str(number + 1) + " " + str(sourceNumber))
+            else:
+                lines.append(line)
+
+        return "\n".join(lines)
+
+    # Loads the shader files with the defines and returns the program, the program is
+    # built the first time and the same program is returned for later calls.
+    def loadShaderVariant(self, vert, frag, defines=None):
+        if defines is None:
+            defines = {}
+        key = (vert, frag, tuple(sorted(defines.items())))
+        if key not in self.variants:
+            self.variants[key] = self.loadShaders(self.preprocessFile(vert, defines),
+                                                  self.preprocessFile(frag, defines))
+        return self.variants[key]
 
     # Gets last error in the compilation.
     def getLastError(self):
@@ -62,7 +343,138 @@ class Shader():
     def clearLastError(self):
         self.lasterror = ""
 
+    # Prints the program binary cache statistics.
+    def printCacheStats(self):
+        stats = self.cacheStats
+        print("Shader cache: %d hits (%.3f s), %d compiled (%.3f s), %d rejected binaries" %
+              (stats["hits"], stats["loadTime"], stats["misses"], stats["compileTime"], stats["rejected"]))
+
     # Prints out the last error list.
     def printLastError(self):
         for i in range(len(self.lasterror.args)):
             print(self.lasterror.args[i])
+
+
+class ShaderReloader():
+    # Constructor, interval is the time in seconds between checks of the files.
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.watched = []
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.reloads = 0
+        self.failures = 0
+
+    # Watches the shader files of the program, built with the defines.  When one of them or a
+    # file they include is edited the program is built again and passed to the callback, which
+    # must replace every use of the old program since the old program is deleted.
+    def watch(self, program, vert, frag, defines=None, callback=None):
+        entry = {"program": program, "vert": vert, "frag": frag, "defines": defines,
+                 "callback": callback, "files": [vert, frag]}
+        try:
+            entry["files"] = self.readSources(entry)[2]
+        except Exception:
+            pass
+        entry["times"] = self.modifiedTimes(entry["files"])
+
+        with self.lock:
+            self.watched.append(entry)
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    # Stops the worker thread.
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # Returns the modification times of the files, None for a file that does not exist, which
+    # happens for a moment while some editors save.
+    def modifiedTimes(self, files):
+        times = []
+        for filename in files:
+            try:
+                times.append(os.stat(filename).st_mtime_ns)
+            except OSError:
+                times.append(None)
+        return times
+
+    # Reads and preprocesses the shaders of an entry.  Returns the vertex and fragment source
+    # and the list of files used.
+    def readSources(self, entry):
+        shader = Shader()
+        included = []
+        vert = shader.preprocessFile(entry["vert"], entry["defines"], included)
+        frag = shader.preprocessFile(entry["frag"], entry["defines"], included)
+        return vert, frag, [entry["vert"], entry["frag"]] + included
+
+    # Worker thread, checks the files of the watched programs and queues the sources of the
+    # changed programs, or the error if they could not be read.  No OpenGL calls are made here.
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                entries = list(self.watched)
+
+            for entry in entries:
+                times = self.modifiedTimes(entry["files"])
+                if times == entry["times"]:
+                    continue
+
+                entry["times"] = times
+                try:
+                    vert, frag, files = self.readSources(entry)
+                except Exception as err:
+                    self.pending.put((entry, None, None, err))
+                    continue
+
+                if files != entry["files"]:
+                    entry["files"] = files
+                    entry["times"] = self.modifiedTimes(files)
+                self.pending.put((entry, vert, frag, None))
+
+    # Compiles the programs of the changed shaders, called on the thread of the OpenGL
+    # context between frames.  Each new program is passed to its callback and the old program
+    # deleted.  If the program does not compile the error is printed and the old program is
+    # kept.  Returns the number of programs that were replaced.
+    def update(self):
+        replaced = 0
+        while True:
+            try:
+                entry, vert, frag, error = self.pending.get_nowait()
+            except queue.Empty:
+                break
+
+            if error is None:
+                start = time.perf_counter()
+                try:
+                    program = Shader().loadShaders(vert, frag)
+                except Exception as err:
+                    error = err
+
+            if error is not None:
+                self.failures += 1
+                print("Reloading " + entry["vert"] + " and " + entry["frag"] + " failed, keeping the last program.")
+                if len(error.args) > 0:
+                    print(error.args[0])
+                continue
+
+            old = entry["program"]
+            entry["program"] = program
+            for key, value in Shader.variants.items():
+                if value == old:
+                    Shader.variants[key] = program
+
+            if entry["callback"] is not None:
+                entry["callback"](program)
+            glDeleteProgram(old)
+
+            self.reloads += 1
+            replaced += 1
+            print("Reloaded " + entry["vert"] + " and " + entry["frag"] +
+                  " in %.3f s." % (time.perf_counter() - start))
+
+        return replaced
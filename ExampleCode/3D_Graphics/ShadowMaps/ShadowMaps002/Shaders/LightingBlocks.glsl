@@ -0,0 +1,41 @@
+/**
+Light and material structs and the uniform blocks that hold them, included by
+the lighting fragment shaders.  The blocks use the std140 layout that the
+LightBuffer and MaterialBuffer objects write.
+
+[uniform] Lt --- Array of Light structs in the LightBlock uniform buffer.
+[uniform] Mat --- Material struct in the MaterialBlock uniform buffer.
+
+*/
+
+struct Light
+{
+    bool on;///< Light on or off.
+    vec4 position;///< Position of the light.
+    vec3 spotDirection;///< Direction of the spot light.
+    vec4 ambient;///< Ambient color of the light.
+    vec4 diffuse;///< Diffuse color of the light.
+    vec4 specular;///< Specular color of the light.
+    float spotCutoff;///< Spot cutoff angle.
+    float spotExponent;///< Spot falloff exponent.
+    vec3 attenuation;///< Attenuation vector, x = constant, y = linear, z = quadratic.
+};
+
+struct Material
+{
+    vec4 ambient;///< Ambient color of the material.
+    vec4 diffuse;///< Diffuse color of the material.
+    vec4 specular;///< Specular color of the material.
+    vec4 emission;///< Emission color of the material.
+    float shininess;///< Shininess exponent of the material.
+};
+
+layout(std140) uniform LightBlock
+{
+    Light Lt[10];
+};
+
+layout(std140) uniform MaterialBlock
+{
+    Material Mat;
+};
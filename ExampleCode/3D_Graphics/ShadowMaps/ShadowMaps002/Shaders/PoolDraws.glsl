@@ -0,0 +1,27 @@
+/**
+Per draw data of the meshes drawn from the MeshPool with glMultiDrawElementsIndirect.
+With POOLED defined the Model and NormalMatrix of a draw are read from the DrawBlock
+storage buffer at the number of the draw, given by the drawIndex attribute, see the
+MeshPool object.  Include it before the other declarations of the shader, it turns on
+the storage buffer extension.
+*/
+
+#ifdef POOLED
+#extension GL_ARB_shader_storage_buffer_object : require
+
+struct DrawData
+{
+    mat4 model;
+    mat3 normal;
+};
+
+layout(std430) buffer DrawBlock
+{
+    DrawData draws[];
+};
+
+layout(location = 12) in int drawIndex;
+
+#define Model draws[drawIndex].model
+#define NormalMatrix draws[drawIndex].normal
+#endif
@@ -1,9 +1,13 @@
 #version 330 core
 
+#include "PoolDraws.glsl"
+
 layout (location = 0) in vec4 pos;
 
 uniform mat4 PV;
+#ifndef POOLED
 uniform mat4 Model;
+#endif
 
 void main()
 {
@@ -19,24 +19,32 @@ to the fragment shader.
 [uniform] Model --- mat4 model transformation matrix.
 [uniform] NormalMatrix --- mat3 normal transformation matrix.
 
+With INSTANCED defined the Model and NormalMatrix of each instance are read
+from the instance attributes, see the InstanceBuffer object.  With POOLED defined
+they are read from the storage buffer of the MeshPool, see PoolDraws.glsl.
+
 */
 
+#include "PoolDraws.glsl"
+
 layout(location = 0) in vec4 vposition;
 layout(location = 1) in vec4 vcolor;
 layout(location = 2) in vec3 vnormal;
 layout(location = 3) in vec2 in_tex_coord;
 
 uniform mat4 PV = mat4(1);
+#ifdef INSTANCED
+layout(location = 4) in mat4 Model;
+layout(location = 8) in mat3 NormalMatrix;
+#elif !defined(POOLED)
 uniform mat4 Model = mat4(1);
 uniform mat3 NormalMatrix = mat3(1);
-
-uniform mat4 lightSpaceMatrix = mat4(1);
+#endif
 
 out vec4 color;
 out vec4 position;
 out vec3 normal;
 out vec2 tex_coord;
-out vec4 FragPosLightSpace;
 
 void main()
 {
@@ -44,6 +52,5 @@ void main()
     color = vcolor;
     normal = normalize(NormalMatrix * vnormal);
     position = Model * vposition;
-    FragPosLightSpace = lightSpaceMatrix * position;
     gl_Position = PV * position;
 }
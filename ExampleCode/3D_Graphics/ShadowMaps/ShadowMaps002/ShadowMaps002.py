@@ -10,6 +10,7 @@
 # - C: Toggles between the two cameras.
 # - O: Toggles between outline and fill mode for the box and cube objects.
 # - L: Toggles the drawing of the axes.
+# - M: Toggles between cascaded shadow maps and one shadow map for the whole room.
 # - 1-9: Selection of what object to draw.
 # - F1: Draws in fill mode.
 # - F2: Draws in line mode.
@@ -85,6 +86,10 @@
 # If the wheel is moved then the camera will be moved foward and backward by
 # the amount of the wheel movement.
 #
+# For either camera, a click of the right mouse button picks the object under the
+# mouse and prints the object, the triangle and the barycentric coordinates of the
+# point in the triangle.
+#
 # Don Spickler
 # 1/6/2022
 
@@ -174,7 +179,10 @@ if __name__ == '__main__':
                     fps = frames / (now - starttime)
                 except Exception as err:
                     fps = 0
-                pygame.display.set_caption(ProgramName + "    FPS: " + str("%.2f" % fps))
+                pygame.display.set_caption(ProgramName + "    FPS: " + str("%.2f" % fps) +
+                                           "    Draws: " + str(ge.renderQueue.frameStats["draws"]) +
+                                           "    State changes: " + str(ge.renderQueue.stateChanges()) +
+                                           "    Culled: " + str(ge.culled))
                 frames = 0
                 starttime = now
             # Process all other events in the UI object.
@@ -0,0 +1,71 @@
+#! /usr/bin/env python3
+#
+# Baked texture benchmark.
+#
+# Compares loading the startup textures of this example from their PNG, JPEG and
+# BMP files with loading them from KTX files made by the TextureBaker, uncompressed
+# and block compressed.  The load time is the CPU time to get the data ready for
+# the upload, decoding the image for the original files and reading the file for
+# the KTX files.  The time of glGenerateMipmap, which the original files also need
+# at startup, is not included since it runs on the graphics card.  The memory is
+# the size of the texture with its mipmaps on the card, RGBA8 for the original
+# files and the size of the levels for the KTX files.
+#
+# The images are copied to a temporary directory and baked there.
+#
+# Usage: python3 TextureBakeBenchmark.py [image files]
+
+import sys
+import os
+import shutil
+import tempfile
+import time
+from TextureBaker import *
+from TextureManager import *
+
+
+# Returns the best time of repeats runs of function and its last result.
+def timeRun(function, repeats=3):
+    best = float("inf")
+    for r in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == '__main__':
+    filenames = sys.argv[1:] if len(sys.argv) > 1 else ["Images/cat003.png", "Images/metal024.bmp",
+                                                        "Images/oakH.jpg", "Images/amazaque.bmp",
+                                                        "Images/stucco001.jpg", "Images/knotted.jpg",
+                                                        "Images/ash.jpg"]
+    formats = ["rgba", "bc"]
+
+    print("%-16s %10s %-9s %-9s %-9s %11s %11s %11s" % ("Image", "Size", "Image(s)", "rgba(s)", "bc(s)",
+                                                         "Image(MB)", "rgba(MB)", "bc(MB)"))
+    totals = np.zeros(6)
+    with tempfile.TemporaryDirectory() as tempdir:
+        for filename in filenames:
+            imagename = os.path.join(tempdir, os.path.basename(filename))
+            shutil.copyfile(filename, imagename)
+
+            imagetime, image = timeRun(lambda: textureManager.decodeImage(imagename))
+            imagememory = len(image[2]) * 4 // 3
+
+            times = []
+            memory = []
+            for format in formats:
+                bakeImage(imagename, format)
+                ktxtime, ktx = timeRun(lambda: KTXFile(bakedFileName(imagename)))
+                times.append(ktxtime)
+                memory.append(ktx.dataSize())
+                os.remove(bakedFileName(imagename))
+
+            row = [imagetime] + times + [imagememory] + memory
+            totals += row
+            print("%-16s %10s %9.4f %9.4f %9.4f %11.2f %11.2f %11.2f" %
+                  ((os.path.basename(filename), "%dx%d" % image[0:2]) + tuple(row[0:3]) +
+                   tuple(m / (1 << 20) for m in row[3:6])))
+
+    print("%-16s %10s %9.4f %9.4f %9.4f %11.2f %11.2f %11.2f" %
+          (("Total", "") + tuple(totals[0:3]) + tuple(totals[3:6] / (1 << 20))))
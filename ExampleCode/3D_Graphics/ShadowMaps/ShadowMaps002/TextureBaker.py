@@ -0,0 +1,204 @@
+#! /usr/bin/env python3
+#
+# Offline texture baker.
+#
+# Converts images to KTX files with the full mipmap chain so that the examples can
+# load them without decoding the image or generating mipmaps at startup, see the
+# KTXFile object.  The baked file is written next to the image and is used in its
+# place as long as it is newer than the image.
+#
+# The texels can be stored as uncompressed RGBA or block compressed with BC1 (DXT1,
+# RGB at 4 bits per texel) or BC3 (DXT5, RGBA at 8 bits per texel).  The "bc" format
+# picks BC3 for images with transparent pixels and BC1 for the others.  The block
+# compression is a simple, vectorized encoder, the two endpoints of each 4x4 block
+# are the ends of the principal axis of its colors and each texel gets the nearest
+# of the block colors.  It is fast but not of the quality of dedicated encoders.
+#
+# Images are baked as 2D textures unless a cube map layout is given, "cross" cuts
+# the six faces out of a skybox cross image and "one" puts the image on all six
+# faces.  These match the generateCubemapFromSkybox and generateCubemapFromOneImage
+# functions of the graphics engine.
+#
+# Usage: python3 TextureBaker.py [-f rgba|bc1|bc3|bc] [-c cross|one] [files or directories]
+#
+# Without files the Images and SkyboxImages directories are baked, the skybox images
+# with the cross layout.
+#
+# Examples:
+#   python3 TextureBaker.py -f bc Images
+#   python3 TextureBaker.py -c one SkyboxImages/Starfield.jpg
+
+import sys
+import os
+import time
+import numpy as np
+from PIL import Image
+from KTXFile import *
+
+
+# Splits an (h, w, channels) image into 4x4 blocks, padding the edges by repeating the
+# last row and column.  Returns an (n, 16, channels) array with the blocks in row order.
+def imageBlocks(pixels):
+    height, width, channels = pixels.shape
+    pixels = np.pad(pixels, ((0, -height % 4), (0, -width % 4), (0, 0)), mode='edge')
+    rows, cols = pixels.shape[0] // 4, pixels.shape[1] // 4
+    return pixels.reshape(rows, 4, cols, 4, channels).transpose(0, 2, 1, 3, 4).reshape(-1, 16, channels)
+
+
+# Encodes (n, 16, 3) blocks of RGB colors as BC1 color blocks, returns an (n, 8) uint8 array.
+def encodeColorBlocks(blocks):
+    colors = blocks.astype(np.float64)
+    mean = colors.mean(axis=1)
+    centered = colors - mean[:, None, :]
+
+    # Principal axis of each block by a few steps of power iteration.
+    covariance = np.einsum('nki,nkj->nij', centered, centered)
+    axis = np.ones_like(mean)
+    for i in range(8):
+        axis = np.einsum('nij,nj->ni', covariance, axis)
+        length = np.linalg.norm(axis, axis=1, keepdims=True)
+        axis = np.where(length > 1e-12, axis / np.maximum(length, 1e-12), 0.57735)
+
+    t = np.einsum('nki,ni->nk', centered, axis)
+    ends = np.stack([mean + axis * t.max(axis=1)[:, None], mean + axis * t.min(axis=1)[:, None]], axis=1)
+    ends = np.clip(ends, 0, 255)
+
+    # Quantize to RGB 565 and order the endpoints so that c0 > c1, the four color mode.
+    r = np.round(ends[:, :, 0] * 31 / 255).astype(np.uint32)
+    g = np.round(ends[:, :, 1] * 63 / 255).astype(np.uint32)
+    b = np.round(ends[:, :, 2] * 31 / 255).astype(np.uint32)
+    packed = (r << 11) | (g << 5) | b
+    swap = packed[:, 0] < packed[:, 1]
+    packed[swap] = packed[swap][:, ::-1]
+    r, g, b = packed >> 11, (packed >> 5) & 63, packed & 31
+
+    # The colors the decoder will use, the endpoints and the two points between them.
+    endcolors = np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=-1).astype(np.float64)
+    c0, c1 = endcolors[:, 0], endcolors[:, 1]
+    palette = np.stack([c0, c1, (2 * c0 + c1) / 3, (c0 + 2 * c1) / 3], axis=1)
+
+    distances = ((colors[:, :, None, :] - palette[:, None, :, :]) ** 2).sum(axis=-1)
+    indices = np.argmin(distances, axis=2).astype(np.uint32)
+    indices[packed[:, 0] == packed[:, 1]] = 0
+    bits = (indices << (2 * np.arange(16, dtype=np.uint32))).sum(axis=1, dtype=np.uint32)
+
+    output = np.empty((len(blocks), 2), '<u4')
+    output[:, 0] = packed[:, 0] | (packed[:, 1] << 16)
+    output[:, 1] = bits
+    return output.view(np.uint8).reshape(-1, 8)
+
+
+# Encodes (n, 16) blocks of alpha values as BC3 alpha blocks, returns an (n, 8) uint8 array.
+def encodeAlphaBlocks(blocks):
+    alpha = blocks.astype(np.int64)
+    a0 = alpha.max(axis=1)
+    a1 = alpha.min(axis=1)
+
+    # Eight value mode, a0 > a1, with six values between the endpoints.
+    k = np.arange(1, 7)
+    palette = np.concatenate([a0[:, None], a1[:, None],
+                              ((7 - k) * a0[:, None] + k * a1[:, None]) // 7], axis=1)
+    indices = np.argmin(np.abs(alpha[:, :, None] - palette[:, None, :]), axis=2).astype(np.uint64)
+    indices[a0 == a1] = 0
+    bits = (indices << (3 * np.arange(16, dtype=np.uint64))).sum(axis=1, dtype=np.uint64)
+
+    output = np.empty((len(blocks), 8), np.uint8)
+    output[:, 0] = a0
+    output[:, 1] = a1
+    output[:, 2:] = bits.astype('<u8').view(np.uint8).reshape(-1, 8)[:, 0:6]
+    return output
+
+
+# Encodes an RGBA image, a PIL image, in the given format.  Returns a uint8 array.
+def encodeImage(image, format):
+    pixels = np.asarray(image)
+    if format == "rgba":
+        return np.ascontiguousarray(pixels).ravel()
+
+    blocks = imageBlocks(pixels)
+    colorblocks = encodeColorBlocks(blocks[:, :, 0:3])
+    if format == "bc1":
+        return colorblocks.ravel()
+    return np.concatenate([encodeAlphaBlocks(blocks[:, :, 3]), colorblocks], axis=1).ravel()
+
+
+# Returns the list of mipmap images, from the image down to 1x1, made with a box filter.
+def mipmapChain(image):
+    chain = [image]
+    while image.width > 1 or image.height > 1:
+        image = image.resize((max(1, image.width // 2), max(1, image.height // 2)), Image.BOX)
+        chain.append(image)
+    return chain
+
+
+# Returns the faces of an image for the layout, the six cube map faces for "cross" and
+# "one", in +X, -X, +Y, -Y, +Z, -Z order, or the flipped image for a 2D texture.
+def imageFaces(image, layout):
+    if layout is None:
+        return [image.transpose(Image.FLIP_TOP_BOTTOM)]
+    if layout == "one":
+        return [image] * 6
+
+    imgw = image.width // 4
+    imgh = image.height // 3
+    return [image.crop((2 * imgw, imgh, 3 * imgw, 2 * imgh)),
+            image.crop((0, imgh, imgw, 2 * imgh)),
+            image.crop((imgw, 0, 2 * imgw, imgh)),
+            image.crop((imgw, 2 * imgh, 2 * imgw, 3 * imgh)),
+            image.crop((imgw, imgh, 2 * imgw, 2 * imgh)),
+            image.crop((3 * imgw, imgh, 4 * imgw, 2 * imgh))]
+
+
+# Bakes an image to its KTX file and returns the KTXFile object.
+def bakeImage(filename, format="rgba", layout=None):
+    image = Image.open(filename).convert('RGBA')
+    if format == "bc":
+        format = "bc3" if np.asarray(image)[:, :, 3].min() < 255 else "bc1"
+
+    faces = [mipmapChain(face) for face in imageFaces(image, layout)]
+
+    ktx = KTXFile()
+    ktx.setFormat(format)
+    ktx.width = faces[0][0].width
+    ktx.height = faces[0][0].height
+    ktx.numfaces = len(faces)
+    ktx.keyValues["KTXorientation"] = "S=r,T=d" if layout else "S=r,T=u"
+    ktx.levels = [[encodeImage(chain[level], format) for chain in faces] for level in range(len(faces[0]))]
+    ktx.write(bakedFileName(filename, layout))
+
+    return ktx
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    format = "rgba"
+    layout = None
+    if "-f" in args:
+        format = args.pop(args.index("-f") + 1)
+        args.remove("-f")
+    if "-c" in args:
+        layout = args.pop(args.index("-c") + 1)
+        args.remove("-c")
+
+    if len(args) == 0:
+        args = [name for name in ["Images", "SkyboxImages"] if os.path.isdir(name)]
+
+    extensions = (".png", ".jpg", ".jpeg", ".bmp", ".tga")
+    for name in args:
+        if os.path.isdir(name):
+            filenames = [os.path.join(name, filename) for filename in sorted(os.listdir(name))
+                         if os.path.splitext(filename)[1].lower() in extensions]
+            dirlayout = layout if layout is not None or os.path.basename(os.path.normpath(name)) != "SkyboxImages" \
+                else "cross"
+        else:
+            filenames = [name]
+            dirlayout = layout
+
+        for filename in filenames:
+            start = time.perf_counter()
+            ktx = bakeImage(filename, format, dirlayout)
+            print("%-40s %10s %-5s %2d levels %9.1f KB -> %9.1f KB %7.3f s" %
+                  (bakedFileName(filename, dirlayout), "%dx%d" % (ktx.width, ktx.height),
+                   [key for key, value in KTXFile.formats.items() if value[2] == ktx.glInternalFormat][0],
+                   len(ktx.levels), os.path.getsize(filename) / 1024,
+                   os.path.getsize(bakedFileName(filename, dirlayout)) / 1024, time.perf_counter() - start))
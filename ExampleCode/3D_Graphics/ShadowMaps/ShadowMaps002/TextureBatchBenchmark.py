@@ -0,0 +1,54 @@
+#! /usr/bin/env python3
+#
+# Texture batch decoding benchmark.
+#
+# Times the decoding part of texture loading, done one image at a time as the
+# loadTexture calls do and done on a thread pool as acquireAll does.  The image
+# sets are the seven startup textures of this example and the images of the
+# directories given on the command line, such as the texture maps of a model in
+# the OBJ viewer Models directory.  The uploads are not included, they are done on
+# the context thread in both cases.
+#
+# Usage: python3 TextureBatchBenchmark.py [workers] [image directory ...]
+
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from TextureManager import *
+
+
+def timeSerial(filenames):
+    start = time.perf_counter()
+    for filename in filenames:
+        textureManager.decodeImage(filename)
+    return time.perf_counter() - start
+
+
+def timePool(filenames, workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(textureManager.decodeImage, filenames))
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1] != "0" else None
+    directories = sys.argv[2:] if len(sys.argv) > 2 else ["../../OBJModelViewers/Models/Defiant"]
+
+    imagesets = [("ShadowMaps002 startup", ["Images/cat003.png", "Images/metal024.bmp", "Images/oakH.jpg",
+                                            "Images/amazaque.bmp", "Images/stucco001.jpg",
+                                            "Images/knotted.jpg", "Images/ash.jpg"])]
+    for directory in directories:
+        filenames = [os.path.join(directory, filename) for filename in sorted(os.listdir(directory))
+                     if os.path.splitext(filename)[1].lower() in (".png", ".jpg", ".jpeg", ".bmp", ".tga")]
+        imagesets.append((directory, filenames))
+
+    print("CPUs:", os.cpu_count(), " Workers:", workers if workers else "default")
+    print("%-40s %6s %10s %10s %8s" % ("Images", "Count", "Serial(s)", "Pool(s)", "Saved(s)"))
+    for name, filenames in imagesets:
+        # Warm up the file cache so both runs read from memory.
+        timeSerial(filenames)
+        serial = timeSerial(filenames)
+        pooled = timePool(filenames, workers)
+        print("%-40s %6d %10.4f %10.4f %8.4f" % (name[-40:], len(filenames), serial, pooled, serial - pooled))
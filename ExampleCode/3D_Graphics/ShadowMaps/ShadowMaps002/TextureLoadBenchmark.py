@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+#
+# Texture loading benchmark.
+#
+# Compares the time to get the pixel data of an image ready for glTexImage2D with
+# the old loader, which builds a Python list of pixel tuples with getdata, and with
+# the new one, which has PIL copy the flipped rows straight to a bytes object.  The
+# time to open, decode and convert the image to RGBA is the same for both and is
+# reported separately.  The old loader is only run on images up to maxpixels pixels
+# since it takes several seconds per megapixel.  A generated size by size image is
+# added to the images in the directory.
+#
+# The old loader converts to np.uint8 here, the np.int8 used in the examples raises
+# an OverflowError with current versions of NumPy.
+#
+# Usage: python3 TextureLoadBenchmark.py [image directory] [size] [maxpixels]
+
+import sys
+import os
+import time
+import numpy as np
+from PIL import Image
+
+
+def oldLoader(teximg):
+    teximg = teximg.transpose(Image.FLIP_TOP_BOTTOM)
+    return np.array(list(teximg.getdata()), np.uint8)
+
+
+def newLoader(teximg):
+    return teximg.tobytes("raw", "RGBA", 0, -1)
+
+
+# Returns the best time of repeats runs of function and its last result.
+def timeRun(function, repeats=3):
+    best = float("inf")
+    for r in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == '__main__':
+    imagedir = sys.argv[1] if len(sys.argv) > 1 else "Images"
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+    maxpixels = int(sys.argv[3]) if len(sys.argv) > 3 else 2 * (1 << 20)
+
+    images = []
+    for filename in sorted(os.listdir(imagedir)):
+        path = os.path.join(imagedir, filename)
+        decode, teximg = timeRun(lambda: Image.open(path).convert('RGBA'))
+        images.append((filename, teximg, decode))
+
+    pixels = np.random.default_rng(0).integers(0, 256, (size, size, 4), np.uint8)
+    images.append(("generated %dx%d" % (size, size), Image.fromarray(pixels, 'RGBA'), 0))
+
+    print("%-24s %11s %10s %10s %10s %8s" % ("Image", "Size", "Decode(s)", "Old(s)", "New(s)", "Speedup"))
+    totalold = 0
+    totalnew = 0
+    for name, teximg, decode in images:
+        new, newdata = timeRun(lambda: newLoader(teximg))
+        if teximg.width * teximg.height <= maxpixels:
+            old, olddata = timeRun(lambda: oldLoader(teximg), 1)
+            if olddata.tobytes() != newdata:
+                print(name, "pixel data differs")
+            totalold += old
+            totalnew += new
+            oldtext = "%10.4f" % old
+            speeduptext = "%7.0fx" % (old / new)
+        else:
+            oldtext = "%10s" % "-"
+            speeduptext = "%8s" % "-"
+
+        print("%-24s %11s %10.4f %s %10.4f %s" % (name, "%dx%d" % teximg.size, decode, oldtext, new, speeduptext))
+
+    if totalnew > 0:
+        print("Total for the images run with both loaders: old %.3f s, new %.4f s" % (totalold, totalnew))
@@ -0,0 +1,207 @@
+#! /usr/bin/env python3
+#
+# Texture manager object
+#
+# Shares texture objects between everything that loads textures in the program.
+# A texture is identified by the resolved path of its image file and its sampler
+# parameters (wrap mode and filters), so loading the same image again returns the
+# texture ID that is already on the graphics card instead of decoding and
+# uploading the image a second time.
+#
+# Each texture has a reference count, acquire adds a reference and release removes
+# one.  A texture with no references is not deleted right away, it is kept in a
+# least recently used list in case it is needed again.  Unused textures are only
+# deleted, oldest first, when the estimated memory of all textures is over the
+# budget.  Textures that are in use are never deleted by the manager, so the
+# budget can be exceeded if all textures are in use.
+#
+# If the image has an up to date KTX file made by the TextureBaker, the texture is
+# loaded from it instead, with its mipmaps and possibly block compressed, without
+# decoding the image.
+#
+# Several textures can be loaded at once with acquireAll.  The images are decoded
+# on a pool of worker threads, PIL releases the interpreter lock while it decodes,
+# and the uploads are done on the calling thread as the images become ready, since
+# the OpenGL context can only be used from that thread.
+#
+# The module creates one manager, textureManager, that is shared by the whole
+# program.  All of the calls need a current OpenGL context.
+
+from OpenGL.GL import *
+import numpy as np
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from KTXFile import *
+
+
+class TextureManager():
+    # Constructor, budget is the texture memory budget in bytes.
+    def __init__(self, budget=512 * (1 << 20)):
+        self.budget = budget
+
+        # Texture records by key, each is [texture ID, reference count, size in bytes].
+        self.textures = {}
+        self.keys = {}
+        self.unused = OrderedDict()
+        self.memory = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Returns the key of an image file and sampler parameters.
+    def textureKey(self, filename, wrap, magfilter, minfilter):
+        return (os.path.realpath(filename), wrap, magfilter, minfilter)
+
+    # Returns the texture ID for the image file with the given sampler parameters and adds
+    # a reference to it.  The image is only loaded if it is not already on the card.
+    def acquire(self, filename, wrap=GL_REPEAT, magfilter=GL_LINEAR, minfilter=GL_LINEAR_MIPMAP_LINEAR):
+        key = self.textureKey(filename, wrap, magfilter, minfilter)
+        record = self.textures.get(key)
+        if record is not None:
+            self.hits += 1
+            record[1] += 1
+            self.unused.pop(key, None)
+            return record[0]
+
+        self.misses += 1
+        texID = self.addTexture(key, self.decodeImage(filename), wrap, magfilter, minfilter)
+        self.textures[key][1] = 1
+        self.trim()
+
+        return texID
+
+    # Returns the texture IDs for a list of image files, as acquire does for each file.
+    # The images that are not on the card yet are decoded in parallel on workers threads,
+    # or the ThreadPoolExecutor default if workers is None.  If an image cannot be decoded
+    # the exception is raised again, the textures already uploaded for the list are put in
+    # the unused list so that they can be deleted.
+    def acquireAll(self, filenames, wrap=GL_REPEAT, magfilter=GL_LINEAR, minfilter=GL_LINEAR_MIPMAP_LINEAR,
+                   workers=None):
+        keys = [self.textureKey(filename, wrap, magfilter, minfilter) for filename in filenames]
+        missing = {}
+        for filename, key in zip(filenames, keys):
+            if key not in self.textures and key not in missing:
+                missing[key] = filename
+
+        if len(missing) > 0:
+            added = []
+            try:
+                with ThreadPoolExecutor(workers) as pool:
+                    for key, image in zip(missing, pool.map(self.decodeImage, missing.values())):
+                        self.addTexture(key, image, wrap, magfilter, minfilter)
+                        added.append(key)
+            except Exception:
+                for key in added:
+                    self.unused[key] = None
+                self.trim()
+                raise
+
+        texIDs = []
+        for key in keys:
+            record = self.textures[key]
+            if key in missing:
+                self.misses += 1
+                del missing[key]
+            else:
+                self.hits += 1
+            record[1] += 1
+            self.unused.pop(key, None)
+            texIDs.append(record[0])
+
+        self.trim()
+        return texIDs
+
+    # Removes a reference from the texture.  Textures without references are kept until
+    # their memory is needed.
+    def release(self, texID):
+        key = self.keys.get(texID)
+        if key is None:
+            return
+
+        record = self.textures[key]
+        record[1] -= 1
+        if record[1] <= 0:
+            record[1] = 0
+            self.unused[key] = None
+            self.trim()
+
+    # Deletes the least recently released textures until the memory is within the budget.
+    def trim(self, budget=None):
+        if budget is None:
+            budget = self.budget
+
+        while self.memory > budget and len(self.unused) > 0:
+            key, _ = self.unused.popitem(last=False)
+            texID, count, size = self.textures.pop(key)
+            del self.keys[texID]
+            glDeleteTextures(np.array([texID]))
+            self.memory -= size
+            self.evictions += 1
+
+    # Deletes all textures, in use or not.
+    def clear(self):
+        for texID in self.keys:
+            glDeleteTextures(np.array([texID]))
+
+        self.textures = {}
+        self.keys = {}
+        self.unused = OrderedDict()
+        self.memory = 0
+
+    # Decodes the image file and returns its width, height and RGBA pixel data, or the
+    # KTXFile object of its baked file if there is one.  This does not use OpenGL and can
+    # be run on any thread.
+    def decodeImage(self, filename):
+        bakedname = findBakedFile(filename)
+        if bakedname is not None:
+            return KTXFile(bakedname)
+
+        # The rows are flipped while the pixels are copied out, OpenGL expects the bottom row first.
+        teximg = Image.open(filename).convert('RGBA')
+        return teximg.width, teximg.height, teximg.tobytes("raw", "RGBA", 0, -1)
+
+    # Uploads a decoded image to a new texture and adds its record, without references.
+    def addTexture(self, key, image, wrap, magfilter, minfilter):
+        texID, size = self.createTexture(image, wrap, magfilter, minfilter)
+        self.textures[key] = [texID, 0, size]
+        self.keys[texID] = key
+        self.memory += size
+        return texID
+
+    # Loads a decoded image to a new texture and returns the texture ID and the estimated
+    # memory size, the RGBA image and its mipmaps.
+    def createTexture(self, image, wrap, magfilter, minfilter):
+        if isinstance(image, KTXFile):
+            return image.load(wrap, magfilter, minfilter)
+
+        width, height, img_data = image
+
+        texID = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, texID)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
+
+        size = len(img_data)
+        if minfilter in (GL_NEAREST_MIPMAP_NEAREST, GL_LINEAR_MIPMAP_NEAREST,
+                         GL_NEAREST_MIPMAP_LINEAR, GL_LINEAR_MIPMAP_LINEAR):
+            glGenerateMipmap(GL_TEXTURE_2D)
+            size = size * 4 // 3
+
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, magfilter)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, minfilter)
+
+        return texID, size
+
+    # Prints the cache statistics.
+    def printStats(self):
+        print("Textures:", len(self.textures), " In use:", len(self.textures) - len(self.unused),
+              " Memory: %.1f / %.1f MB" % (self.memory / (1 << 20), self.budget / (1 << 20)))
+        print("Hits:", self.hits, " Misses:", self.misses, " Evictions:", self.evictions)
+
+
+textureManager = TextureManager()
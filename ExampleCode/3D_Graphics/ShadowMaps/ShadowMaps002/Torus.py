@@ -12,6 +12,7 @@ from OpenGL.GL import *
 import ctypes
 import numpy as np
 import glm
+from Bounds import *
 
 
 class Torus():
@@ -56,75 +57,65 @@ class Torus():
         vNormal = 2
         vTex = 3
 
-        vertices = []
-        normals = []
-        tex = []
-
         r = (self.outr - self.inr) / 2
         rax = r + self.inr
 
-        # Load data into lists.
-        for i in range(self.lon + 1):
-            for j in range(self.lat + 1):
-                theta = self.bt + (self.et - self.bt) * (i / self.lon)
-                psi = self.ep - (self.bp + (self.ep - self.bp) * (j / self.lat))
-
-                # Calculate vertex positions.
-                x = (rax - r * glm.cos(psi)) * glm.cos(theta)
-                y = (rax - r * glm.cos(psi)) * glm.sin(theta)
-                z = r * glm.sin(psi)
-
-                # Calculate vertex normls.
-                nx = -r * glm.cos(psi) * glm.cos(theta)
-                ny = -r * glm.cos(psi) * glm.sin(theta)
-                nz = r * glm.sin(psi)
-                mod = glm.sqrt(nx * nx + ny * ny + nz * nz)
-
-                vertices.extend([x, y, z])
-                normals.extend([nx / mod, ny / mod, nz / mod])
-                tex.extend([i / self.lon, j / self.lat])
-
-        # Setup indexing array for triangles.
-        indices = []
-        for i in range(self.lon):
-            for j in range(self.lat):
-                indices.append(i * (self.lat + 1) + j)
-                indices.append((i + 1) * (self.lat + 1) + j)
-                indices.append((i + 1) * (self.lat + 1) + j + 1)
-                indices.append(i * (self.lat + 1) + j)
-                indices.append((i + 1) * (self.lat + 1) + j + 1)
-                indices.append(i * (self.lat + 1) + j + 1)
-
-        # Convert data to GLSL form and get machine sizes of data types.
-        indexdata = np.array(indices).astype(ctypes.c_uint)
-        vertexdata = np.array(vertices).astype(ctypes.c_float)
-        normaldata = np.array(normals).astype(ctypes.c_float)
-        texdata = np.array(tex).astype(ctypes.c_float)
-        floatsz = ctypes.sizeof(ctypes.c_float)
-        uintsz = ctypes.sizeof(ctypes.c_uint)
+        # Parameter grid, the first axis runs over the longitude (i) and the second
+        # over the latitude (j), matching the vertex order used by the index array.
+        i, j = np.meshgrid(np.arange(self.lon + 1), np.arange(self.lat + 1), indexing='ij')
+        theta = self.bt + (self.et - self.bt) * (i / self.lon)
+        psi = self.ep - (self.bp + (self.ep - self.bp) * (j / self.lat))
+
+        # Calculate vertex positions.
+        vertices = np.stack([(rax - r * np.cos(psi)) * np.cos(theta),
+                             (rax - r * np.cos(psi)) * np.sin(theta),
+                             r * np.sin(psi)], axis=-1)
+
+        # Calculate vertex normals.
+        normals = np.stack([-r * np.cos(psi) * np.cos(theta),
+                            -r * np.cos(psi) * np.sin(theta),
+                            r * np.sin(psi)], axis=-1)
+        normals /= np.linalg.norm(normals, axis=-1, keepdims=True)
+        tex = np.stack([i / self.lon, j / self.lat], axis=-1)
+
+        # Setup indexing array for triangles, two triangles for each grid cell.  The
+        # index p is the lower left corner of the cell and q is the one next to it in theta.
+        i, j = np.meshgrid(np.arange(self.lon), np.arange(self.lat), indexing='ij')
+        p = (i * (self.lat + 1) + j).ravel()
+        q = p + self.lat + 1
+        indexdata = np.stack([p, q, q + 1, p, q + 1, p + 1], axis=1).astype(np.uint32).ravel()
+
+        # Convert data to GLSL form, flattened and tightly packed.
+        vertexdata = np.ascontiguousarray(vertices, dtype=np.float32).ravel()
+        normaldata = np.ascontiguousarray(normals, dtype=np.float32).ravel()
+        texdata = np.ascontiguousarray(tex, dtype=np.float32).ravel()
+
+        # Keep the data for the MeshPool and the bounds for frustum culling.
+        self.meshData = (vertexdata, normaldata, texdata, indexdata)
+        self.boundingBox, self.boundingSphere = meshBounds(vertexdata.reshape(-1, 3))
 
         # Bind (turn on) a vertex array.
         glBindVertexArray(self.VAO)
 
         # Load the indexing arrays on the graphics card. Load the fill index array.
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO)
-        glBufferData(GL_ELEMENT_ARRAY_BUFFER, uintsz * len(indices), indexdata, GL_STATIC_DRAW)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indexdata.nbytes, indexdata, GL_STATIC_DRAW)
 
         # Bind (turn on) the vertex buffer (storage location).
         glBindBuffer(GL_ARRAY_BUFFER, self.ArrayBuffer)
 
         # Allocate space but not load data at this point.
-        glBufferData(GL_ARRAY_BUFFER, floatsz * (len(vertices) + len(normals) + len(tex)), None, GL_DYNAMIC_DRAW)
+        glBufferData(GL_ARRAY_BUFFER, vertexdata.nbytes + normaldata.nbytes + texdata.nbytes, None, GL_DYNAMIC_DRAW)
 
         # Load the data.
-        glBufferSubData(GL_ARRAY_BUFFER, 0, floatsz * len(vertices), vertexdata)
-        glBufferSubData(GL_ARRAY_BUFFER, floatsz * len(vertices), floatsz * len(normals), normaldata)
-        glBufferSubData(GL_ARRAY_BUFFER, floatsz * (len(vertices) + len(normals)), floatsz * len(tex), texdata)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, vertexdata.nbytes, vertexdata)
+        glBufferSubData(GL_ARRAY_BUFFER, vertexdata.nbytes, normaldata.nbytes, normaldata)
+        glBufferSubData(GL_ARRAY_BUFFER, vertexdata.nbytes + normaldata.nbytes, texdata.nbytes, texdata)
 
         # Setup attribute information.
         glVertexAttribPointer(vPosition, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
-        glVertexAttribPointer(vNormal, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(floatsz * len(vertices)))
-        glVertexAttribPointer(vTex, 2, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(floatsz * (len(vertices) + len(normals))))
+        glVertexAttribPointer(vNormal, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(vertexdata.nbytes))
+        glVertexAttribPointer(vTex, 2, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(vertexdata.nbytes + normaldata.nbytes))
 
         # Set position indexes for shader streams.
         glEnableVertexAttribArray(vPosition)
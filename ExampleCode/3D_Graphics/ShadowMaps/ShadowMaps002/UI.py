@@ -8,6 +8,7 @@
 import pygame
 from pygame.locals import *
 import datetime
+import time
 from GraphicsEngine import *
 
 
@@ -62,6 +63,10 @@ class UI():
         if event.key == K_k:
             self.ge.toggleLight()
 
+        # Toggle between cascaded shadow maps and one shadow map for the room.
+        if event.key == K_m:
+            self.ge.toggleCascades()
+
         # Set object to draw, 1-9.
         # if K_1 <= event.key <= K_9:
         #     self.ge.displayobjmode = event.key - K_1 + 1
@@ -279,6 +284,18 @@ class UI():
     def processMouseButtonDown(self, event):
         self.lastMousePosition = pygame.mouse.get_pos()
 
+        # Pick the object under the mouse with the right button.
+        if event.button == 3:
+            start = time.perf_counter()
+            hit = self.ge.pick(event.pos)
+            elapsed = 1000 * (time.perf_counter() - start)
+            if hit is None:
+                print("Picked nothing (%.3f ms)" % elapsed)
+            else:
+                print("Picked %s %d, triangle %d, distance %.3f, barycentric (%.3f, %.3f, %.3f) (%.3f ms)" %
+                      ((self.ge.objectNames[hit.object], hit.object, hit.triangle, hit.distance) +
+                       tuple(hit.barycentric) + (elapsed,)))
+
     # def processMouseButtonUp(self, event):
     #     print(event)
 
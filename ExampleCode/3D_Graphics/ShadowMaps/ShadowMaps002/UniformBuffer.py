@@ -0,0 +1,140 @@
+#! /usr/bin/env python3
+#
+# Uniform buffer objects
+#
+# A uniform buffer holds the data of a uniform block on the graphics card.  Every
+# program that uses the block reads it through a binding point, so the data is
+# loaded once for all of the programs instead of once per program with separate
+# glUniform calls for each member.
+#
+# The CPU copy of the buffer is a NumPy structured array whose fields have the
+# offsets of the std140 layout, so the bytes of the array can be copied to the
+# buffer as they are.  The set function writes a field of one element and grows
+# the dirty range if the value changed, the update function then loads the dirty
+# range with a single glBufferSubData call.
+#
+# The LightBuffer and MaterialBuffer objects hold the blocks used by the Phong
+# shaders.
+#
+# layout(std140) uniform LightBlock
+# {
+#     Light Lt[10];
+# };
+#
+# layout(std140) uniform MaterialBlock
+# {
+#     Material Mat;
+# };
+#
+# The Light and Material objects write to them with their StoreLight and
+# StoreMaterial functions.
+
+from OpenGL.GL import *
+import numpy as np
+
+# std140 layout of the Light struct.  Every vec3 and vec4 starts on a 16 byte
+# boundary, the bool is stored as a 4 byte integer and the size of the struct is
+# rounded up to a multiple of 16, the stride of an array of lights.
+lightDType = np.dtype({"names": ["on", "position", "spotDirection", "ambient", "diffuse", "specular",
+                                 "spotCutoff", "spotExponent", "attenuation"],
+                       "formats": ["<i4", ("<f4", 4), ("<f4", 3), ("<f4", 4), ("<f4", 4), ("<f4", 4),
+                                   "<f4", "<f4", ("<f4", 3)],
+                       "offsets": [0, 16, 32, 48, 64, 80, 96, 100, 112],
+                       "itemsize": 128})
+
+# std140 layout of the Material struct.
+materialDType = np.dtype({"names": ["ambient", "diffuse", "specular", "emission", "shininess"],
+                          "formats": [("<f4", 4), ("<f4", 4), ("<f4", 4), ("<f4", 4), "<f4"],
+                          "offsets": [0, 16, 32, 48, 64],
+                          "itemsize": 80})
+
+
+class UniformBuffer():
+    # Constructor, creates the buffer for count elements of the structured type and binds it
+    # to the binding point.  If ranged is True each element starts on a multiple of the
+    # uniform buffer offset alignment so that it can be bound by itself with bindRange.
+    def __init__(self, blockName, dtype, count, binding, ranged=False):
+        self.blockName = blockName
+        self.binding = binding
+
+        if ranged:
+            alignment = int(glGetIntegerv(GL_UNIFORM_BUFFER_OFFSET_ALIGNMENT))
+            itemsize = (dtype.itemsize + alignment - 1) // alignment * alignment
+            fields = [dtype.fields[name] for name in dtype.names]
+            dtype = np.dtype({"names": list(dtype.names), "formats": [field[0] for field in fields],
+                              "offsets": [field[1] for field in fields], "itemsize": itemsize})
+        self.data = np.zeros(count, dtype)
+
+        # The dirty range in bytes, empty when start >= end.
+        self.dirtyStart = self.data.nbytes
+        self.dirtyEnd = 0
+        self.uploads = 0
+        self.uploadedBytes = 0
+
+        self.buffer = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferData(GL_UNIFORM_BUFFER, self.data.nbytes, self.data.view(np.uint8), GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        self.bind()
+
+    # Connects the uniform block of the program to the binding point of the buffer.  Returns
+    # False if the program does not have the block.
+    def attach(self, program):
+        index = glGetUniformBlockIndex(program, self.blockName)
+        if index == GL_INVALID_INDEX:
+            return False
+        glUniformBlockBinding(program, index, self.binding)
+        return True
+
+    # Binds the whole buffer to the binding point.
+    def bind(self):
+        glBindBufferBase(GL_UNIFORM_BUFFER, self.binding, self.buffer)
+
+    # Binds a single element to the binding point, the buffer must have been created ranged.
+    def bindRange(self, index):
+        stride = self.data.dtype.itemsize
+        glBindBufferRange(GL_UNIFORM_BUFFER, self.binding, self.buffer, index * stride, stride)
+
+    # Sets a field of an element, marking its bytes dirty if the value changed.
+    def set(self, index, field, value):
+        column = self.data[field]
+        if np.array_equal(column[index], value):
+            return
+        column[index] = value
+
+        fieldtype, offset = self.data.dtype.fields[field][0:2]
+        start = index * self.data.dtype.itemsize + offset
+        self.dirtyStart = min(self.dirtyStart, start)
+        self.dirtyEnd = max(self.dirtyEnd, start + fieldtype.itemsize)
+
+    # Loads the dirty range to the buffer, one glBufferSubData call for all the changes made
+    # since the last update.
+    def update(self):
+        if self.dirtyStart >= self.dirtyEnd:
+            return
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferSubData(GL_UNIFORM_BUFFER, self.dirtyStart, self.dirtyEnd - self.dirtyStart,
+                        self.data.view(np.uint8)[self.dirtyStart:self.dirtyEnd])
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        self.uploads += 1
+        self.uploadedBytes += self.dirtyEnd - self.dirtyStart
+        self.dirtyStart = self.data.nbytes
+        self.dirtyEnd = 0
+
+    # Removes the buffer from the graphics card.
+    def delete(self):
+        glDeleteBuffers(1, [self.buffer])
+        self.buffer = 0
+
+
+# Buffer of the LightBlock, an array of count lights on binding point 0.
+class LightBuffer(UniformBuffer):
+    def __init__(self, count=10):
+        super().__init__("LightBlock", lightDType, count, 0)
+
+
+# Buffer of the MaterialBlock on binding point 1.  With more than one material each
+# material is bound by itself with bindRange before drawing with it.
+class MaterialBuffer(UniformBuffer):
+    def __init__(self, count=1):
+        super().__init__("MaterialBlock", materialDType, count, 1, count > 1)
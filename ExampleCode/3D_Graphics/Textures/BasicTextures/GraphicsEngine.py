@@ -88,8 +88,8 @@ class GraphicsEngine():
         # teximg = Image.open("Images/Repeat-brick.jpg")
 
         teximg = teximg.convert('RGBA')
-        teximg = teximg.transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        # Flip the rows while copying out the pixels, OpenGL expects the bottom row first.
+        img_data = teximg.tobytes("raw", "RGBA", 0, -1)
 
         self.texID = glGenTextures(1)
         glActiveTexture(GL_TEXTURE0)
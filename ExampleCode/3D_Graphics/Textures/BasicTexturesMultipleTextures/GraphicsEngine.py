@@ -89,8 +89,8 @@ class GraphicsEngine():
 
         teximg = Image.open("Images/cat003.png")
         teximg = teximg.convert('RGBA')
-        teximg = teximg.transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        # Flip the rows while copying out the pixels, OpenGL expects the bottom row first.
+        img_data = teximg.tobytes("raw", "RGBA", 0, -1)
 
         self.texID1 = glGenTextures(1)
         glBindTexture(GL_TEXTURE_2D, self.texID1)
@@ -107,8 +107,8 @@ class GraphicsEngine():
 
         teximg = Image.open("Images/metal024.bmp")
         teximg = teximg.convert('RGBA')
-        teximg = teximg.transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        # Flip the rows while copying out the pixels, OpenGL expects the bottom row first.
+        img_data = teximg.tobytes("raw", "RGBA", 0, -1)
 
         self.texID2 = glGenTextures(1)
         glBindTexture(GL_TEXTURE_2D, self.texID2)
@@ -125,8 +125,8 @@ class GraphicsEngine():
 
         teximg = Image.open("Images/Repeat-brick.jpg")
         teximg = teximg.convert('RGBA')
-        teximg = teximg.transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        # Flip the rows while copying out the pixels, OpenGL expects the bottom row first.
+        img_data = teximg.tobytes("raw", "RGBA", 0, -1)
 
         self.texID3 = glGenTextures(1)
         glBindTexture(GL_TEXTURE_2D, self.texID3)
@@ -4,7 +4,8 @@
 #
 # Creates the vertex and normal vector data for a height map object and
 # loads the data to the grphics card. The image used for the map is
-# assumed to be a PIL Image object in RGB (0-255) format.
+# assumed to be a PIL Image object in RGB (0-255) format.  If optimize is True the
+# triangles and vertices are reordered by the MeshOptimizer for better vertex cache use.
 #
 # Don Spickler
 # 1/7/2022
@@ -14,17 +15,19 @@ import ctypes
 import numpy as np
 import glm
 from PIL import Image
+from MeshOptimizer import *
 
 
 class HeightMap():
     # Constructor, img is assumed to be a PIL Image.
-    def __init__(self, img, w=1, h=1, bump=1, lon=20, lat=20):
+    def __init__(self, img, w=1, h=1, bump=1, lon=20, lat=20, optimize=False):
         self.img = img
         self.w = w
         self.h = h
         self.lon = lon
         self.lat = lat
         self.bump = bump
+        self.optimize = optimize
 
         # Setup VAO and buffers.
         self.VAO = glGenVertexArrays(1)
@@ -34,13 +37,14 @@ class HeightMap():
         self.LoadDataToGraphicsCard()
 
     # Reset the properties of the object, img is assumed to be a PIL Image.
-    def set(self, img, w=1, h=1, bump=1, lon=20, lat=20):
+    def set(self, img, w=1, h=1, bump=1, lon=20, lat=20, optimize=False):
         self.img = img
         self.w = w
         self.h = h
         self.lon = lon
         self.lat = lat
         self.bump = bump
+        self.optimize = optimize
         self.LoadDataToGraphicsCard()
 
     def pos(self, i, j):
@@ -53,114 +57,83 @@ class HeightMap():
         vNormal = 2
         vTex = 3
 
-        # Load vertex data into list.
-        vertices = []
-        tex = []
-        for i in range(self.lon + 1):
-            for j in range(self.lat + 1):
-                x = -self.w / 2 + self.w * (i / self.lon)
-                y = -self.h / 2 + self.h * (j / self.lat)
-
-                # Get z coordinate by image pixel value, assumed that the image is RGB (0-255).
-                posx = int((self.img.width - 1) * (i / self.lon))
-                posy = int((self.img.height - 1) * (j / self.lat))
-                pix = self.img.getpixel((posx, posy))
-                inten = (pix[0] + pix[1] + pix[2]) / (3 * 255)
-                z = self.bump * inten
-
-                vertices.extend([x, y, z])
-                tex.extend([i / self.lon, j / self.lat])
-
-        # Load noraml data into list.
-        normals = []
-        for i in range(self.lon + 1):
-            for j in range(self.lat + 1):
-                vecpos = [0, 0, 0, 0]
-                sumvec = glm.vec3(0)
-                # Get endpoint positions to the vectors to be crossed.
-                for k in range(8):
-                    if k == 0:
-                        vecpos = [i + 1, j, i + 1, j + 1]
-                    if k == 1:
-                        vecpos = [i + 1, j + 1, i, j + 1]
-                    if k == 2:
-                        vecpos = [i, j + 1, i - 1, j + 1]
-                    if k == 3:
-                        vecpos = [i - 1, j + 1, i - 1, j]
-                    if k == 4:
-                        vecpos = [i - 1, j, i - 1, j - 1]
-                    if k == 5:
-                        vecpos = [i - 1, j - 1, i, j - 1]
-                    if k == 6:
-                        vecpos = [i, j - 1, i + 1, j - 1]
-                    if k == 7:
-                        vecpos = [i + 1, j - 1, i + 1, j]
-
-                    # If the point is inside the grid.
-                    if 0 <= vecpos[0] <= self.lon and 0 <= vecpos[1] <= self.lat:
-                        if 0 <= vecpos[2] <= self.lon and 0 <= vecpos[3] <= self.lat:
-                            # Get positions of endpoint positions in the vertex list to vectors.
-                            p = self.pos(i, j)
-                            p1 = self.pos(vecpos[0], vecpos[1])
-                            p2 = self.pos(vecpos[2], vecpos[3])
-                            # Create vec3 objects of (x, y, z) points.
-                            v = glm.vec3(vertices[p], vertices[p + 1], vertices[p + 2])
-                            v1 = glm.vec3(vertices[p1], vertices[p1 + 1], vertices[p1 + 2])
-                            v2 = glm.vec3(vertices[p2], vertices[p2 + 1], vertices[p2 + 2])
-                            # Subtract endpoints to get vecotrs.
-                            tv1 = glm.normalize(v1 - v)
-                            tv2 = glm.normalize(v2 - v)
-                            # Take cross product for normal vector and add it to the vector accumulator.
-                            cp = glm.cross(tv1, tv2)
-                            sumvec += cp
-
-                # Normalize the accumulation vector and append to the normal vector list.
-                if glm.length(sumvec) > 0.000001:
-                    normals.extend(glm.normalize(sumvec))
-                else:
-                    normals.extend(glm.vec3(0))
-
-        # Setup indexing array for triangles.
-        indices = []
-        for i in range(self.lon):
-            for j in range(self.lat):
-                indices.append(i * (self.lat + 1) + j)
-                indices.append((i + 1) * (self.lat + 1) + j)
-                indices.append((i + 1) * (self.lat + 1) + j + 1)
-                indices.append(i * (self.lat + 1) + j)
-                indices.append((i + 1) * (self.lat + 1) + j + 1)
-                indices.append(i * (self.lat + 1) + j + 1)
-
-        # Convert data to GLSL form and get machine sizes of data types.
-        indexdata = np.array(indices).astype(ctypes.c_uint)
-        vertexdata = np.array(vertices).astype(ctypes.c_float)
-        normaldata = np.array(normals).astype(ctypes.c_float)
-        texdata = np.array(tex).astype(ctypes.c_float)
-        floatsz = ctypes.sizeof(ctypes.c_float)
-        uintsz = ctypes.sizeof(ctypes.c_uint)
+        # Parameter grid, the first axis runs over the longitude (i) and the second
+        # over the latitude (j), matching the vertex order used by the index array.
+        i, j = np.meshgrid(np.arange(self.lon + 1), np.arange(self.lat + 1), indexing='ij')
+
+        # Get z coordinate by image pixel value, assumed that the image is RGB (0-255).
+        # The pixels are sampled from the image array in one pass, rows are indexed by y.
+        posx = ((self.img.width - 1) * (np.arange(self.lon + 1) / self.lon)).astype(int)
+        posy = ((self.img.height - 1) * (np.arange(self.lat + 1) / self.lat)).astype(int)
+        pix = np.asarray(self.img)[np.ix_(posy, posx)][:, :, 0:3].astype(int)
+        inten = pix.sum(axis=2).T / (3 * 255)
+
+        vertices = np.stack([-self.w / 2 + self.w * (i / self.lon),
+                             -self.h / 2 + self.h * (j / self.lat),
+                             self.bump * inten], axis=-1)
+        tex = np.stack([i / self.lon, j / self.lat], axis=-1)
+
+        # Calculate the normals.  For each vertex the eight neighbors are visited in order
+        # around the vertex and the cross products of consecutive (normalized) edge vectors
+        # are summed.  The vertex grid is padded with NaN so that edges reaching outside
+        # the grid are detected and left out of the sum.
+        padded = np.pad(vertices, ((1, 1), (1, 1), (0, 0)), constant_values=np.nan)
+        ring = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0)]
+        edges = []
+        for di, dj in ring:
+            e = padded[1 + di:self.lon + 2 + di, 1 + dj:self.lat + 2 + dj] - vertices
+            edges.append(e / np.linalg.norm(e, axis=-1, keepdims=True))
+
+        sumvec = np.zeros(vertices.shape)
+        for k in range(8):
+            cp = np.cross(edges[k], edges[k + 1])
+            sumvec += np.where(np.isnan(cp), 0, cp)
+
+        # Normalize the accumulation vectors, degenerate sums are set to the zero vector.
+        length = np.linalg.norm(sumvec, axis=-1, keepdims=True)
+        normals = np.divide(sumvec, length, out=np.zeros(sumvec.shape), where=length > 0.000001)
+
+        # Setup indexing array for triangles, two triangles for each grid cell.  The
+        # index p is the lower left corner of the cell and q is the one next to it in theta.
+        i, j = np.meshgrid(np.arange(self.lon), np.arange(self.lat), indexing='ij')
+        p = (i * (self.lat + 1) + j).ravel()
+        q = p + self.lat + 1
+        indexdata = np.stack([p, q, q + 1, p, q + 1, p + 1], axis=1).astype(np.uint32).ravel()
+
+        # Reorder the triangles and vertices for the vertex cache.
+        if self.optimize:
+            indexdata, order = MeshOptimizer().optimize(indexdata, (self.lon + 1) * (self.lat + 1))
+            vertices = vertices.reshape(-1, 3)[order]
+            normals = normals.reshape(-1, 3)[order]
+            tex = tex.reshape(-1, 2)[order]
+
+        # Convert data to GLSL form, flattened and tightly packed.
+        vertexdata = np.ascontiguousarray(vertices, dtype=np.float32).ravel()
+        normaldata = np.ascontiguousarray(normals, dtype=np.float32).ravel()
+        texdata = np.ascontiguousarray(tex, dtype=np.float32).ravel()
 
         # Bind (turn on) a vertex array.
         glBindVertexArray(self.VAO)
 
         # Load the indexing arrays on the graphics card. Load the fill index array.
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO)
-        glBufferData(GL_ELEMENT_ARRAY_BUFFER, uintsz * len(indices), indexdata, GL_STATIC_DRAW)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indexdata.nbytes, indexdata, GL_STATIC_DRAW)
 
         # Bind (turn on) the vertex buffer (storage location).
         glBindBuffer(GL_ARRAY_BUFFER, self.ArrayBuffer)
 
         # Allocate space but not load data at this point.
-        glBufferData(GL_ARRAY_BUFFER, floatsz * (len(vertices) + len(normals) + len(tex)), None, GL_DYNAMIC_DRAW)
+        glBufferData(GL_ARRAY_BUFFER, vertexdata.nbytes + normaldata.nbytes + texdata.nbytes, None, GL_DYNAMIC_DRAW)
 
         # Load the data.
-        glBufferSubData(GL_ARRAY_BUFFER, 0, floatsz * len(vertices), vertexdata)
-        glBufferSubData(GL_ARRAY_BUFFER, floatsz * len(vertices), floatsz * len(normals), normaldata)
-        glBufferSubData(GL_ARRAY_BUFFER, floatsz * (len(vertices) + len(normals)), floatsz * len(tex), texdata)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, vertexdata.nbytes, vertexdata)
+        glBufferSubData(GL_ARRAY_BUFFER, vertexdata.nbytes, normaldata.nbytes, normaldata)
+        glBufferSubData(GL_ARRAY_BUFFER, vertexdata.nbytes + normaldata.nbytes, texdata.nbytes, texdata)
 
         # Setup attribute information.
         glVertexAttribPointer(vPosition, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
-        glVertexAttribPointer(vNormal, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(floatsz * len(vertices)))
-        glVertexAttribPointer(vTex, 2, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(floatsz * (len(vertices) + len(normals))))
+        glVertexAttribPointer(vNormal, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(vertexdata.nbytes))
+        glVertexAttribPointer(vTex, 2, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(vertexdata.nbytes + normaldata.nbytes))
 
         # Set position indexes for shader streams.
         glEnableVertexAttribArray(vPosition)
@@ -0,0 +1,199 @@
+#! /usr/bin/env python3
+
+"""
+Mesh Optimizer object
+
+Reorders the triangles and vertices of an indexed triangle mesh for better use
+of the post-transform vertex cache of the graphics card.
+
+Triangle order is optimized with the Tipsify algorithm from "Fast Triangle
+Reordering for Vertex Locality and Reduced Overdraw" by Sander, Nehab and
+Barczak (2007).  Triangles are emitted as fans around a vertex and the next fan
+is chosen from the vertices of the last fans that are still in the cache.  The
+output is split into clusters wherever the algorithm has to jump to a vertex
+that is no longer in the cache.  Optionally these clusters are sorted so that
+clusters facing away from the center of the mesh are drawn first, which
+reduces overdraw.
+
+After the triangles are reordered, the vertices are renumbered in order of first
+use so that the vertex data is fetched sequentially.
+
+The quality of an order is measured by simulating a FIFO vertex cache, the
+average cache miss ratio (ACMR) is the number of cache misses per triangle and
+the average transform to vertex ratio (ATVR) is the number of cache misses per
+vertex.  The best possible ATVR is 1.
+
+Index arrays are NumPy arrays with three entries per triangle.
+"""
+
+import numpy as np
+from collections import deque
+
+
+class MeshOptimizer():
+    # Constructor, cachesize is the size of the vertex cache that is optimized for.
+    def __init__(self, cachesize=16):
+        self.cachesize = cachesize
+
+    # Simulates a FIFO vertex cache and returns the (ACMR, ATVR) pair for the index array.
+    def cacheStats(self, indices, cachesize=None):
+        if cachesize is None:
+            cachesize = self.cachesize
+
+        indices = np.asarray(indices).ravel()
+        if len(indices) == 0:
+            return 0, 0
+
+        cache = deque()
+        incache = set()
+        misses = 0
+        for v in indices.tolist():
+            if v not in incache:
+                misses += 1
+                cache.append(v)
+                incache.add(v)
+                if len(cache) > cachesize:
+                    incache.discard(cache.popleft())
+
+        return misses / (len(indices) // 3), misses / len(np.unique(indices))
+
+    # Tipsify triangle ordering.  Returns the triangle numbers in the new order and the
+    # list of positions (in triangles) where the clusters of the new order start.
+    def tipsify(self, indices, numvertices):
+        k = self.cachesize
+        indices = np.asarray(indices, np.int64).ravel()
+        numtris = len(indices) // 3
+
+        # Vertex to triangle adjacency, the triangles of vertex v are
+        # adjacency[offsets[v]:offsets[v + 1]].
+        counts = np.bincount(indices, minlength=numvertices)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).tolist()
+        adjacency = (np.argsort(indices, kind='stable') // 3).tolist()
+        triangles = indices.reshape(-1, 3).tolist()
+
+        live = counts.tolist()
+        cachetime = [0] * numvertices
+        emitted = [False] * numtris
+        deadend = []
+        order = []
+        clusters = [0]
+        time = k + 1
+        cursor = 0
+        fan = 0
+
+        while fan >= 0:
+            # Emit all remaining triangles around the fanning vertex.
+            candidates = []
+            for t in adjacency[offsets[fan]:offsets[fan + 1]]:
+                if emitted[t]:
+                    continue
+                emitted[t] = True
+                order.append(t)
+                for v in triangles[t]:
+                    deadend.append(v)
+                    candidates.append(v)
+                    live[v] -= 1
+                    if time - cachetime[v] > k:
+                        cachetime[v] = time
+                        time += 1
+
+            # Next fanning vertex, the candidate with live triangles that has been in
+            # the cache longest, as long as its fan would not push it out of the cache.
+            fan = -1
+            best = -1
+            for v in candidates:
+                if live[v] > 0:
+                    p = 0
+                    if time - cachetime[v] + 2 * live[v] <= k:
+                        p = time - cachetime[v]
+                    if p > best:
+                        best = p
+                        fan = v
+
+            if fan >= 0:
+                continue
+
+            # Dead end, go back through the recently used vertices and then to the
+            # next vertex in input order.  Jumps outside the cache start a new cluster.
+            while len(deadend) > 0:
+                v = deadend.pop()
+                if live[v] > 0:
+                    fan = v
+                    break
+
+            if fan < 0:
+                while cursor < numvertices:
+                    if live[cursor] > 0:
+                        fan = cursor
+                        break
+                    cursor += 1
+
+            if fan >= 0 and time - cachetime[fan] > k and len(order) > clusters[-1]:
+                clusters.append(len(order))
+
+        return np.array(order, np.int64), clusters
+
+    # Sorts the clusters of a triangle order so that the clusters that face away from the
+    # center of the mesh are drawn first.  Returns the new triangle order.
+    def sortClusters(self, indices, order, clusters, positions):
+        tris = np.asarray(indices, np.int64).reshape(-1, 3)[order]
+        p0 = positions[tris[:, 0]]
+        p1 = positions[tris[:, 1]]
+        p2 = positions[tris[:, 2]]
+
+        # Area weighted normals and centroids of each cluster.
+        normals = np.cross(p1 - p0, p2 - p0)
+        areas = np.linalg.norm(normals, axis=1)
+        centroids = (p0 + p1 + p2) / 3
+        center = np.average(centroids, axis=0, weights=areas) if areas.sum() > 0 else centroids.mean(axis=0)
+
+        starts = np.array(clusters, np.int64)
+        clusternormals = np.add.reduceat(normals, starts, axis=0)
+        clusterarea = np.add.reduceat(areas, starts)
+        clustercentroids = np.add.reduceat(centroids * areas[:, None], starts, axis=0)
+        clustercentroids /= np.maximum(clusterarea, 1e-12)[:, None]
+
+        facing = np.einsum('ij,ij->i', clustercentroids - center, clusternormals)
+        clusterorder = np.argsort(-facing, kind='stable')
+
+        ends = np.append(starts[1:], len(order))
+        return np.concatenate([order[starts[c]:ends[c]] for c in clusterorder])
+
+    # Optimizes the triangle order of each segment of the index array and then renumbers
+    # the vertices by first use.  Segments are the start positions (in indices) of ranges
+    # that must stay together, such as the material ranges of a model, and are kept in
+    # place.  If overdraw is True the clusters within each segment are sorted, which
+    # needs the vertex positions.
+    #
+    # Returns the new index array, with the type of the input, and the vertex order,
+    # the old vertex number for each new vertex, to reorder the vertex data with.
+    def optimize(self, indices, numvertices, segments=None, positions=None, overdraw=False):
+        dtype = np.asarray(indices).dtype
+        indices = np.asarray(indices, np.int64).ravel()
+        if segments is None or len(segments) == 0:
+            segments = [0]
+
+        bounds = sorted(set(list(segments) + [len(indices)]))
+        if bounds[0] != 0:
+            bounds.insert(0, 0)
+
+        # Each segment is optimized on its own vertices, renumbered from 0 in the same order,
+        # so the cost of a segment depends on its size and not on the size of the mesh.
+        pieces = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            segment = indices[start:end]
+            used, local = np.unique(segment, return_inverse=True)
+            order, clusters = self.tipsify(local, len(used))
+            if overdraw and positions is not None and len(clusters) > 1:
+                order = self.sortClusters(segment, order, clusters, np.asarray(positions, np.float64))
+            pieces.append(segment.reshape(-1, 3)[order].ravel())
+
+        newindices = np.concatenate(pieces) if len(pieces) > 0 else indices
+
+        # Vertex fetch order, vertices are renumbered in the order they are first used.
+        used, first = np.unique(newindices, return_index=True)
+        vertexorder = used[np.argsort(first)]
+        newnumber = np.zeros(numvertices, np.int64)
+        newnumber[vertexorder] = np.arange(len(vertexorder))
+
+        return newnumber[newindices].astype(dtype), vertexorder
@@ -73,8 +73,8 @@ class GraphicsEngine():
         self.simpleplane = SimplePlane()
 
         # Load the 0 level image.  Also generate mipmaps for base image.
-        teximg = Image.open("Images/cat001.png").convert('RGBA').transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        teximg = Image.open("Images/cat001.png").convert('RGBA')
+        img_data = teximg.tobytes("raw", "RGBA", 0, -1)
 
         self.texID = glGenTextures(1)
         glActiveTexture(GL_TEXTURE0)
@@ -92,16 +92,16 @@ class GraphicsEngine():
         #glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_NEAREST)
 
         # Replace levels 1, 2, and 3 with different images.
-        teximg = Image.open("Images/cat002.png").convert('RGBA').transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        teximg = Image.open("Images/cat002.png").convert('RGBA')
+        img_data = teximg.tobytes("raw", "RGBA", 0, -1)
         glTexImage2D(GL_TEXTURE_2D, 1, GL_RGBA, teximg.width, teximg.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
 
-        teximg = Image.open("Images/cat003.png").convert('RGBA').transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        teximg = Image.open("Images/cat003.png").convert('RGBA')
+        img_data = teximg.tobytes("raw", "RGBA", 0, -1)
         glTexImage2D(GL_TEXTURE_2D, 2, GL_RGBA, teximg.width, teximg.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
 
-        teximg = Image.open("Images/cat004.png").convert('RGBA').transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(teximg.getdata()), np.int8)
+        teximg = Image.open("Images/cat004.png").convert('RGBA')
+        img_data = teximg.tobytes("raw", "RGBA", 0, -1)
         glTexImage2D(GL_TEXTURE_2D, 3, GL_RGBA, teximg.width, teximg.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
 
         glUniform1i(self.texLocRender, 0)